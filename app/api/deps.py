@@ -1,56 +1,61 @@
 from typing import AsyncGenerator, Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import get_settings
-from app.core.security import verify_token
+from app.core.security import decode_token
 from app.database.session import SessionLocal
-from app.users.models import User
-from app.schemas.auth import TokenPayload
+from app.schemas.auth import Principal, TokenPayload
+from app.services.principal_cache import resolve_principal
 
 settings = get_settings()
 # 修正tokenUrl为正确的登录端点
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+# auto_error=False: 认证中间件已解析身份时（包括 Cookie 认证），不强制要求 Bearer header
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session:
         yield session
 
 async def get_current_user(
-    db: AsyncSession = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
+    request: Request,
+    token: Optional[str] = Depends(oauth2_scheme)
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+    # CasbinAuthBackend 已解析出用户身份时直接复用，不再重复解码和查询
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return principal
+
+    if not token:
+        raise credentials_exception
     try:
-        payload = verify_token(token)
+        payload = decode_token(token)
         if payload is None:
             raise credentials_exception
         token_data = TokenPayload(**payload)
     except (jwt.JWTError, ValidationError):
         raise credentials_exception
 
-    # 根据sub字段查找用户
+    # 根据sub字段查找用户（按用户ID，整数）
     user = None
     if hasattr(token_data, "sub") and token_data.sub:
-        from sqlalchemy import select
-        # 按用户ID查找（现在是整数）
-        stmt = select(User).filter(User.id == token_data.sub)
-        result = await db.execute(stmt)
-        user = result.scalar_one_or_none()
-    
+        user = await resolve_principal(token_data.sub)
+
     if not user:
         raise credentials_exception
     return user
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
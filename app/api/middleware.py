@@ -1,14 +1,19 @@
 import base64
 import binascii
+import json
 from typing import Optional, Tuple
 from starlette.authentication import AuthenticationBackend, AuthenticationError, AuthCredentials, SimpleUser
 from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import Receive, Scope, Send
 from fastapi import HTTPException, status
-from jose import JWTError, jwt
+from fastapi_authz import CasbinMiddleware
 from app.core.config import get_settings
-from app.database.session import get_db
-from app.users.models import User
-from sqlalchemy import select
+from app.core.security import decode_token
+from app.schemas.auth import Principal
+from app.services.casbin_domains import DomainEnforcerPool, DomainUnavailableError, UnknownDomainError, is_valid_domain
+from app.services.casbin_service import CasbinService
+from app.services.principal_cache import resolve_principal
 
 # 添加日志
 from app.core.logging import get_logger, log_auth, log_error
@@ -20,20 +25,25 @@ class CasbinAuthBackend(AuthenticationBackend):
     """
     与 Casbin 集成的认证后端
     从 JWT token 中提取用户信息，为 Casbin 提供用户身份
+    解析出的用户身份挂载到 request.state.principal，供依赖项复用
+    启用多租户时从请求头解析租户并挂载到 request.state.domain（未携带时为默认租户 ""）
     """
     
     async def authenticate(self, request: Request) -> Optional[Tuple[AuthCredentials, SimpleUser]]:
+        request.state.principal = None
+        request.state.domain = self._resolve_domain(request)
+        
         # 1. 尝试从 Authorization header 获取 Bearer token
         authorization = request.headers.get("Authorization")
         if authorization and authorization.startswith("Bearer "):
             token = authorization.split(" ")[1]
             logger.debug(f"🔑 Found Bearer token: {token[:20]}...")
             
-            user_info = await self._verify_jwt_token(token)
-            if user_info:
-                username = user_info["username"]
-                log_auth(username, "Bearer token验证成功", True)
-                return AuthCredentials(["authenticated"]), SimpleUser(username)
+            principal = await self._verify_jwt_token(token)
+            if principal:
+                request.state.principal = principal
+                log_auth(principal.username, "Bearer token验证成功", True)
+                return AuthCredentials(["authenticated"]), SimpleUser(principal.username)
             else:
                 logger.warning("🔑 Bearer token验证失败")
         
@@ -42,11 +52,11 @@ class CasbinAuthBackend(AuthenticationBackend):
         if cookie_token:
             logger.debug(f"🍪 Found cookie token: {cookie_token[:20]}...")
             
-            user_info = await self._verify_jwt_token(cookie_token)
-            if user_info:
-                username = user_info["username"]
-                log_auth(username, "Cookie token验证成功", True)
-                return AuthCredentials(["authenticated"]), SimpleUser(username)
+            principal = await self._verify_jwt_token(cookie_token)
+            if principal:
+                request.state.principal = principal
+                log_auth(principal.username, "Cookie token验证成功", True)
+                return AuthCredentials(["authenticated"]), SimpleUser(principal.username)
             else:
                 logger.warning("🍪 Cookie token验证失败")
         
@@ -55,16 +65,25 @@ class CasbinAuthBackend(AuthenticationBackend):
         log_auth("anonymous", "使用匿名身份", True)
         return AuthCredentials(["anonymous"]), SimpleUser("anonymous")
     
-    async def _verify_jwt_token(self, token: str) -> Optional[dict]:
-        """验证 JWT token 并返回用户信息"""
+    @staticmethod
+    def _resolve_domain(request: Request) -> str:
+        """请求所属的租户；租户名不合法时拒绝请求（AuthenticationMiddleware 返回 400）"""
+        if not settings.CASBIN_DOMAINS_ENABLED:
+            return ""
+        domain = request.headers.get(settings.CASBIN_DOMAIN_HEADER, "").strip()
+        if domain and not is_valid_domain(domain):
+            logger.warning(f"🏢 无效的租户: {domain[:80]!r}")
+            raise AuthenticationError("Invalid tenant")
+        return domain
+    
+    async def _verify_jwt_token(self, token: str) -> Optional[Principal]:
+        """验证 JWT token 并返回用户身份"""
         try:
             logger.debug("🔍 开始解码JWT token")
-            payload = jwt.decode(
-                token, 
-                settings.SECRET_KEY, 
-                algorithms=["HS256"],
-                options={"verify_aud": False}  # 跳过audience验证
-            )
+            payload = decode_token(token)
+            if payload is None:
+                logger.warning("JWT验证失败: 签名无效或已过期")
+                return None
             user_id: int = payload.get("sub")
             if user_id is None:
                 logger.warning("JWT payload中缺少用户ID")
@@ -72,38 +91,111 @@ class CasbinAuthBackend(AuthenticationBackend):
             
             logger.debug(f"JWT解码成功，用户ID: {user_id}")
             
-            # 从数据库获取用户信息
-            async for db in get_db():
-                stmt = select(User).filter(User.id == user_id)
-                result = await db.execute(stmt)
-                user = result.scalar_one_or_none()
-                
-                if user and user.is_active:
-                    logger.info(f"👤 用户验证成功: {user.username} (ID: {user.id})")
-                    return {
-                        "user_id": user.id,
-                        "username": user.username,
-                        "email": user.email,
-                        "is_superuser": user.is_superuser
-                    }
-                else:
-                    if user:
-                        logger.warning(f"用户未激活: {user.username}")
-                    else:
-                        logger.warning(f"用户不存在: ID {user_id}")
-                break
+            principal = await resolve_principal(user_id)
+            if principal is None:
+                logger.warning(f"用户不存在: ID {user_id}")
+                return None
+            if not principal.is_active:
+                logger.warning(f"用户未激活: {principal.username}")
+                return None
             
-            return None
+            logger.info(f"👤 用户验证成功: {principal.username} (ID: {principal.id})")
+            return principal
             
-        except JWTError as e:
-            logger.warning(f"JWT验证失败: {type(e).__name__}: {str(e)}")
-            log_error(e, "JWT验证")
-            return None
         except Exception as e:
             logger.error(f"💥 用户验证过程中发生错误: {type(e).__name__}: {str(e)}")
             log_error(e, "用户验证")
             return None
 
+class CachedCasbinMiddleware(CasbinMiddleware):
+    """
+    带授权决策缓存的 Casbin 中间件
+    与 fastapi_authz.CasbinMiddleware 行为一致，但通过 CasbinService.enforce 复用 (sub, path, method) 的判断结果
+    过滤加载模式下，判断前先按需加载主体及其角色的策略
+    请求属于其他租户（request.state.domain）时，判断前先确保该租户的执行器已加载，并在租户内判定：
+    租户不存在返回 404，主体不属于该租户返回 403，租户策略加载失败返回 503
+    超级管理员的请求带 X-Casbin-Explain 请求头时，在响应头 X-Casbin-Explain 中返回本次判定的剖析结果（仅默认租户）
+    """
+    
+    EXPLAIN_HEADER = b"x-casbin-explain"
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket") and "user" in scope:
+            subject = self._subject(scope)
+            domain = self._domain(scope)
+            if domain:
+                rejection = await self._check_domain(domain, subject)
+                if rejection is not None:
+                    # 与 CasbinMiddleware 一致，CORS 预检请求不做授权判断
+                    if scope.get("method") == "OPTIONS":
+                        await self.app(scope, receive, send)
+                    else:
+                        await rejection(scope, receive, send)
+                    return
+            else:
+                await CasbinService.ensure_loaded(subject)
+            if not domain and self._explain_requested(scope):
+                trace = CasbinService.explain(subject, scope["path"], scope["method"])
+                send = self._send_with_explain(send, trace.to_dict())
+        await super().__call__(scope, receive, send)
+    
+    @staticmethod
+    async def _check_domain(domain: str, subject: str) -> Optional[JSONResponse]:
+        """确保租户已加载且主体属于该租户，否则返回拒绝请求的响应"""
+        try:
+            entry = await DomainEnforcerPool.acquire(domain)
+        except UnknownDomainError:
+            logger.warning(f"🏢 租户不存在: {domain}")
+            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": "Unknown tenant"})
+        except DomainUnavailableError:
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Tenant policy unavailable"},
+                headers={"Retry-After": "1"},
+            )
+        if not entry.is_member(subject):
+            logger.warning(f"🏢 {subject} 不属于租户 {domain}")
+            return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"detail": "Not a member of this tenant"})
+        return None
+    
+    @classmethod
+    def _explain_requested(cls, scope: Scope) -> bool:
+        principal = scope.get("state", {}).get("principal")
+        if principal is None or not principal.is_superuser:
+            return False
+        return any(name == cls.EXPLAIN_HEADER for name, _ in scope.get("headers", ()))
+    
+    @classmethod
+    def _send_with_explain(cls, send: Send, explain: dict) -> Send:
+        value = json.dumps(explain, separators=(",", ":")).encode("latin-1")
+        
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (cls.EXPLAIN_HEADER, value)]
+            await send(message)
+        
+        return send_wrapper
+    
+    @staticmethod
+    def _subject(scope: Scope) -> str:
+        user = scope["user"]
+        return user.display_name if user.is_authenticated else "anonymous"
+    
+    @staticmethod
+    def _domain(scope: Scope) -> str:
+        return scope.get("state", {}).get("domain") or ""
+    
+    def _enforce(self, scope: Scope, receive: Receive) -> bool:
+        if "user" not in scope:
+            raise RuntimeError("Casbin Middleware must work with an Authentication Middleware")
+        
+        # 与 request.url.path 一致：只取路径部分，不含查询参数
+        domain = self._domain(scope)
+        if domain:
+            return DomainEnforcerPool.enforce(domain, self._subject(scope), scope["path"], scope["method"])
+        return CasbinService.enforce(self._subject(scope), scope["path"], scope["method"])
+
 class BasicAuthBackend(AuthenticationBackend):
     """
     基础认证后端（用于测试）
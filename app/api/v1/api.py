@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import users, roles, casbin
+from app.api.v1.endpoints import users, roles, casbin, metrics
 
 api_router = APIRouter()
 
@@ -10,4 +10,7 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(roles.router, prefix="/admin", tags=["admin", "system"])
 
 # Casbin 权限管理API（需要admin权限）
-api_router.include_router(casbin.router, prefix="/admin/casbin", tags=["admin", "casbin", "permission"]) 
\ No newline at end of file
+api_router.include_router(casbin.router, prefix="/admin/casbin", tags=["admin", "casbin", "permission"]) 
+
+# 运行指标API（需要admin权限）
+api_router.include_router(metrics.router, prefix="/admin/metrics", tags=["admin", "metrics"])
@@ -1,19 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+import json
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any
-from pydantic import BaseModel
+from typing import List, Dict, Any, Literal, Optional
+from pydantic import BaseModel, Field, ValidationError
 
 from app.api.deps import get_db, get_current_active_user
+from app.services.casbin_domains import DOMAIN_PATTERN, DomainEnforcerPool
+from app.services.casbin_policy_file import PolicyFileError, format_policy_line, parse_policy_lines
 from app.services.casbin_service import CasbinService
-from app.schemas.user import User
+from app.services.casbin_watcher import publish_policy_change
+from app.schemas.auth import Principal
 
 router = APIRouter()
 
 # 检查超级管理员权限
 async def require_superuser(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """确保当前用户是超级管理员"""
     if not current_user.is_superuser:
         raise HTTPException(
@@ -32,16 +37,39 @@ class RoleAssignRequest(BaseModel):
     username: str
     role: str
 
+# 单次批量请求允许的最大条目数
+BATCH_MAX_ITEMS = 100000
+
+class PolicyBatchRequest(BaseModel):
+    policies: List[PolicyRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class RoleAssignBatchRequest(BaseModel):
+    assignments: List[RoleAssignRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+# 租户查询参数：为空时为默认租户
+DOMAIN_QUERY = Query(None, pattern=DOMAIN_PATTERN.pattern, description="租户（为空时为默认租户）")
+
+# 流式导出时每次写出的行数；CSV 格式在每批之后写一行 "# cursor: <id>" 注释，用于断点续传
+EXPORT_FLUSH_ROWS = 1000
+
+class PolicyApplyRequest(BaseModel):
+    """完整的期望策略集（不在其中的现有规则会被删除）"""
+    policies: List[PolicyRequest] = Field(default_factory=list)
+    roles: List[RoleAssignRequest] = Field(default_factory=list)
+
 class PermissionCheckRequest(BaseModel):
     username: str
     obj: str
     act: str
 
+class PermissionCheckBatchRequest(BaseModel):
+    checks: List[PermissionCheckRequest] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
 # ==================== 策略管理 API (仅超级管理员) ====================
 
 @router.get("/policies/")
 async def list_policies(
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """获取所有策略 - 仅超级管理员"""
     policies = CasbinService.get_all_policies()
@@ -51,13 +79,60 @@ async def list_policies(
         "count": len(policies)
     })
 
+@router.get("/policies/export")
+async def export_policies(
+    export_format: Literal["ndjson", "csv"] = Query("ndjson", alias="format", description="导出格式"),
+    ptype: Optional[Literal["p", "g"]] = Query(None, description="规则类型"),
+    subject: Optional[str] = Query(None, description="主体（p 规则的角色 / g 规则的用户）"),
+    obj_prefix: Optional[str] = Query(None, description="对象前缀（p 规则的资源 / g 规则的角色）"),
+    cursor: int = Query(0, ge=0, description="从该 id 之后继续导出（上次导出的最后一个 id）"),
+    limit: Optional[int] = Query(None, ge=1, description="最多导出的条数"),
+    domain: Optional[str] = DOMAIN_QUERY,
+    current_user: Principal = Depends(require_superuser)
+):
+    """
+    流式导出策略与角色分配 - 仅超级管理员
+    按 id 顺序从数据库分页读取并逐批写出，内存占用与策略总数无关
+    - ndjson: 每行 {"id", "ptype", "rule"}，用最后一行的 id 作为 cursor 继续
+    - csv: rbac_policy.csv 格式，可直接导入；每批之后的 "# cursor: <id>" 注释行给出继续导出的 cursor
+    """
+    async def stream():
+        lines: List[str] = []
+        count = 0
+        last_id = cursor
+        async for rule_id, rule_ptype, rule in CasbinService.export_policies(
+            ptype, subject, obj_prefix, cursor, domain or ""
+        ):
+            if export_format == "ndjson":
+                lines.append(json.dumps({"id": rule_id, "ptype": rule_ptype, "rule": rule}, ensure_ascii=False))
+            else:
+                lines.append(format_policy_line(rule_ptype, rule))
+            last_id = rule_id
+            count += 1
+            if len(lines) >= EXPORT_FLUSH_ROWS or count == limit:
+                if export_format == "csv":
+                    lines.append(f"# cursor: {last_id}")
+                yield "\n".join(lines) + "\n"
+                lines = []
+            if count == limit:
+                return
+        if lines:
+            if export_format == "csv":
+                lines.append(f"# cursor: {last_id}")
+            yield "\n".join(lines) + "\n"
+
+    media_type = "application/x-ndjson" if export_format == "ndjson" else "text/csv; charset=utf-8"
+    return StreamingResponse(stream(), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename=casbin_policies.{export_format}"
+    })
+
 @router.post("/policies/")
 async def add_policy(
     policy: PolicyRequest,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """添加策略 - 仅超级管理员"""
-    success = CasbinService.add_policy(policy.role, policy.obj, policy.act)
+    success = await CasbinService.add_policy(policy.role, policy.obj, policy.act)
     
     if success:
         return JSONResponse(content={"message": "策略添加成功"})
@@ -70,10 +145,10 @@ async def add_policy(
 @router.delete("/policies/")
 async def remove_policy(
     policy: PolicyRequest,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """删除策略 - 仅超级管理员"""
-    success = CasbinService.remove_policy(policy.role, policy.obj, policy.act)
+    success = await CasbinService.remove_policy(policy.role, policy.obj, policy.act)
     
     if success:
         return JSONResponse(content={"message": "策略删除成功"})
@@ -83,11 +158,101 @@ async def remove_policy(
             detail="策略删除失败或不存在"
         )
 
+def _batch_response(items: List[Dict[str, Any]], statuses: List[str]) -> JSONResponse:
+    """组装批量操作的逐条结果；写入失败时整个批次已回滚，返回 500"""
+    summary = CasbinService.summarize(statuses)
+    if summary.get("failed"):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="批量写入失败，整个批次已回滚，详见服务日志"
+        )
+    results = [dict(item, status=item_status) for item, item_status in zip(items, statuses)]
+    return JSONResponse(content={
+        "results": results,
+        "summary": summary,
+        "count": len(results)
+    })
+
+@router.post("/policies/batch")
+async def add_policies_batch(
+    batch: PolicyBatchRequest,
+    current_user: Principal = Depends(require_superuser)
+):
+    """批量添加策略（单个事务）- 仅超级管理员"""
+    rules = [[policy.role, policy.obj, policy.act] for policy in batch.policies]
+    statuses = await CasbinService.add_policies(rules)
+    return _batch_response([policy.model_dump() for policy in batch.policies], statuses)
+
+@router.delete("/policies/batch")
+async def remove_policies_batch(
+    batch: PolicyBatchRequest,
+    current_user: Principal = Depends(require_superuser)
+):
+    """批量删除策略（单个事务）- 仅超级管理员"""
+    rules = [[policy.role, policy.obj, policy.act] for policy in batch.policies]
+    statuses = await CasbinService.remove_policies(rules)
+    return _batch_response([policy.model_dump() for policy in batch.policies], statuses)
+
+@router.post("/policies/apply")
+async def apply_policy_set(
+    request: Request,
+    dry_run: bool = Query(False, description="只计算差异，不写入"),
+    domain: Optional[str] = DOMAIN_QUERY,
+    current_user: Principal = Depends(require_superuser)
+):
+    """
+    声明式应用完整策略集（单个事务，只写入差异）- 仅超级管理员
+    请求体为 JSON（PolicyApplyRequest）或 Content-Type: text/csv 的 rbac_policy.csv 格式
+    指定 domain 时应用到该租户的策略
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        try:
+            desired = parse_policy_lines(body.decode("utf-8").splitlines())
+        except (PolicyFileError, UnicodeDecodeError) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    else:
+        try:
+            policy_set = PolicyApplyRequest.model_validate_json(body)
+        except ValidationError as e:
+            raise RequestValidationError(e.errors())
+        desired = {
+            "p": [[policy.role, policy.obj, policy.act] for policy in policy_set.policies],
+            "g": [[assignment.username, assignment.role] for assignment in policy_set.roles],
+        }
+
+    result = await CasbinService.apply_policy_set(desired, dry_run=dry_run, domain=domain or "")
+    if result["status"] == "failed":
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="策略集写入失败，事务已回滚，详见服务日志"
+        )
+    return JSONResponse(content=result)
+
+# ==================== 租户 API (仅超级管理员) ====================
+
+@router.get("/domains/")
+async def list_loaded_domains(
+    current_user: Principal = Depends(require_superuser)
+):
+    """驻留内存的租户执行器与加载/淘汰统计 - 仅超级管理员"""
+    return JSONResponse(content=DomainEnforcerPool.get_stats())
+
+@router.post("/domains/{domain}/reload/")
+async def reload_domain(
+    domain: str = Path(..., pattern=DOMAIN_PATTERN.pattern),
+    current_user: Principal = Depends(require_superuser)
+):
+    """丢弃租户的执行器（下次访问时从数据库重新加载），并通知其他 worker - 仅超级管理员"""
+    DomainEnforcerPool.invalidate(domain)
+    await publish_policy_change("reload", domain=domain)
+    return JSONResponse(content={"message": f"租户 {domain} 的策略将在下次访问时重新加载"})
+
 # ==================== 角色管理 API (仅超级管理员) ====================
 
 @router.get("/roles/")
 async def list_all_roles(
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """获取所有角色 - 仅超级管理员"""
     roles = CasbinService.get_all_roles()
@@ -100,10 +265,10 @@ async def list_all_roles(
 @router.post("/users/roles/")
 async def assign_role_to_user(
     assignment: RoleAssignRequest,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """为用户分配角色 - 仅超级管理员"""
-    success = CasbinService.add_role_for_user(assignment.username, assignment.role)
+    success = await CasbinService.add_role_for_user(assignment.username, assignment.role)
     
     if success:
         return JSONResponse(content={"message": f"成功为用户 {assignment.username} 分配角色 {assignment.role}"})
@@ -116,10 +281,10 @@ async def assign_role_to_user(
 @router.delete("/users/roles/")
 async def remove_role_from_user(
     assignment: RoleAssignRequest,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """从用户移除角色 - 仅超级管理员"""
-    success = CasbinService.delete_role_for_user(assignment.username, assignment.role)
+    success = await CasbinService.delete_role_for_user(assignment.username, assignment.role)
     
     if success:
         return JSONResponse(content={"message": f"成功从用户 {assignment.username} 移除角色 {assignment.role}"})
@@ -129,27 +294,49 @@ async def remove_role_from_user(
             detail="角色移除失败"
         )
 
+@router.post("/users/roles/batch")
+async def assign_roles_batch(
+    batch: RoleAssignBatchRequest,
+    current_user: Principal = Depends(require_superuser)
+):
+    """批量为用户分配角色（单个事务）- 仅超级管理员"""
+    pairs = [[assignment.username, assignment.role] for assignment in batch.assignments]
+    statuses = await CasbinService.add_roles_for_users(pairs)
+    return _batch_response([assignment.model_dump() for assignment in batch.assignments], statuses)
+
+@router.delete("/users/roles/batch")
+async def remove_roles_batch(
+    batch: RoleAssignBatchRequest,
+    current_user: Principal = Depends(require_superuser)
+):
+    """批量从用户移除角色（单个事务）- 仅超级管理员"""
+    pairs = [[assignment.username, assignment.role] for assignment in batch.assignments]
+    statuses = await CasbinService.delete_roles_for_users(pairs)
+    return _batch_response([assignment.model_dump() for assignment in batch.assignments], statuses)
+
 @router.get("/users/{username}/roles/")
 async def get_user_roles(
     username: str,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """获取用户的所有角色 - 仅超级管理员"""
-    roles = CasbinService.get_roles_for_user(username)
+    roles = await CasbinService.get_roles_for_user(username)
+    effective_roles = await CasbinService.get_effective_roles_for_user(username)
     
     return JSONResponse(content={
         "username": username,
         "roles": roles,
+        "effective_roles": effective_roles,
         "count": len(roles)
     })
 
 @router.get("/roles/{role}/users/")
 async def get_role_users(
     role: str,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """获取拥有指定角色的所有用户 - 仅超级管理员"""
-    users = CasbinService.get_users_for_role(role)
+    users = await CasbinService.get_users_for_role(role)
     
     return JSONResponse(content={
         "role": role,
@@ -162,9 +349,10 @@ async def get_role_users(
 @router.post("/check/")
 async def check_permission(
     check: PermissionCheckRequest,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """检查用户权限 - 仅超级管理员"""
+    await CasbinService.ensure_loaded(check.username)
     has_permission = CasbinService.check_permission(check.username, check.obj, check.act)
     
     return JSONResponse(content={
@@ -174,13 +362,61 @@ async def check_permission(
         "has_permission": has_permission
     })
 
+@router.post("/check/batch")
+async def check_permissions_batch(
+    batch: PermissionCheckBatchRequest,
+    current_user: Principal = Depends(require_superuser)
+):
+    """
+    批量检查用户权限 - 仅超级管理员
+    结果以 NDJSON 流式返回，每行一条，顺序与请求一致
+    """
+    requests = [(check.username, check.obj, check.act) for check in batch.checks]
+
+    async def stream():
+        position = 0
+        async for results in CasbinService.check_permissions(requests):
+            lines = []
+            for has_permission in results:
+                username, obj, act = requests[position]
+                position += 1
+                lines.append(json.dumps({
+                    "username": username,
+                    "obj": obj,
+                    "act": act,
+                    "has_permission": has_permission
+                }, ensure_ascii=False))
+            yield "\n".join(lines) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.post("/explain/")
+async def explain_permission(
+    check: PermissionCheckRequest,
+    current_user: Principal = Depends(require_superuser)
+):
+    """剖析一次权限判定：各阶段耗时、候选规则数、匹配器求值次数与命中的规则 - 仅超级管理员"""
+    await CasbinService.ensure_loaded(check.username)
+    trace = CasbinService.explain(check.username, check.obj, check.act)
+    return JSONResponse(content=trace.to_dict())
+
+@router.get("/explain/stats")
+async def explain_stats(
+    current_user: Principal = Depends(require_superuser)
+):
+    """采样判定的延迟直方图与最近被拒绝的判定 - 仅超级管理员"""
+    return JSONResponse(content={
+        **CasbinService.get_explain_stats(),
+        "recent_denied": CasbinService.get_recent_denied()
+    })
+
 @router.get("/users/{username}/permissions/")
 async def get_user_permissions(
     username: str,
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
-    """获取用户的所有权限 - 仅超级管理员"""
-    permissions = CasbinService.get_permissions_for_user(username)
+    """获取用户的有效权限（含角色继承）- 仅超级管理员"""
+    permissions = await CasbinService.get_permissions_for_user(username)
     
     return JSONResponse(content={
         "username": username,
@@ -193,7 +429,7 @@ async def get_user_permissions(
 @router.post("/sync/", summary="Sync From Database", description="从数据库同步用户角色到 Casbin - 仅超级管理员")
 async def sync_from_database(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """从数据库同步用户角色到 Casbin"""
     # 检查是否为超级管理员
@@ -215,11 +451,11 @@ async def sync_from_database(
 
 @router.post("/initialize/")
 async def initialize_default_policies(
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """初始化默认策略 - 仅超级管理员"""
     try:
-        CasbinService.initialize_default_policies()
+        await CasbinService.initialize_default_policies()
         return JSONResponse(content={"message": "默认策略初始化成功"})
     except Exception as e:
         raise HTTPException(
@@ -229,14 +465,12 @@ async def initialize_default_policies(
 
 @router.post("/reload/")
 async def reload_policies(
-    current_user: User = Depends(require_superuser)
+    current_user: Principal = Depends(require_superuser)
 ):
     """重新加载策略 - 仅超级管理员"""
-    try:
-        CasbinService.load_policy()
+    if await CasbinService.reload_policy():
         return JSONResponse(content={"message": "策略重新加载成功"})
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"重新加载失败: {str(e)}"
-        ) 
\ No newline at end of file
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="重新加载失败，详见服务日志"
+    ) 
\ No newline at end of file
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends
+
+from app.api.v1.endpoints.casbin import require_superuser
+from app.schemas.auth import Principal
+from app.core.security import get_token_cache_stats
+from app.core.hashing import password_hasher
+from app.database.pool_monitor import get_pool_stats
+from app.database.session import engine
+from app.services.casbin_domains import DomainEnforcerPool
+from app.services.casbin_service import CasbinService
+from app.services.casbin_watcher import get_policy_watcher_stats
+from app.services.principal_cache import get_principal_cache_stats
+
+router = APIRouter()
+
+# ==================== 运行指标 API (仅超级管理员) ====================
+
+@router.get("/", summary="Runtime Metrics", description="获取缓存等运行时指标 - 仅超级管理员")
+async def get_metrics(
+    current_user: Principal = Depends(require_superuser)
+):
+    """获取运行时指标"""
+    return {
+        "principal_cache": get_principal_cache_stats(),
+        "token_cache": get_token_cache_stats(),
+        "password_hasher": password_hasher.stats(),
+        "db_pool": get_pool_stats(engine),
+        "decision_cache": CasbinService.get_decision_cache_stats(),
+        "decision_explain": CasbinService.get_explain_stats(),
+        "role_closure": CasbinService.get_role_closure_stats(),
+        "route_table": CasbinService.get_route_table_stats(),
+        "filtered_loading": CasbinService.get_filtered_loading_stats(),
+        "domains": DomainEnforcerPool.get_stats(),
+        "policy_snapshot": CasbinService.get_snapshot_stats(),
+        "policy_watcher": get_policy_watcher_stats(),
+    }
+
+
+@router.get("/db-pool/", summary="Database Pool", description="获取数据库连接池状态 - 仅超级管理员")
+async def get_db_pool_metrics(
+    current_user: Principal = Depends(require_superuser)
+):
+    """数据库连接池当前签出数、溢出数、取连接等待时间与超时次数"""
+    return get_pool_stats(engine)
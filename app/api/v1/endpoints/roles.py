@@ -1,16 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.api.deps import get_db, get_current_active_user
 from app.services.role import RoleService
 from app.services.casbin_service import CasbinService
 from app.schemas.role import CasbinRole, CasbinRoleList, RoleAssignRequest
-from app.schemas.user import User
+from app.schemas.auth import Principal
 
 router = APIRouter()
 
-async def check_admin_permission(current_user: User) -> bool:
+async def check_admin_permission(current_user: Principal) -> bool:
     """检查用户是否有admin权限"""
     return current_user.is_superuser
 
@@ -18,12 +18,13 @@ async def check_admin_permission(current_user: User) -> bool:
 
 @router.get("/roles/", response_model=CasbinRoleList, summary="List Roles", description="获取所有角色列表 - 仅admin")
 async def list_roles(
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
-    """获取所有角色列表"""
+    """获取角色列表（按名称排序，支持 skip/limit 与游标分页）"""
     if not await check_admin_permission(current_user):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -31,20 +32,14 @@ async def list_roles(
         )
     
     role_service = RoleService(db)
-    roles = await role_service.get_all_roles()
-    
-    # 应用分页
-    total = len(roles)
-    paginated_roles = roles[skip:skip + limit]
-    
-    return CasbinRoleList(roles=paginated_roles, count=total)
+    return await role_service.list_roles(cursor=cursor, limit=limit, skip=skip)
 
 @router.post("/roles/", response_model=CasbinRole, summary="Create Role", description="创建新角色 - 仅admin")
 async def create_role(
     role_name: str,
     description: str = None,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """创建新角色"""
     if not await check_admin_permission(current_user):
@@ -67,7 +62,7 @@ async def create_role(
 async def get_role(
     role_name: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """获取角色详情"""
     if not await check_admin_permission(current_user):
@@ -93,7 +88,7 @@ async def assign_role_to_user(
     username: str,
     role_assign: RoleAssignRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """给用户分配角色"""
     if not await check_admin_permission(current_user):
@@ -125,7 +120,7 @@ async def remove_role_from_user(
     username: str,
     role_name: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """从用户中移除角色"""
     if not await check_admin_permission(current_user):
@@ -149,7 +144,7 @@ async def remove_role_from_user(
 async def get_user_roles(
     username: str,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """获取用户的所有角色"""
     if not await check_admin_permission(current_user):
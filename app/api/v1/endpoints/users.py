@@ -5,7 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 # 正确的导入
 from app.api.deps import get_db, get_current_active_user
-from app.users.models import User
+from app.schemas.auth import Principal
 from app.schemas.user import User as UserSchema, UserCreate, UserUpdate, UserWithRoles
 from app.services.user import UserService
 from app.core.logging import get_logger, log_api_call, log_auth, log_error
@@ -48,7 +48,7 @@ async def read_users(
     skip: int = 0,
     limit: int = 100,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """获取用户列表"""
     log_api_call("/api/v1/users/", "GET", current_user.username)
@@ -67,7 +67,7 @@ async def read_users(
 async def create_user(
     user: UserCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """创建新用户"""
     log_api_call("/api/v1/users/", "POST", current_user.username)
@@ -91,7 +91,7 @@ async def create_user(
 async def read_user(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """获取指定用户信息"""
     log_api_call(f"/api/v1/users/{user_id}", "GET", current_user.username)
@@ -113,7 +113,7 @@ async def update_user(
     user_id: int,
     user: UserUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """更新用户信息"""
     log_api_call(f"/api/v1/users/{user_id}", "PUT", current_user.username)
@@ -135,7 +135,7 @@ async def update_user(
 async def delete_user(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ):
     """删除用户"""
     log_api_call(f"/api/v1/users/{user_id}", "DELETE", current_user.username)
@@ -16,6 +16,11 @@ class Settings(BaseSettings):
     MYSQL_PASSWORD: str         # MySQL 密码
     MYSQL_DB: str               # MySQL 数据库名
     SQLALCHEMY_DATABASE_URI: Optional[str] = None  # 完整数据库连接字符串
+    DB_POOL_SIZE: int = 10           # 连接池常驻连接数
+    DB_MAX_OVERFLOW: int = 20        # 常驻连接用尽时允许额外创建的连接数
+    DB_POOL_TIMEOUT: float = 10.0    # 连接全部签出时等待归还的最长秒数，超时抛出异常
+    DB_POOL_RECYCLE: int = 1800      # 连接最长使用秒数，需小于 MySQL wait_timeout，-1 表示不回收
+    DB_POOL_PRE_PING: bool = True    # 签出前检测连接是否可用，丢弃已被服务端断开的连接
     
     # Redis 连接设置
     REDIS_HOST: str = "localhost"    # Redis 服务器主机名
@@ -28,7 +33,41 @@ class Settings(BaseSettings):
     SECRET_KEY: str                  # JWT 签名密钥
     ALGORITHM: str = "HS256"         # JWT 使用的算法
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30  # Token 过期时间（分钟）
-    
+    TOKEN_CACHE_ENABLED: bool = True       # 是否缓存已验证的 token
+    TOKEN_CACHE_MAX_SIZE: int = 10000      # 已验证 token 缓存上限
+
+    # 密码哈希设置
+    PASSWORD_HASH_WORKERS: int = 2           # 密码哈希进程池大小（0 表示使用线程池）
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 4   # 同时执行的哈希任务数
+    PASSWORD_HASH_MAX_QUEUE: int = 64        # 最大排队任务数，超过返回 503
+
+    # 用户身份缓存设置
+    PRINCIPAL_CACHE_ENABLED: bool = True     # 是否启用认证用户身份缓存
+    PRINCIPAL_CACHE_MAX_SIZE: int = 10000    # 最大缓存用户数
+    PRINCIPAL_CACHE_TTL: int = 60            # 缓存有效期（秒）
+    PRINCIPAL_CACHE_REDIS_ENABLED: bool = False  # 是否启用 Redis 共享身份缓存
+    PRINCIPAL_CACHE_REDIS_TTL: int = 300     # Redis 共享缓存有效期（秒）
+    PRINCIPAL_CACHE_CHANNEL: str = "cmdb:principal:invalidate"  # 失效广播频道
+
+    # Casbin 授权设置
+    CASBIN_DECISION_CACHE_ENABLED: bool = True   # 是否缓存授权决策结果
+    CASBIN_DECISION_CACHE_MAX_SIZE: int = 50000  # 授权决策缓存上限 (sub, obj, act)
+    CASBIN_PATH_INDEX_ENABLED: bool = True       # 是否使用路径模式索引加速 enforce
+    CASBIN_ROUTE_TABLE_ENABLED: bool = True      # 是否按应用路由预计算授权表（依赖路径模式索引）
+    CASBIN_WATCHER_ENABLED: bool = False         # 是否通过 Redis 在多个 worker 间同步策略变更
+    CASBIN_WATCHER_CHANNEL: str = "cmdb:casbin:policy"  # 策略变更广播频道
+    CASBIN_WATCHER_SEQ_KEY: str = "cmdb:casbin:seq"     # 策略变更全局序号键
+    CASBIN_FILTERED_LOADING: bool = False        # 启动时只加载 g 规则及活跃主体的 p 规则，其余按需加载
+    CASBIN_FILTERED_MAX_RULES: int = 200000      # 过滤加载模式下内存中 p 规则上限，超出时淘汰最久未用的主体
+    CASBIN_PRELOAD_SUBJECTS: List[str] = ["anonymous"]  # 过滤加载模式下常驻内存、不会被淘汰的主体
+    CASBIN_SNAPSHOT_PATH: Optional[str] = None   # 编译后策略快照文件路径，为空时不使用快照
+    CASBIN_SNAPSHOT_WRITE_DELAY: float = 1.0     # 策略变更后延迟写快照的秒数（合并连续变更）
+    CASBIN_EXPLAIN_SAMPLE_RATE: float = 0.0      # 授权判定剖析采样率（0 ~ 1），采样结果写入延迟直方图，0 表示关闭
+    CASBIN_DOMAINS_ENABLED: bool = False         # 是否按请求头区分租户，每个租户使用独立的执行器
+    CASBIN_DOMAIN_HEADER: str = "X-Tenant"       # 指定租户的请求头，未携带时使用默认租户
+    CASBIN_DOMAIN_MAX_RULES: int = 500000        # 内存中租户规则（p + g）总数上限，超出时淘汰最久未用的租户
+    CASBIN_DOMAIN_MAX_LOADED: int = 256          # 同时驻留内存的租户数上限（不含默认租户）
+
     # CORS 配置 - 跨域资源共享设置
     BACKEND_CORS_ORIGINS: List[str] = [
         "http://localhost:3000",     # React 开发服务器
@@ -62,6 +101,7 @@ class Settings(BaseSettings):
         "X-Requested-With",
         "X-CSRF-Token", 
         "X-Request-ID",
+        "X-Tenant",
         "Origin",
         "Access-Control-Request-Method",
         "Access-Control-Request-Headers"
@@ -0,0 +1,125 @@
+"""
+异步密码哈希服务
+argon2/bcrypt 计算是 CPU 密集型操作，放到有界进程池中执行，避免阻塞事件循环
+并发数受限，排队过长时直接返回 503
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.core.security import get_password_hash, pwd_context, verify_password
+
+settings = get_settings()
+logger = get_logger("hashing")
+
+
+class PasswordHasher:
+    """
+    有界进程池密码哈希器
+    - max_workers: 进程池大小，0 表示使用事件循环默认线程池
+    - max_concurrency: 同时提交到进程池的任务数
+    - max_queue: 允许排队等待的任务数，超过时返回 503
+    """
+
+    def __init__(self, max_workers: int, max_concurrency: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self._executor is None and self.max_workers > 0:
+            logger.info(f"🔧 初始化密码哈希进程池: {self.max_workers} 个进程")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def _run(self, fn: Callable, *args) -> Any:
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            logger.warning(f"⚠️ 密码哈希队列已满: 排队 {self.waiting}, 执行中 {self.in_flight}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="服务繁忙，请稍后重试",
+                headers={"Retry-After": "1"},
+            )
+
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        start = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.total_wait_seconds += time.perf_counter() - start
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        """异步生成密码哈希"""
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """异步验证密码"""
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / self.completed, 3) if self.completed else 0.0,
+        }
+
+
+password_hasher = PasswordHasher(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_MAX_CONCURRENCY,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """生成密码哈希（不阻塞事件循环）"""
+    return await password_hasher.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（不阻塞事件循环）"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+def password_needs_update(hashed_password: str) -> bool:
+    """哈希算法或参数过时时需要重新哈希"""
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except Exception:
+        return False
@@ -0,0 +1,36 @@
+"""
+延迟直方图：授权判定剖析、数据库连接池等待时间等共用
+"""
+
+from typing import Any, Dict, Sequence
+
+# 直方图桶上界（微秒），最后一个桶为 +Inf
+HISTOGRAM_BUCKETS_US = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """固定桶的累计直方图（与 Prometheus histogram 的 le 语义一致）"""
+
+    def __init__(self, buckets: Sequence[float] = HISTOGRAM_BUCKETS_US):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"buckets": buckets, "count": self.count, "sum": round(self.sum, 3)}
@@ -1,12 +1,18 @@
+import hashlib
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Dict, Optional
 from jose import JWTError, jwt
 import bcrypt
 from passlib.context import CryptContext
+from app.core.cache import TTLCache
 from app.core.config import get_settings
 
 settings = get_settings()
 
+# 已验证 token 缓存：key 为 token 的 SHA-256 摘要，value 为解码后的 claims，有效期到 exp 为止
+_token_cache = TTLCache(max_size=settings.TOKEN_CACHE_MAX_SIZE)
+
 # 密码上下文，支持多种哈希算法
 pwd_context = CryptContext(
     schemes=["argon2", "bcrypt"], 
@@ -42,25 +48,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[dict]:
+def decode_token(token: str) -> Optional[dict]:
+    """
+    解码并验证 JWT（签名与过期时间），成功返回 claims，失败返回 None
+    认证中间件和依赖项共用的唯一解码入口，不校验 audience
+    （FastAPI-Users 生成的 token 带 audience，自签发的 token 不带）
+    验证通过的 token 按摘要缓存到 exp，重复出现时跳过签名校验
+    """
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    if settings.TOKEN_CACHE_ENABLED:
+        payload = _token_cache.get(key)
+        if payload is not None:
+            return dict(payload)
+
     try:
-        # FastAPI-Users生成的token包含audience，需要验证
         payload = jwt.decode(
-            token, 
-            settings.SECRET_KEY, 
+            token,
+            settings.SECRET_KEY,
             algorithms=[settings.ALGORITHM],
-            audience=["fastapi-users:auth"]  # 验证audience
+            options={"verify_aud": False}  # 跳过audience验证
         )
-        return payload
-    except JWTError as e:
-        # 如果audience验证失败，尝试不验证audience
-        try:
-            payload = jwt.decode(
-                token, 
-                settings.SECRET_KEY, 
-                algorithms=[settings.ALGORITHM],
-                options={"verify_aud": False}  # 跳过audience验证
-            )
-            return payload
-        except JWTError:
-            return None 
\ No newline at end of file
+    except JWTError:
+        return None
+
+    # 只缓存带 exp 的 token，缓存时长不超过剩余有效期
+    exp = payload.get("exp")
+    if settings.TOKEN_CACHE_ENABLED and isinstance(exp, (int, float)):
+        remaining = exp - time.time()
+        if remaining > 0:
+            _token_cache.set(key, payload, ttl=remaining)
+    return dict(payload)
+
+def verify_token(token: str) -> Optional[dict]:
+    """验证 token，等价于 decode_token（保留旧接口）"""
+    return decode_token(token)
+
+def get_token_cache_stats() -> Dict[str, Any]:
+    """已验证 token 缓存统计"""
+    stats = _token_cache.stats()
+    stats["enabled"] = settings.TOKEN_CACHE_ENABLED
+    return stats
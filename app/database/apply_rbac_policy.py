@@ -0,0 +1,56 @@
+"""
+声明式应用完整策略集：与数据库中的现有策略求差集，在一个事务中只写入差异
+策略文件为 rbac_policy.csv 格式或 JSON（{"policies": [...], "roles": [...]}），按扩展名区分
+启用策略同步时，变更会广播给正在运行的 worker；--domain 指定租户时只比对、写入该租户的策略
+
+用法:
+    python app/database/apply_rbac_policy.py app/core/rbac_policy.csv --dry-run
+    python app/database/apply_rbac_policy.py policies.json
+    python app/database/apply_rbac_policy.py bu1_policy.csv --domain bu1
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+
+# 确保可以从项目根目录运行
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from app.services.casbin_domains import is_valid_domain
+from app.services.casbin_policy_file import PolicyFileError, read_policy_file
+from app.services.casbin_service import CasbinService
+from app.services.casbin_watcher import configure_policy_watcher
+
+
+async def apply_policy_file(path: str, dry_run: bool, domain: str = "") -> int:
+    if domain and not is_valid_domain(domain):
+        print(f"无效的租户: {domain!r}", file=sys.stderr)
+        return 2
+    try:
+        desired = read_policy_file(path)
+    except (OSError, PolicyFileError) as e:
+        print(f"读取策略文件失败: {e}", file=sys.stderr)
+        return 2
+
+    # 租户的策略直接与数据库比对，不需要加载默认租户的策略
+    if not domain and not await CasbinService.load_policy():
+        print("加载现有策略失败，详见日志", file=sys.stderr)
+        return 1
+    configure_policy_watcher()
+    result = await CasbinService.apply_policy_set(desired, dry_run=dry_run, domain=domain)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if result["status"] == "failed" else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="声明式应用 Casbin 策略集")
+    parser.add_argument("path", help="策略文件（.csv 或 .json）")
+    parser.add_argument("--dry-run", action="store_true", help="只计算差异，不写入")
+    parser.add_argument("--domain", default="", help="租户（默认为默认租户）")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(apply_policy_file(args.path, args.dry_run, args.domain)))
+
+
+if __name__ == "__main__":
+    main()
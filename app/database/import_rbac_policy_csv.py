@@ -1,46 +1,84 @@
 """
-将 app/core/rbac_policy.csv 批量导入到数据库 Casbin 策略表
-只需运行一次即可
+将 rbac_policy.csv 格式的策略文件流式批量导入到数据库 Casbin 策略表（默认 app/core/rbac_policy.csv）
+按块读取、按哈希与已有规则去重、多行写入，支持数百万行的文件；中断后重新运行会从检查点继续
+导入只新增规则，不删除文件中没有的规则（需要完整替换时使用 apply_rbac_policy.py）
+
+用法:
+    python app/database/import_rbac_policy_csv.py
+    python app/database/import_rbac_policy_csv.py iam_export.csv --chunk-lines 100000 --load-data
+    python app/database/import_rbac_policy_csv.py bu1_policy.csv --domain bu1
 """
 import os
 import sys
-import csv
+import json
+import asyncio
+import argparse
+from typing import Optional
 
 # 确保可以从项目根目录运行
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from app.services.casbin_service import CasbinService
+from app.services.casbin_domains import is_valid_domain
+from app.services.casbin_import import IMPORT_CHUNK_LINES, PolicyImporter
+from app.services.casbin_policy_file import PolicyFileError
+from app.services.casbin_watcher import configure_policy_watcher, publish_policy_change
 
 CSV_PATH = os.path.join(os.path.dirname(__file__), '../core/rbac_policy.csv')
 
-def import_csv_to_db():
-    print(f"开始导入 {CSV_PATH} 到数据库...")
-    enforcer = CasbinService.get_enforcer()
-    
-    # 读取CSV
-    with open(CSV_PATH, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        count = 0
-        for row in reader:
-            row = [x.strip() for x in row if x.strip()]
-            if not row or row[0].startswith('#'):
-                continue
-            if row[0] == 'p':
-                # p, sub, obj, act
-                if len(row) >= 4:
-                    sub, obj, act = row[1], row[2], row[3]
-                    if enforcer.add_policy(sub, obj, act):
-                        print(f"添加策略: {sub} -> {obj} [{act}]")
-                        count += 1
-            elif row[0] == 'g':
-                # g, user, role
-                if len(row) >= 3:
-                    user, role = row[1], row[2]
-                    if enforcer.add_role_for_user(user, role):
-                        print(f"分配角色: {user} -> {role}")
-                        count += 1
-        enforcer.save_policy()
-    print(f"导入完成，共导入 {count} 条策略/角色分配。")
+
+def _session_factory(load_data: bool):
+    """LOAD DATA LOCAL INFILE 需要在连接上开启 local_infile，单独创建引擎"""
+    if not load_data:
+        return None
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database.session import DATABASE_URL
+
+    engine = create_async_engine(DATABASE_URL, connect_args={"local_infile": True})
+    return sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def import_csv_to_db(
+    path: str, chunk_lines: int, load_data: bool, strict: bool, checkpoint: Optional[str] = None, domain: str = ""
+) -> int:
+    if domain and not is_valid_domain(domain):
+        print(f"无效的租户: {domain!r}", file=sys.stderr)
+        return 2
+    print(f"开始导入 {path} 到数据库{f'（租户 {domain}）' if domain else ''}...")
+    importer = PolicyImporter(
+        session_factory=_session_factory(load_data),
+        chunk_lines=chunk_lines,
+        load_data=load_data,
+        strict=strict,
+        domain=domain,
+    )
+    try:
+        stats = await importer.run(path, checkpoint)
+    except (OSError, PolicyFileError) as e:
+        print(f"导入中止: {e}（已提交的部分可重新运行继续）", file=sys.stderr)
+        return 1
+
+    # 通知正在运行的 worker 重新加载（未启用策略同步时不做任何事）
+    if stats["written"] and configure_policy_watcher() is not None:
+        await publish_policy_change("reload", domain=domain)
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    print(f"导入完成，共写入 {stats['written']} 条策略/角色分配，{stats['rows_per_sec']} 行/秒。")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式批量导入 Casbin 策略文件")
+    parser.add_argument("path", nargs="?", default=CSV_PATH, help="策略文件（rbac_policy.csv 格式）")
+    parser.add_argument("--chunk-lines", type=int, default=IMPORT_CHUNK_LINES, help="每块（每个事务）的行数")
+    parser.add_argument("--load-data", action="store_true", help="MySQL 下使用 LOAD DATA LOCAL INFILE 写入")
+    parser.add_argument("--strict", action="store_true", help="遇到格式错误的行时中止（默认跳过并计数）")
+    parser.add_argument("--checkpoint", help="检查点文件路径（默认 <path>.checkpoint.json）")
+    parser.add_argument("--domain", default="", help="导入到指定租户（默认为默认租户）")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(import_csv_to_db(
+        args.path, args.chunk_lines, args.load_data, args.strict, args.checkpoint, args.domain
+    )))
+
 
 if __name__ == "__main__":
-    import_csv_to_db() 
\ No newline at end of file
+    main()
@@ -0,0 +1,42 @@
+"""casbin_rule_domain
+
+Revision ID: 4c2d8e61a9f3
+Revises: e3a91c5f7b20
+Create Date: 2026-10-17 16:40:12.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c2d8e61a9f3'
+down_revision: Union[str, None] = 'e3a91c5f7b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    casbin_rule 增加租户列
+    现有规则全部属于默认租户（空字符串），其 rule_hash 计算方式不变，不需要回填
+    """
+    op.add_column('casbin_rule', sa.Column('domain', sa.String(length=255), nullable=False, server_default='',
+                                           comment='租户，空字符串为默认租户'))
+    op.alter_column('casbin_rule', 'rule_hash', existing_type=sa.CHAR(length=64), existing_nullable=False,
+                    comment='规则哈希 SHA-256(ptype, v0 ~ v5[, domain])，保证规则唯一',
+                    existing_comment='规则哈希 SHA-256(ptype, v0 ~ v5)，保证规则唯一')
+    op.create_index('idx_casbin_rule_domain_ptype', 'casbin_rule', ['domain', 'ptype'],
+                    mysql_length={'ptype': 32})
+
+
+def downgrade() -> None:
+    """删除其他租户的规则后去掉租户列（默认租户的规则保留）"""
+    op.execute("DELETE FROM casbin_rule WHERE domain <> ''")
+    op.drop_index('idx_casbin_rule_domain_ptype', table_name='casbin_rule')
+    op.alter_column('casbin_rule', 'rule_hash', existing_type=sa.CHAR(length=64), existing_nullable=False,
+                    comment='规则哈希 SHA-256(ptype, v0 ~ v5)，保证规则唯一',
+                    existing_comment='规则哈希 SHA-256(ptype, v0 ~ v5[, domain])，保证规则唯一')
+    op.drop_column('casbin_rule', 'domain')
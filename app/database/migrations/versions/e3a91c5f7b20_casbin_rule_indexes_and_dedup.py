@@ -0,0 +1,70 @@
+"""casbin_rule_indexes_and_dedup
+
+Revision ID: e3a91c5f7b20
+Revises: 7d8dc00eb31f
+Create Date: 2026-10-17 10:12:45.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a91c5f7b20'
+down_revision: Union[str, None] = '7d8dc00eb31f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 与 app.services.casbin_adapter.rule_hash 的计算方式一致
+RULE_HASH_SQL = (
+    "SHA2(CONCAT_WS(CHAR(31 USING utf8mb4), ptype, "
+    "COALESCE(v0, ''), COALESCE(v1, ''), COALESCE(v2, ''), "
+    "COALESCE(v3, ''), COALESCE(v4, ''), COALESCE(v5, '')), 256)"
+)
+
+
+def upgrade() -> None:
+    """
+    casbin_rule 去重并建立复合索引
+    1. 新增 rule_hash 列并按现有数据回填
+    2. 删除重复规则，每组只保留 id 最小的一行
+    3. rule_hash 改为非空并建立唯一索引
+    4. 用 (ptype, v0, v1, v2)、(ptype, v1) 复合索引替换原来的单列索引
+    """
+    op.add_column('casbin_rule', sa.Column('rule_hash', sa.CHAR(length=64), nullable=True,
+                                           comment='规则哈希 SHA-256(ptype, v0 ~ v5)，保证规则唯一'))
+    op.execute(f"UPDATE casbin_rule SET rule_hash = {RULE_HASH_SQL}")
+
+    # 派生表带 GROUP BY 会被物化，可以在 DELETE 中引用同一张表
+    op.execute(
+        "DELETE r FROM casbin_rule r "
+        "JOIN (SELECT rule_hash, MIN(id) AS keep_id FROM casbin_rule GROUP BY rule_hash) k "
+        "ON r.rule_hash = k.rule_hash AND r.id <> k.keep_id"
+    )
+
+    op.alter_column('casbin_rule', 'rule_hash', existing_type=sa.CHAR(length=64), nullable=False,
+                    existing_comment='规则哈希 SHA-256(ptype, v0 ~ v5)，保证规则唯一')
+    op.create_index('uq_casbin_rule_rule_hash', 'casbin_rule', ['rule_hash'], unique=True)
+
+    # utf8mb4 下索引总长度不能超过 3072 字节：ptype 和 v2 使用前缀索引
+    op.create_index('idx_casbin_rule_ptype_v0_v1_v2', 'casbin_rule', ['ptype', 'v0', 'v1', 'v2'],
+                    mysql_length={'ptype': 32, 'v2': 64})
+    op.create_index('idx_casbin_rule_ptype_v1', 'casbin_rule', ['ptype', 'v1'])
+
+    # 单列索引已被复合索引的最左前缀覆盖
+    op.drop_index('idx_casbin_rule_v1', table_name='casbin_rule')
+    op.drop_index('idx_casbin_rule_v0', table_name='casbin_rule')
+    op.drop_index('idx_casbin_rule_ptype', table_name='casbin_rule')
+
+
+def downgrade() -> None:
+    """恢复单列索引并删除 rule_hash（已删除的重复规则不会恢复）"""
+    op.create_index('idx_casbin_rule_ptype', 'casbin_rule', ['ptype'])
+    op.create_index('idx_casbin_rule_v0', 'casbin_rule', ['v0'])
+    op.create_index('idx_casbin_rule_v1', 'casbin_rule', ['v1'])
+    op.drop_index('idx_casbin_rule_ptype_v1', table_name='casbin_rule')
+    op.drop_index('idx_casbin_rule_ptype_v0_v1_v2', table_name='casbin_rule')
+    op.drop_index('uq_casbin_rule_rule_hash', table_name='casbin_rule')
+    op.drop_column('casbin_rule', 'rule_hash')
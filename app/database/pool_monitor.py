@@ -0,0 +1,138 @@
+"""
+数据库连接池监控
+InstrumentedQueuePool 在 AsyncAdaptedQueuePool.connect() 外计时，记录等待时间、超时次数与签出峰值；
+新建连接、连接失效（pre-ping 发现的断开连接、执行中断开）通过连接池事件计数
+只使用连接池的公开接口（size / overflow / checkedin / checkedout / timeout）与事件，不读取 SQLAlchemy 的内部属性
+
+等待时间是从请求连接到拿到可用连接的耗时（含 pre-ping）：池中有空闲连接时只有微秒级，
+连接全部签出且溢出已满时为排队时间，超过 DB_POOL_TIMEOUT 抛出 sqlalchemy.exc.TimeoutError
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+from app.core.histogram import LatencyHistogram
+from app.core.logging import get_logger
+
+logger = get_logger("db_pool")
+
+# 等待时间直方图桶上界（毫秒）
+WAIT_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolMonitor:
+    """连接池计数器与等待时间直方图"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.max_checked_out = 0
+        self.max_wait_ms = 0.0
+        self.wait_ms = LatencyHistogram(WAIT_BUCKETS_MS)
+
+    def observe_checkout(self, wait_ms: float, waited: bool, checked_out: int) -> None:
+        self.checkouts += 1
+        if waited:
+            self.waited += 1
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.max_checked_out = max(self.max_checked_out, checked_out)
+        self.wait_ms.observe(wait_ms)
+
+    def observe_timeout(self, wait_ms: float, status: str) -> None:
+        self.timeouts += 1
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        logger.warning(f"⏳ 获取数据库连接超时 ({wait_ms:.1f}ms): {status}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "waited": self.waited,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "max_checked_out": self.max_checked_out,
+            "avg_wait_ms": round(self.wait_ms.sum / self.wait_ms.count, 3) if self.wait_ms.count else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    记录取连接等待时间的 AsyncAdaptedQueuePool，engine.dispose() 重建连接池后沿用同一个 PoolMonitor
+    溢出上限、回收时间与 pre-ping 取自构造参数（recreate() 重建时同样按关键字参数传入）
+    """
+
+    def __init__(self, *args, max_overflow: int = 10, recycle: int = -1, pre_ping: bool = False, **kwargs):
+        super().__init__(*args, max_overflow=max_overflow, recycle=recycle, pre_ping=pre_ping, **kwargs)
+        self.overflow_limit = max_overflow
+        self.recycle_seconds = recycle
+        self.pre_ping_enabled = pre_ping
+        self.monitor = PoolMonitor()
+
+    def connect(self):
+        # 没有空闲连接且溢出已满时需要排队等待其他请求归还连接（溢出上限为 -1 时不限制）
+        waited = -1 < self.overflow_limit <= self.overflow() and self.checkedin() == 0
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.monitor.observe_timeout((time.perf_counter() - started) * 1000, self.status())
+            raise
+        self.monitor.observe_checkout((time.perf_counter() - started) * 1000, waited, self.checkedout())
+        return connection
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.monitor = self.monitor
+        return pool
+
+
+def instrument_pool(engine) -> None:
+    """在引擎的连接池上注册新建连接与连接失效的事件计数（对 engine.dispose() 之后重建的连接池同样生效）"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    def monitor() -> Optional[PoolMonitor]:
+        return getattr(sync_engine.pool, "monitor", None)
+
+    @event.listens_for(sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if monitor() is not None:
+            monitor().connects += 1
+
+    @event.listens_for(sync_engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        if monitor() is not None:
+            monitor().invalidations += 1
+        logger.warning(f"🔌 数据库连接失效: {type(exception).__name__ if exception else 'invalidated'}")
+
+
+def get_pool_stats(engine) -> Dict[str, Any]:
+    """连接池当前状态（大小、签出数、溢出数）与累计统计"""
+    pool: Pool = getattr(engine, "sync_engine", engine).pool
+    stats: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update({
+            "size": pool.size(),
+            "timeout": pool.timeout(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            # 未建满 pool_size 个连接时 QueuePool 的溢出计数为负数
+            "overflow": max(pool.overflow(), 0),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            "max_overflow": pool.overflow_limit,
+            "recycle": pool.recycle_seconds,
+            "pre_ping": pool.pre_ping_enabled,
+        })
+    monitor = getattr(pool, "monitor", None)
+    if monitor is not None:
+        stats.update(monitor.stats())
+    return stats
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio as aioredis
 from typing import Optional
 from app.core.config import get_settings
 
@@ -8,6 +9,10 @@ settings = get_settings()
 redis_pool: Optional[redis.ConnectionPool] = None
 redis_client: Optional[redis.Redis] = None
 
+# Async Redis connection pool (used from the event loop)
+async_redis_pool: Optional[aioredis.ConnectionPool] = None
+async_redis_client: Optional[aioredis.Redis] = None
+
 
 def get_redis_pool() -> redis.ConnectionPool:
     """
@@ -37,6 +42,23 @@ def get_redis_client() -> redis.Redis:
     return redis_client
 
 
+def get_async_redis_client() -> aioredis.Redis:
+    """
+    Create and return asyncio Redis client instance.
+    Used by request-path code so Redis round trips do not block the event loop.
+    """
+    global async_redis_pool, async_redis_client
+    if async_redis_client is None:
+        async_redis_pool = aioredis.ConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=20,
+            retry_on_timeout=True,
+            decode_responses=True
+        )
+        async_redis_client = aioredis.Redis(connection_pool=async_redis_pool)
+    return async_redis_client
+
+
 def get_redis() -> redis.Redis:
     """
     Dependency function to get Redis client.
@@ -69,3 +91,17 @@ def close_redis_connection():
     if redis_pool:
         redis_pool.disconnect()
         redis_pool = None
+
+
+async def close_async_redis_connection():
+    """
+    Close asyncio Redis connection pool.
+    Should be called when shutting down the application.
+    """
+    global async_redis_pool, async_redis_client
+    if async_redis_client:
+        await async_redis_client.aclose()
+        async_redis_client = None
+    if async_redis_pool:
+        await async_redis_pool.disconnect()
+        async_redis_pool = None
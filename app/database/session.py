@@ -1,12 +1,25 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import get_settings
+from app.database.pool_monitor import InstrumentedQueuePool, instrument_pool
 
 settings = get_settings()
 
 DATABASE_URL = settings.SQLALCHEMY_DATABASE_URI.replace("mysql+pymysql://", "mysql+aiomysql://")
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+# Casbin 适配器、用户管理与请求依赖都通过 SessionLocal 共用这一个连接池
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    future=True,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+instrument_pool(engine)
 SessionLocal = sessionmaker(
     bind=engine,
     class_=AsyncSession,
@@ -10,8 +10,11 @@ from app.core.config import get_settings
 from app.schemas.user import User as UserRead, UserCreate
 from app.schemas.auth import UserLogin
 from app.services.casbin_service import CasbinService
-from fastapi_authz import CasbinMiddleware
-from app.api.middleware import CasbinAuthBackend
+from app.api.middleware import CasbinAuthBackend, CachedCasbinMiddleware
+from app.services.principal_cache import start_invalidation_listener, stop_invalidation_listener
+from app.services.casbin_watcher import subscribe_policy_watcher, start_policy_watcher, stop_policy_watcher
+from app.database.redis_client import close_async_redis_connection
+from app.core.hashing import password_hasher
 import time
 
 # 初始化日志系统
@@ -90,8 +93,9 @@ if settings.BACKEND_CORS_ORIGINS:
     )
 
 # 2. 添加 Casbin 权限控制中间件（倒数第二执行）
+# 策略在 startup 事件中异步加载，授权结果按策略版本缓存
 enforcer = CasbinService.get_enforcer()
-app.add_middleware(CasbinMiddleware, enforcer=enforcer)
+app.add_middleware(CachedCasbinMiddleware, enforcer=enforcer)
 
 # 3. 添加认证中间件（倒数第三执行）
 app.add_middleware(AuthenticationMiddleware, backend=CasbinAuthBackend())
@@ -135,6 +139,25 @@ app.include_router(
 # 注册自定义 /users 路由（带权限控制）
 app.include_router(api_router, prefix="/api/v1")
 
+@app.on_event("startup")
+async def on_startup():
+    # 先订阅多 worker 策略变更（启用时），再异步加载 Casbin 策略（配置快照时优先从快照恢复），最后开始处理变更
+    await subscribe_policy_watcher()
+    # 路由在此时已全部注册，加载策略时同时计算路由级授权表
+    CasbinService.register_routes(app.routes)
+    await CasbinService.boot_policy()
+    start_policy_watcher()
+    # 订阅用户身份缓存失效广播（启用 Redis 共享缓存时）
+    await start_invalidation_listener()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_policy_watcher()
+    await CasbinService.stop_snapshot_writer()
+    await stop_invalidation_listener()
+    await close_async_redis_connection()
+    password_hasher.shutdown()
+
 @app.get("/health")
 async def health_check():
     return {
@@ -14,6 +14,14 @@ class TokenPayload(BaseModel):
     class Config:
         extra = "allow"  # 允许额外字段
 
+class Principal(BaseModel):
+    """认证后的用户身份，由 CasbinAuthBackend 解析并挂载到 request.state.principal"""
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    is_superuser: bool
+
 class LoginData(BaseModel):
     username: str
     password: str
@@ -8,6 +8,7 @@ class CasbinRole(BaseModel):
     name: str
     description: Optional[str] = None
     users: List[str] = []  # 拥有此角色的用户列表
+    policy_count: int = 0  # 直接授予此角色的策略数
     
 class CasbinPolicy(BaseModel):
     """Casbin策略信息"""
@@ -36,6 +37,7 @@ class CasbinRoleList(BaseModel):
     """角色列表响应"""
     roles: List[CasbinRole]
     count: int
+    next_cursor: Optional[str] = None  # 下一页游标（本页最后一个角色名），没有更多角色时为空
     
 class CasbinPolicyList(BaseModel):
     """策略列表响应"""
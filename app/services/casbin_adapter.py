@@ -0,0 +1,326 @@
+"""
+Casbin 异步数据库适配器
+复用 app.database.session 中 create_async_engine 的连接池读写 casbin_rule 表，
+所有策略 I/O 都不会阻塞事件循环，也不再为 Casbin 单独创建同步连接池
+
+每个适配器只读写一个租户（domain 列）的规则，默认租户为空字符串
+"""
+
+import hashlib
+import sys
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+from casbin.persist.adapters.asyncio import AsyncAdapter, AsyncBatchAdapter, AsyncFilteredAdapter
+from sqlalchemy import delete, func, insert, select
+from app.database.session import SessionLocal
+from app.users.models import CasbinRule
+
+# casbin_rule 表的策略值列（v0 ~ v5）
+_VALUE_COLUMNS = ("v0", "v1", "v2", "v3", "v4", "v5")
+
+# 批量写入时每条 SQL 语句包含的最大行数（避免超过 max_allowed_packet）
+BATCH_CHUNK_SIZE = 1000
+
+# 导出规则时每页读取的行数（键集分页）
+EXPORT_PAGE_SIZE = 5000
+
+# rule_hash 各字段之间的分隔符（与迁移中 CONCAT_WS(CHAR(31), ...) 一致）
+_HASH_SEPARATOR = "\x1f"
+
+# 默认租户：未启用多租户或请求未指定租户时使用
+DEFAULT_DOMAIN = ""
+
+
+def rule_hash(ptype: str, rule: Sequence[str], domain: str = DEFAULT_DOMAIN) -> str:
+    """
+    规则哈希：SHA-256(ptype, v0 ~ v5[, domain]) 的十六进制串，空值按空字符串处理
+    默认租户的规则不带 domain，与迁移 e3a91c5f7b20 中
+    SHA2(CONCAT_WS(CHAR(31), ptype, COALESCE(v0, ''), ...), 256) 结果相同；
+    其他租户在末尾追加 domain，不同租户的相同规则可以同时存在
+    """
+    values = [ptype, *("" if value is None else value for value in rule)]
+    values.extend([""] * (len(_VALUE_COLUMNS) + 1 - len(values)))
+    if domain:
+        values.append(domain)
+    return hashlib.sha256(_HASH_SEPARATOR.join(values).encode("utf-8")).hexdigest()
+
+
+def _rule_to_row(ptype: str, rule: Sequence[str], domain: str = DEFAULT_DOMAIN) -> dict:
+    """
+    将一条策略转换为 casbin_rule 行
+    未使用的值列显式为 None，不同长度的规则（如 p 与 g）可以放在同一条多行 INSERT 中
+    """
+    row = dict.fromkeys(_VALUE_COLUMNS)
+    row["ptype"] = ptype
+    for column, value in zip(_VALUE_COLUMNS, rule):
+        row[column] = value
+    row["domain"] = domain
+    row["rule_hash"] = rule_hash(ptype, rule, domain)
+    return row
+
+
+def _insert_ignore():
+    """
+    重复规则（rule_hash 唯一索引冲突）直接忽略的 INSERT
+    其他 worker 已写入同一规则时，本地写入不会因唯一约束失败
+    """
+    return insert(CasbinRule).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+
+
+def _row_to_rule(row) -> List[str]:
+    """
+    将 casbin_rule 行的 v0 ~ v5 转换为策略值列表（去掉末尾空值）
+    值经过 sys.intern，同名的角色、资源在规则、角色图和索引中共享同一个字符串对象
+    """
+    values = list(row[1:])
+    while values and values[-1] is None:
+        values.pop()
+    return ["" if value is None else sys.intern(value) for value in values]
+
+
+def _load_row(row, model) -> None:
+    """将一行策略直接加入模型（等价于 persist.load_policy_line，但不经过字符串拼接）"""
+    ptype = row[0]
+    sec = ptype[:1]
+    if sec not in model.model or ptype not in model.model[sec]:
+        return
+    model.model[sec][ptype].policy.append(_row_to_rule(row))
+
+
+class PolicyFilter:
+    """
+    过滤加载条件
+    - ptypes: 整体加载的策略类型（例如全部 g 规则）
+    - subjects: 额外加载 p 规则中主体 (v0) 属于该集合的规则
+    """
+
+    def __init__(self, ptypes: Iterable[str] = ("g",), subjects: Iterable[str] = ()):
+        self.ptypes = tuple(ptypes)
+        self.subjects = sorted(set(subjects))
+
+
+def _chunks(items: Sequence, size: int = BATCH_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class AsyncSQLAlchemyAdapter(AsyncAdapter, AsyncBatchAdapter, AsyncFilteredAdapter):
+    """基于 SQLAlchemy AsyncSession 的 Casbin 适配器，只读写 domain 租户的规则"""
+
+    def __init__(self, session_factory=SessionLocal, domain: str = DEFAULT_DOMAIN):
+        self._session_factory = session_factory
+        self.domain = domain
+        self._filtered = False
+
+    def for_domain(self, domain: str) -> "AsyncSQLAlchemyAdapter":
+        """使用同一会话工厂（同一连接池）读写另一个租户的适配器"""
+        return AsyncSQLAlchemyAdapter(self._session_factory, domain)
+
+    def is_filtered(self) -> bool:
+        """最近一次加载是否为过滤加载（过滤加载后禁止 save_policy 整表覆盖）"""
+        return self._filtered
+
+    def _in_domain(self):
+        return CasbinRule.domain == self.domain
+
+    def _rule_filter(self, ptype: str, rule: Sequence[str], field_index: int = 0) -> list:
+        """
+        构造按 ptype 和字段值精确匹配的查询条件
+        从 v0 或 v1 开始的条件分别命中 (ptype, v0, v1, v2) 与 (ptype, v1) 索引
+        """
+        conditions = [CasbinRule.ptype == ptype, self._in_domain()]
+        for offset, value in enumerate(rule):
+            if value == "":
+                continue
+            conditions.append(getattr(CasbinRule, _VALUE_COLUMNS[field_index + offset]) == value)
+        return conditions
+
+    def _select_rows(self):
+        return select(
+            CasbinRule.ptype,
+            *(getattr(CasbinRule, column) for column in _VALUE_COLUMNS),
+        ).where(self._in_domain())
+
+    async def load_policy(self, model):
+        """从数据库加载全部策略"""
+        stmt = self._select_rows().order_by(CasbinRule.id)
+        async with self._session_factory() as session:
+            result = await session.execute(stmt)
+            for row in result:
+                _load_row(row, model)
+        self._filtered = False
+
+    async def load_filtered_policy(self, model, filter: Optional[PolicyFilter]):
+        """按 PolicyFilter 加载部分策略：指定 ptype 的全部规则 + 指定主体的 p 规则"""
+        if filter is None:
+            return await self.load_policy(model)
+
+        async with self._session_factory() as session:
+            if filter.ptypes:
+                stmt = self._select_rows().where(CasbinRule.ptype.in_(filter.ptypes)).order_by(CasbinRule.id)
+                for row in await session.execute(stmt):
+                    _load_row(row, model)
+            for chunk in _chunks(filter.subjects):
+                stmt = self._select_rows().where(
+                    CasbinRule.ptype == "p", CasbinRule.v0.in_(chunk)
+                ).order_by(CasbinRule.id)
+                for row in await session.execute(stmt):
+                    _load_row(row, model)
+        self._filtered = True
+
+    async def load_policy_for_subjects(self, ptype: str, subjects: Sequence[str]) -> List[List[str]]:
+        """读取指定主体 (v0) 的规则，不修改模型（用于按需加载）"""
+        rules: List[List[str]] = []
+        async with self._session_factory() as session:
+            for chunk in _chunks(list(subjects)):
+                stmt = self._select_rows().where(
+                    CasbinRule.ptype == ptype, CasbinRule.v0.in_(chunk)
+                ).order_by(CasbinRule.id)
+                for row in await session.execute(stmt):
+                    rules.append(_row_to_rule(row))
+        return rules
+
+    async def has_rules(self) -> bool:
+        """租户是否有规则（只读一行，命中 (domain, ptype) 索引）"""
+        async with self._session_factory() as session:
+            result = await session.execute(select(CasbinRule.id).where(self._in_domain()).limit(1))
+            return result.first() is not None
+
+    async def policy_stamp(self) -> Tuple[int, int]:
+        """策略表的 (行数, 最大 id)，用于判断策略快照之后数据库是否有变化"""
+        async with self._session_factory() as session:
+            result = await session.execute(
+                select(func.count(CasbinRule.id), func.max(CasbinRule.id)).where(self._in_domain())
+            )
+            count, max_id = result.one()
+        return int(count), int(max_id or 0)
+
+    async def load_rows_after(self, last_id: int) -> List[Tuple[str, List[str]]]:
+        """读取 id 大于 last_id 的规则（快照之后新增的行），返回 (ptype, 规则) 列表"""
+        stmt = self._select_rows().where(CasbinRule.id > last_id).order_by(CasbinRule.id)
+        async with self._session_factory() as session:
+            result = await session.execute(stmt)
+            return [(row[0], _row_to_rule(row)) for row in result]
+
+    async def load_rules(self, ptype: str) -> List[List[str]]:
+        """读取指定类型的全部规则，不修改模型（过滤加载模式下声明式应用与数据库比对）"""
+        stmt = self._select_rows().where(CasbinRule.ptype == ptype).order_by(CasbinRule.id)
+        async with self._session_factory() as session:
+            result = await session.stream(stmt)
+            return [_row_to_rule(row) async for row in result]
+
+    async def iter_rules(
+        self,
+        ptype: Optional[str] = None,
+        subject: Optional[str] = None,
+        obj_prefix: Optional[str] = None,
+        after_id: int = 0,
+        page_size: int = EXPORT_PAGE_SIZE,
+    ) -> AsyncIterator[Tuple[int, str, List[str]]]:
+        """
+        按 id 顺序逐页读取规则，产出 (id, ptype, 规则)
+        每页一条 WHERE id > :last_id ORDER BY id LIMIT :page_size 查询（键集分页），
+        不持有长事务，内存占用只与页大小有关；after_id 用于从上次中断处继续
+        """
+        conditions = [self._in_domain()]
+        if ptype is not None:
+            conditions.append(CasbinRule.ptype == ptype)
+        if subject is not None:
+            conditions.append(CasbinRule.v0 == subject)
+        if obj_prefix:
+            escaped = obj_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append(CasbinRule.v1.like(f"{escaped}%", escape="\\"))
+        last_id = after_id
+        while True:
+            stmt = (
+                select(CasbinRule.id, CasbinRule.ptype, *(getattr(CasbinRule, column) for column in _VALUE_COLUMNS))
+                .where(CasbinRule.id > last_id, *conditions)
+                .order_by(CasbinRule.id)
+                .limit(page_size)
+            )
+            async with self._session_factory() as session:
+                rows = (await session.execute(stmt)).all()
+            for row in rows:
+                yield row[0], row[1], _row_to_rule(row[1:])
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1][0]
+            # 读取下一页前释放当前页，同一时刻只持有一页
+            rows = row = None
+
+    async def save_policy(self, model):
+        """用模型中的策略整体替换数据库中的策略（单个事务）"""
+        rows = []
+        for sec in ("p", "g"):
+            if sec not in model.model:
+                continue
+            for ptype, assertion in model.model[sec].items():
+                rows.extend(_rule_to_row(ptype, rule, self.domain) for rule in assertion.policy)
+
+        async with self._session_factory() as session:
+            async with session.begin():
+                await session.execute(delete(CasbinRule).where(self._in_domain()))
+                for chunk in _chunks(rows):
+                    await session.execute(_insert_ignore(), chunk)
+        return True
+
+    async def add_policy(self, sec, ptype, rule):
+        """新增一条策略（数据库中已存在相同规则时忽略）"""
+        async with self._session_factory() as session:
+            async with session.begin():
+                await session.execute(_insert_ignore().values(**_rule_to_row(ptype, rule, self.domain)))
+        return True
+
+    async def remove_policy(self, sec, ptype, rule):
+        """删除一条策略：按 rule_hash 唯一索引单点删除"""
+        async with self._session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(CasbinRule).where(CasbinRule.rule_hash == rule_hash(ptype, rule, self.domain))
+                )
+        return result.rowcount > 0
+
+    async def remove_filtered_policy(self, sec, ptype, field_index, *field_values):
+        """按字段过滤删除策略"""
+        async with self._session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(CasbinRule).where(*self._rule_filter(ptype, field_values, field_index))
+                )
+        return result.rowcount > 0
+
+    async def add_policies(self, sec, ptype, rules):
+        """批量新增策略：多行 INSERT（重复规则忽略），全部在同一个事务中完成"""
+        rows = [_rule_to_row(ptype, rule, self.domain) for rule in rules]
+        async with self._session_factory() as session:
+            async with session.begin():
+                for chunk in _chunks(rows):
+                    await session.execute(_insert_ignore(), chunk)
+        return True
+
+    async def remove_policies(self, sec, ptype, rules):
+        """批量删除策略：用 rule_hash IN (...) 走唯一索引删除，全部在同一个事务中完成"""
+        hashes = list(dict.fromkeys(rule_hash(ptype, rule, self.domain) for rule in rules))
+        removed = 0
+        async with self._session_factory() as session:
+            async with session.begin():
+                for chunk in _chunks(hashes):
+                    result = await session.execute(delete(CasbinRule).where(CasbinRule.rule_hash.in_(chunk)))
+                    removed += result.rowcount
+        return removed > 0
+
+    async def apply_changes(self, removed: Dict[str, Sequence[Sequence[str]]], added: Dict[str, Sequence[Sequence[str]]]):
+        """
+        在同一个事务中删除 removed、插入 added 中的规则（键为 ptype）
+        删除按 rule_hash 走唯一索引，插入为多行 INSERT（重复规则忽略）；任一语句失败时整体回滚
+        """
+        async with self._session_factory() as session:
+            async with session.begin():
+                for ptype, rules in removed.items():
+                    hashes = list(dict.fromkeys(rule_hash(ptype, rule, self.domain) for rule in rules))
+                    for chunk in _chunks(hashes):
+                        await session.execute(delete(CasbinRule).where(CasbinRule.rule_hash.in_(chunk)))
+                for ptype, rules in added.items():
+                    rows = [_rule_to_row(ptype, rule, self.domain) for rule in rules]
+                    for chunk in _chunks(rows):
+                        await session.execute(_insert_ignore(), chunk)
+        return True
@@ -0,0 +1,288 @@
+"""
+多租户授权：每个租户（casbin_rule.domain）一个独立的执行器
+租户的执行器在第一次收到该租户的请求时从数据库加载，只包含该租户的规则；
+驻留内存的租户规则总数或租户数超出上限时，按最近最少使用淘汰空闲租户，之后再次访问时重新加载
+
+内存占用与 enforce 开销只与活跃租户的规则有关，与租户总数无关
+默认租户（空字符串）仍由 CasbinService 管理，常驻内存，不受淘汰影响
+
+数据库中没有规则的租户视为不存在：不会为它缓存空的执行器（否则任意租户名都能占满驻留名额），
+每次访问都重新确认，之后创建的租户立即可用；确认存在过的租户记在已知租户集合中，淘汰后再次加载时不再确认
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+import casbin
+
+from app.core.config import get_settings
+from app.core.logging import get_logger, log_casbin, log_error
+from app.services.casbin_adapter import AsyncSQLAlchemyAdapter
+from app.services.casbin_index import PathPatternIndex, key_match2_func, supports_index
+from app.services.casbin_policy_file import POLICY_ARITY, PolicySet
+from app.services.casbin_roles import RoleClosure
+from app.services.casbin_routes import RouteTable
+from app.services.casbin_service import APPLY_REPORT_LIMIT, MODEL_PATH, CasbinService, decision_cache
+
+settings = get_settings()
+logger = get_logger("casbin_domains")
+
+# 合法的租户名：字母或数字开头，最长 64 个字符
+DOMAIN_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.:-]{0,63}$")
+
+
+def is_valid_domain(domain: str) -> bool:
+    return DOMAIN_PATTERN.match(domain) is not None
+
+
+class UnknownDomainError(LookupError):
+    """租户不存在（数据库中没有该租户的规则）"""
+
+
+class DomainUnavailableError(Exception):
+    """租户策略加载失败（数据库不可用等），请求应稍后重试"""
+
+
+class DomainEnforcer:
+    """单个租户的编译后策略：执行器、角色闭包、路径模式索引与路由级授权表"""
+
+    def __init__(self, adapter: AsyncSQLAlchemyAdapter, routes: Optional[List[Any]] = None):
+        self.domain = adapter.domain
+        self.adapter = adapter
+        self.enforcer = casbin.AsyncEnforcer(MODEL_PATH, self.adapter)
+        self.enforcer.enable_auto_save(False)
+        self.enforcer.add_function("keyMatch2", key_match2_func)
+        self.closure = RoleClosure(self.enforcer.rm_map["g"].max_hierarchy_level)
+        self.index: Optional[PathPatternIndex] = None
+        self.route_table: Optional[RouteTable] = None
+        if settings.CASBIN_PATH_INDEX_ENABLED and supports_index(self.enforcer):
+            self.index = PathPatternIndex()
+            if routes is not None and settings.CASBIN_ROUTE_TABLE_ENABLED:
+                self.route_table = RouteTable(routes)
+        self.rules = 0
+        self.load_ms = 0.0
+
+    async def load(self) -> None:
+        """从数据库加载该租户的全部规则并重建派生结构"""
+        started = time.perf_counter()
+        await self.enforcer.load_policy()
+        model = self.enforcer.get_model().model
+        p_rules, g_rules = model["p"]["p"].policy, model["g"]["g"].policy
+        self.closure.build(g_rules, p_rules)
+        if self.index is not None:
+            self.index.build(p_rules)
+        if self.route_table is not None:
+            self.route_table.build(p_rules)
+        self.rules = len(p_rules) + len(g_rules)
+        self.load_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def enforce(self, sub: str, obj: str, act: str) -> bool:
+        """与 CasbinService._evaluate 相同的判定路径：路由级授权表 -> 路径模式索引 -> 执行器"""
+        if self.index is None:
+            return self.enforcer.enforce(sub, obj, act)
+        subjects = self.closure.subjects(sub)
+        if self.route_table is not None:
+            decision = self.route_table.decide(subjects, obj, act)
+            if decision is not None:
+                return decision
+        return self.index.match(subjects, obj, act)
+
+    def is_member(self, sub: str) -> bool:
+        """主体属于该租户：在租户内有角色分配或直接授予的规则"""
+        return self.closure.has_subject(sub)
+
+
+class DomainEnforcerPool:
+    """
+    按需加载的租户执行器，按最近使用排序
+    请求处理前 await acquire(domain) 确保租户已加载，之后同步调用 enforce
+    租户不存在时 acquire 抛出 UnknownDomainError，加载失败时抛出 DomainUnavailableError
+    """
+
+    _domains: "OrderedDict[str, DomainEnforcer]" = OrderedDict()
+    # 确认有规则的租户（只记录存在的租户，不存在的租户每次访问都重新确认）
+    _known: Set[str] = set()
+    _loaded_rules: int = 0
+    # 正在加载的租户，同一租户的并发请求共用一次加载
+    _loading: Dict[str, asyncio.Future] = {}
+    # 加载期间收到变更通知、需要重新读取的租户
+    _stale: Set[str] = set()
+    _stats: Dict[str, Any] = {"hits": 0, "loads": 0, "load_ms": 0.0, "evictions": 0, "evicted_rules": 0,
+                              "invalidations": 0, "load_errors": 0, "unknown": 0}
+
+    @classmethod
+    async def acquire(cls, domain: str) -> DomainEnforcer:
+        """
+        返回已加载的租户执行器，未加载时从数据库加载
+        租户不存在时抛出 UnknownDomainError，加载失败时抛出 DomainUnavailableError
+        """
+        entry = cls._domains.get(domain)
+        if entry is not None:
+            cls._domains.move_to_end(domain)
+            cls._stats["hits"] += 1
+            return entry
+        future = cls._loading.get(domain)
+        if future is None:
+            future = cls._loading[domain] = asyncio.ensure_future(cls._load(domain))
+            future.add_done_callback(lambda _: cls._loading.pop(domain, None))
+        # 某个等待方被取消时不影响其他请求共用的加载
+        return await asyncio.shield(future)
+
+    @classmethod
+    async def _load(cls, domain: str) -> DomainEnforcer:
+        # 与默认租户共用同一个连接池
+        entry = DomainEnforcer(CasbinService.get_adapter().for_domain(domain), CasbinService._routes)
+        try:
+            if domain not in cls._known and not await entry.adapter.has_rules():
+                raise UnknownDomainError(domain)
+            while True:
+                cls._stale.discard(domain)
+                await entry.load()
+                if domain not in cls._stale:
+                    break
+        except UnknownDomainError:
+            cls._stats["unknown"] += 1
+            raise
+        except Exception as e:
+            cls._stats["load_errors"] += 1
+            log_error(e, f"加载租户策略 {domain}")
+            raise DomainUnavailableError(domain) from e
+        finally:
+            cls._stale.discard(domain)
+        if not entry.rules:
+            # 确认之后租户的规则已被全部删除
+            cls._known.discard(domain)
+            cls._stats["unknown"] += 1
+            raise UnknownDomainError(domain)
+
+        cls._known.add(domain)
+        cls._domains[domain] = entry
+        cls._loaded_rules += entry.rules
+        cls._stats["loads"] += 1
+        cls._stats["load_ms"] += entry.load_ms
+        logger.debug(f"📥 加载租户 {domain}: {entry.rules} 条规则 ({entry.load_ms}ms)")
+        cls._evict(protect=domain)
+        return entry
+
+    @classmethod
+    def _evict(cls, protect: str) -> None:
+        """驻留的租户规则总数或租户数超出上限时，从最久未用的租户开始淘汰（protect 除外）"""
+        for domain in list(cls._domains):
+            if (cls._loaded_rules <= settings.CASBIN_DOMAIN_MAX_RULES
+                    and len(cls._domains) <= settings.CASBIN_DOMAIN_MAX_LOADED):
+                return
+            if domain == protect:
+                continue
+            entry = cls._domains.pop(domain)
+            cls._loaded_rules -= entry.rules
+            cls._stats["evictions"] += 1
+            cls._stats["evicted_rules"] += entry.rules
+            logger.debug(f"📤 淘汰租户 {domain}: {entry.rules} 条规则")
+
+    @classmethod
+    def enforce(cls, domain: str, sub: str, obj: str, act: str) -> bool:
+        """
+        租户内的授权判断，结果按 (domain, sub, obj, act) 写入授权决策缓存
+        调用前需 await acquire(domain)；其间不能有 await，否则租户可能已被淘汰
+        """
+        if not settings.CASBIN_DECISION_CACHE_ENABLED:
+            return cls._domains[domain].enforce(sub, obj, act)
+        key = (domain, sub, obj, act)
+        result = decision_cache.get(key)
+        if result is None:
+            result = cls._domains[domain].enforce(sub, obj, act)
+            decision_cache.set(key, result)
+        return result
+
+    @classmethod
+    def invalidate(cls, domain: Optional[str] = None) -> None:
+        """
+        租户策略在数据库中发生变化：丢弃内存中的执行器，下次访问时重新加载
+        domain 为空时丢弃全部租户；正在加载的租户会在加载完成后重新读取
+        """
+        domains = list(cls._domains) if domain is None else [domain]
+        for name in domains:
+            entry = cls._domains.pop(name, None)
+            if entry is not None:
+                cls._loaded_rules -= entry.rules
+        cls._stale |= set(cls._loading) if domain is None else {domain} & cls._loading.keys()
+        cls._stats["invalidations"] += len(domains)
+        decision_cache.clear()
+
+    @classmethod
+    async def apply_policy_set(cls, domain: str, desired: PolicySet, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        声明式应用租户的完整策略集：与数据库中该租户的规则求差集，在一个事务中只写入差异
+        写入成功后丢弃本 worker 中该租户的执行器，并通知其他 worker 同样处理；结果格式与 CasbinService 相同
+        """
+        started = time.perf_counter()
+        adapter = CasbinService.get_adapter().for_domain(domain)
+        added: Dict[str, List[List[str]]] = {}
+        removed: Dict[str, List[List[str]]] = {}
+        summary: Dict[str, Dict[str, int]] = {}
+        # 与默认租户的声明式应用共用一把锁，差集总是基于前一次应用之后的数据库状态
+        async with CasbinService._apply_lock:
+            for sec in POLICY_ARITY:
+                existing = dict.fromkeys(tuple(rule) for rule in await adapter.load_rules(sec))
+                wanted = dict.fromkeys(tuple(rule) for rule in desired.get(sec, ()))
+                added[sec] = [list(rule) for rule in wanted if rule not in existing]
+                removed[sec] = [list(rule) for rule in existing if rule not in wanted]
+                summary[sec] = {
+                    "desired": len(wanted),
+                    "added": len(added[sec]),
+                    "removed": len(removed[sec]),
+                    "unchanged": len(wanted) - len(added[sec]),
+                }
+
+            changes = sum(len(rules) for group in (added, removed) for rules in group.values())
+            if not changes:
+                result_status = "unchanged"
+            elif dry_run:
+                result_status = "dry_run"
+            else:
+                try:
+                    await adapter.apply_changes(removed, added)
+                except Exception as e:
+                    log_error(e, f"声明式应用租户策略 {domain}")
+                    result_status = "failed"
+                else:
+                    result_status = "applied"
+                    cls.invalidate(domain)
+                    from app.services.casbin_watcher import publish_policy_change
+                    await publish_policy_change("reload", domain=domain)
+
+        listed = [rules for group in (added, removed) for rules in group.values()]
+        result = {
+            "status": result_status,
+            "domain": domain,
+            "summary": summary,
+            "added": {sec: rules[:APPLY_REPORT_LIMIT] for sec, rules in added.items()},
+            "removed": {sec: rules[:APPLY_REPORT_LIMIT] for sec, rules in removed.items()},
+            "truncated": any(len(rules) > APPLY_REPORT_LIMIT for rules in listed),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+        log_casbin("声明式应用租户策略集", f"{domain} {result_status} {summary}")
+        return result
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        """驻留的租户、规则数与加载/淘汰统计"""
+        return {
+            "enabled": settings.CASBIN_DOMAINS_ENABLED,
+            "loaded_domains": len(cls._domains),
+            "loaded_rules": cls._loaded_rules,
+            "max_rules": settings.CASBIN_DOMAIN_MAX_RULES,
+            "max_loaded": settings.CASBIN_DOMAIN_MAX_LOADED,
+            "loading": len(cls._loading),
+            "known_domains": len(cls._known),
+            **cls._stats,
+            "load_ms": round(cls._stats["load_ms"], 3),
+            # 最近使用的在前
+            "domains": [
+                {"domain": name, "rules": entry.rules, "load_ms": entry.load_ms}
+                for name, entry in reversed(cls._domains.items())
+            ][:100],
+        }
@@ -0,0 +1,111 @@
+"""
+授权判定剖析（explain）
+记录一次判定各阶段的耗时（角色展开、候选规则查找、匹配器求值）、候选规则数、
+匹配器求值次数以及命中的规则，用于排查慢请求和被拒绝的请求
+
+- 管理接口按需对任意 (sub, obj, act) 生成剖析结果
+- 配置 CASBIN_EXPLAIN_SAMPLE_RATE 后，按比例对在线判定采样，写入各阶段的延迟直方图
+  采样率为 0 时 enforce 只多一次配置项判断
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.histogram import LatencyHistogram
+
+# 保留最近的采样结果条数（只保留被拒绝的判定，用于排查）
+RECENT_DENIED_SIZE = 100
+
+
+class DecisionTrace:
+    """一次授权判定的剖析结果（耗时单位为微秒）"""
+
+    __slots__ = (
+        "sub", "obj", "act", "allowed", "cached", "strategy", "subjects",
+        "role_expansion_us", "candidate_lookup_us", "match_us", "total_us",
+        "candidate_rules", "matcher_evaluations", "matched_rule",
+    )
+
+    def __init__(self, sub: str, obj: str, act: str):
+        self.sub = sub
+        self.obj = obj
+        self.act = act
+        self.allowed = False
+        # 授权决策缓存中的结果（None 表示未命中）
+        self.cached: Optional[bool] = None
+        # index: 路径模式索引；enforcer: 执行器逐条匹配
+        self.strategy = "index"
+        self.subjects: List[str] = []
+        self.role_expansion_us = 0.0
+        self.candidate_lookup_us = 0.0
+        self.match_us = 0.0
+        self.total_us = 0.0
+        self.candidate_rules = 0
+        # 执行器路径无法得到求值次数，为 None
+        self.matcher_evaluations: Optional[int] = 0
+        self.matched_rule: Optional[List[str]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sub": self.sub,
+            "obj": self.obj,
+            "act": self.act,
+            "allowed": self.allowed,
+            "cached": self.cached,
+            "strategy": self.strategy,
+            "subjects": self.subjects,
+            "timings_us": {
+                "role_expansion": round(self.role_expansion_us, 3),
+                "candidate_lookup": round(self.candidate_lookup_us, 3),
+                "match": round(self.match_us, 3),
+                "total": round(self.total_us, 3),
+            },
+            "candidate_rules": self.candidate_rules,
+            "matcher_evaluations": self.matcher_evaluations,
+            "matched_rule": self.matched_rule,
+        }
+
+
+class ExplainSampler:
+    """采样判定的各阶段延迟直方图与最近被拒绝的判定"""
+
+    PHASES = ("role_expansion", "candidate_lookup", "match", "total")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.histograms = {phase: LatencyHistogram() for phase in self.PHASES}
+        self.candidates = LatencyHistogram((1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000))
+        self.sampled = 0
+        self.denied = 0
+        self.recent_denied: Deque[Dict[str, Any]] = deque(maxlen=RECENT_DENIED_SIZE)
+
+    def observe(self, trace: DecisionTrace) -> None:
+        self.sampled += 1
+        self.histograms["role_expansion"].observe(trace.role_expansion_us)
+        self.histograms["candidate_lookup"].observe(trace.candidate_lookup_us)
+        self.histograms["match"].observe(trace.match_us)
+        self.histograms["total"].observe(trace.total_us)
+        self.candidates.observe(trace.candidate_rules)
+        if not trace.allowed:
+            self.denied += 1
+            self.recent_denied.append(trace.to_dict())
+
+    def stats(self, sample_rate: float) -> Dict[str, Any]:
+        return {
+            "sample_rate": sample_rate,
+            "sampled": self.sampled,
+            "denied": self.denied,
+            "latency_us": {phase: histogram.snapshot() for phase, histogram in self.histograms.items()},
+            "candidate_rules": self.candidates.snapshot(),
+        }
+
+
+explain_sampler = ExplainSampler()
+
+
+def elapsed_us(started: int) -> float:
+    """perf_counter_ns 起点到现在的微秒数"""
+    return (time.perf_counter_ns() - started) / 1000
@@ -0,0 +1,247 @@
+"""
+策略文件流式批量导入
+按块读取 rbac_policy.csv 格式的文件（可达数百万行），与数据库中已有规则及文件中已出现的规则按哈希去重，
+每块在一个事务中多行写入（MySQL 可选 LOAD DATA LOCAL INFILE），不经过执行器，内存占用与块大小和规则总数的哈希集合成正比
+
+文件按行切块，不支持跨行的带引号字段（策略值中不会出现换行）
+
+断点续传：每块提交后把已处理的字节偏移写入检查点文件，中断后重新运行会从检查点继续；
+最后一个检查点之后已提交的行会被哈希集合识别为已存在（INSERT IGNORE 也保证不会重复写入）
+"""
+
+import csv
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import select, text
+
+from app.core.logging import get_logger
+from app.services.casbin_adapter import BATCH_CHUNK_SIZE, DEFAULT_DOMAIN, _chunks, _insert_ignore, _rule_to_row
+from app.services.casbin_policy_file import PolicyFileError, parse_policy_row
+from app.users.models import CasbinRule
+
+logger = get_logger("casbin_import")
+
+# 每块读取的行数，每块一个事务
+IMPORT_CHUNK_LINES = 50000
+
+# 去重集合中每条规则保留的哈希字节数（SHA-256 前 128 位，千万级规则下碰撞概率约 1e-25）
+DIGEST_BYTES = 16
+
+# 进度日志的最小间隔（秒）
+PROGRESS_INTERVAL = 5.0
+
+# 记录到结果中的格式错误行数上限
+MAX_REPORTED_ERRORS = 20
+
+# LOAD DATA 的列顺序，与 _write_load_data 写出的 TSV 一致；created_at / updated_at 使用列默认值
+_LOAD_DATA_COLUMNS = ("ptype", "v0", "v1", "v2", "v3", "v4", "v5", "domain", "rule_hash")
+
+
+def _digest(row_hash: str) -> bytes:
+    return bytes.fromhex(row_hash[:DIGEST_BYTES * 2])
+
+
+def _tsv_value(value: Optional[str]) -> str:
+    """LOAD DATA 默认格式的字段：NULL 为 \\N，反斜杠、制表符和换行转义"""
+    if value is None:
+        return "\\N"
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+class ImportCheckpoint:
+    """检查点文件：记录源文件的大小和修改时间，源文件变化后检查点失效"""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        stat = os.stat(source)
+        self.source = {"path": os.path.abspath(source), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("source") != self.source:
+            logger.warning(f"⚠️ 源文件已变化，忽略检查点: {self.path}")
+            return None
+        return state
+
+    def save(self, offset: int, line: int, stats: Dict[str, Any]) -> None:
+        state = {"source": self.source, "offset": offset, "line": line, "stats": stats}
+        temp = f"{self.path}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class PolicyImporter:
+    """
+    流式策略导入
+    - session_factory: 数据库会话工厂（默认 app.database.session.SessionLocal）
+    - load_data: MySQL 下用 LOAD DATA LOCAL INFILE 写入（连接需开启 local_infile），失败时回退为多行 INSERT
+    - strict: 遇到格式错误的行时中止；默认跳过并计数
+    - domain: 导入到指定租户（默认租户为空字符串）
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        chunk_lines: int = IMPORT_CHUNK_LINES,
+        load_data: bool = False,
+        strict: bool = False,
+        progress_interval: float = PROGRESS_INTERVAL,
+        domain: str = DEFAULT_DOMAIN,
+    ):
+        if session_factory is None:
+            from app.database.session import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+        self.chunk_lines = chunk_lines
+        self.load_data = load_data
+        self.strict = strict
+        self.progress_interval = progress_interval
+        self.domain = domain
+        self._seen: Set[bytes] = set()
+        self.stats: Dict[str, Any] = {}
+
+    async def _load_existing(self) -> int:
+        """把数据库中已有规则的哈希读入去重集合（流式读取，不在内存中保留整张表）"""
+        count = 0
+        async with self._session_factory() as session:
+            result = await session.stream(select(CasbinRule.rule_hash).execution_options(yield_per=BATCH_CHUNK_SIZE * 10))
+            async for (row_hash,) in result:
+                self._seen.add(_digest(row_hash))
+                count += 1
+        return count
+
+    def _parse_chunk(self, lines: List[str], first_line: int) -> List[dict]:
+        """解析一块行并去重，返回需要写入的行"""
+        rows = []
+        stats = self.stats
+        for number, values in enumerate(csv.reader(lines, skipinitialspace=True), start=first_line):
+            try:
+                parsed = parse_policy_row(values, number)
+            except PolicyFileError as e:
+                if self.strict:
+                    raise
+                stats["invalid"] += 1
+                if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                    stats["errors"].append(str(e))
+                continue
+            if parsed is None:
+                continue
+            stats["rules"] += 1
+            row = _rule_to_row(*parsed, self.domain)
+            digest = _digest(row["rule_hash"])
+            if digest in self._seen:
+                stats["skipped"] += 1
+                continue
+            self._seen.add(digest)
+            rows.append(row)
+        return rows
+
+    async def _write_inserts(self, rows: List[dict]) -> None:
+        async with self._session_factory() as session:
+            async with session.begin():
+                for chunk in _chunks(rows):
+                    await session.execute(_insert_ignore(), chunk)
+
+    async def _write_load_data(self, rows: List[dict]) -> None:
+        """写出临时 TSV 文件后 LOAD DATA LOCAL INFILE ... IGNORE（唯一索引冲突的行忽略）"""
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".tsv", delete=False) as f:
+            for row in rows:
+                f.write("\t".join(_tsv_value(row[column]) for column in _LOAD_DATA_COLUMNS))
+                f.write("\n")
+            path = f.name
+        try:
+            statement = text(
+                f"LOAD DATA LOCAL INFILE :path IGNORE INTO TABLE {CasbinRule.__tablename__} "
+                f"CHARACTER SET utf8mb4 ({', '.join(_LOAD_DATA_COLUMNS)})"
+            )
+            async with self._session_factory() as session:
+                async with session.begin():
+                    await session.execute(statement, {"path": path})
+        finally:
+            os.remove(path)
+
+    async def _write(self, rows: List[dict]) -> None:
+        if self.load_data:
+            try:
+                await self._write_load_data(rows)
+                return
+            except Exception as e:
+                # 服务端或连接未开启 local_infile：之后的块都改用多行 INSERT
+                logger.warning(f"⚠️ LOAD DATA LOCAL INFILE 不可用，改用多行 INSERT: {type(e).__name__}: {e}")
+                self.load_data = False
+        await self._write_inserts(rows)
+
+    def _report_progress(self, started: float, lines: int, final: bool = False) -> None:
+        """记录进度，吞吐按本次运行处理的行数计算（续传时不计入之前运行的行）"""
+        elapsed = time.perf_counter() - started
+        stats = self.stats
+        stats["seconds"] = round(elapsed, 3)
+        stats["rows_per_sec"] = round(lines / elapsed, 1) if elapsed > 0 else None
+        message = (
+            f"已读取 {stats['lines']} 行, 写入 {stats['written']} 条, 跳过重复 {stats['skipped']} 条, "
+            f"格式错误 {stats['invalid']} 行, {stats['rows_per_sec']} 行/秒"
+        )
+        logger.info(f"{'✅ 导入完成' if final else '📥 导入进度'}: {message}")
+
+    async def run(self, path: str, checkpoint_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        导入策略文件，返回统计信息（行数、写入条数、跳过条数、格式错误行数、行/秒）
+        checkpoint_path 默认为 <path>.checkpoint.json，导入完成后删除
+        """
+        checkpoint = ImportCheckpoint(checkpoint_path or f"{path}.checkpoint.json", path)
+        state = checkpoint.load()
+        self.stats = {"lines": 0, "rules": 0, "written": 0, "skipped": 0, "invalid": 0, "errors": [], "chunks": 0}
+        offset, line = 0, 1
+        if state is not None:
+            offset, line = state["offset"], state["line"]
+            self.stats.update(state["stats"])
+            logger.info(f"🔁 从检查点继续导入: 第 {line} 行 (偏移 {offset} 字节)")
+
+        started = time.perf_counter()
+        existing = await self._load_existing()
+        logger.info(f"📋 数据库中已有 {existing} 条规则，读取哈希耗时 {time.perf_counter() - started:.3f}s")
+        lines_before = self.stats["lines"]
+        last_report = started
+
+        with open(path, "rb") as f:
+            f.seek(offset)
+            while True:
+                raw = [f.readline() for _ in range(self.chunk_lines)]
+                raw = [item for item in raw if item]
+                if not raw:
+                    break
+                lines = [item.decode("utf-8-sig" if offset == 0 and i == 0 else "utf-8") for i, item in enumerate(raw)]
+                rows = self._parse_chunk(lines, line)
+                if rows:
+                    await self._write(rows)
+                offset = f.tell()
+                line += len(raw)
+                self.stats["lines"] += len(raw)
+                self.stats["written"] += len(rows)
+                self.stats["chunks"] += 1
+                checkpoint.save(offset, line, {key: value for key, value in self.stats.items()
+                                               if key not in ("seconds", "rows_per_sec")})
+
+                now = time.perf_counter()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    self._report_progress(started, self.stats["lines"] - lines_before)
+
+        checkpoint.clear()
+        self._report_progress(started, self.stats["lines"] - lines_before, final=True)
+        return self.stats
@@ -0,0 +1,247 @@
+"""
+keyMatch2 路径模式索引
+rbac_model.conf 的匹配器对每条 p 规则逐条求值，并且每次都重新构造 keyMatch2 的正则，
+enforce 开销随规则总数线性增长。这里按 (subject, action) 分组，把每条规则的对象模式
+按其字面量前缀分桶，请求路径只需按已有的前缀长度截取并查表即可得到少量候选模式
+
+匹配语义与 casbin.util.key_match2 完全一致：候选模式使用同样的正则转换，
+前缀分桶只用于排除不可能匹配的模式
+"""
+
+import re
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+# 与 casbin.util.builtin_operators.KEY_MATCH2_PATTERN 相同
+KEY_MATCH2_PATTERN = re.compile(r"(.*?):[^\/]+(.*?)")
+
+# 索引快速路径适用的模型（casbin 解析后的形式）
+INDEXED_MATCHER = 'g(r_sub, p_sub) && keyMatch2(r_obj, p_obj) && (r_act == p_act || p_act == "*")'
+INDEXED_EFFECT = "some(where (p_eft == allow))"
+
+# 字面量前缀在遇到 : 或正则元字符时结束
+_PREFIX_STOP = re.compile(r"[:.^$*+?{}\[\]\\|()]")
+# 量词会作用于前一个字符，遇到时前一个字符也不能算作字面量
+_QUANTIFIERS = set("*+?{")
+
+
+@lru_cache(maxsize=None)
+def compile_key_match2(pattern: str) -> Pattern:
+    """
+    将 keyMatch2 模式编译为正则（转换规则与 casbin.util.key_match2 相同），结果缓存
+    缓存键只有策略中的模式，条目数等于不同模式数，因此不设上限：固定上限在模式数超过上限时会反复淘汰、重新编译；
+    整体重新加载策略时清空（CasbinService.load_policy），已删除规则的模式不会一直留在缓存中
+    """
+    regex = pattern.replace("/*", "/.*")
+    regex = KEY_MATCH2_PATTERN.sub(r"\g<1>[^\/]+\g<2>", regex, 0)
+    if regex == "*":
+        regex = "(.*)"
+    return re.compile("^" + regex + "$")
+
+
+def key_match2(key1: str, key2: str) -> bool:
+    """keyMatch2 的缓存编译版本"""
+    return compile_key_match2(key2).match(key1) is not None
+
+
+def key_match2_func(*args) -> bool:
+    """注册到执行器的 keyMatch2 函数"""
+    return key_match2(args[0], args[1])
+
+
+def literal_prefix(pattern: str) -> str:
+    """
+    模式中能匹配的路径必然以之开头的字面量前缀
+    - 遇到 : 或正则元字符时结束
+    - 遇到量词时去掉被修饰的前一个字符（/* 会被转换为 /.*，其中的 / 仍是字面量）
+    - 模式中含有 | 时无法确定前缀，返回空字符串
+    """
+    if "|" in pattern:
+        return ""
+    stop = _PREFIX_STOP.search(pattern)
+    if stop is None:
+        return pattern
+    index = stop.start()
+    char = pattern[index]
+    if char in _QUANTIFIERS and not (char == "*" and pattern[index - 1:index] == "/"):
+        index = max(0, index - 1)
+    return pattern[:index]
+
+
+class _Group:
+    __slots__ = ("prefixes", "lengths")
+
+    def __init__(self):
+        # 字面量前缀 -> {模式: 规则条数}（数据库中可能存在重复规则）
+        self.prefixes: Dict[str, Dict[str, int]] = {}
+        # 前缀长度 -> 该长度的前缀个数，匹配时只需按这些长度截取请求路径
+        self.lengths: Dict[int, int] = {}
+
+
+class PathPatternIndex:
+    """
+    按 (subject, action) 分组、按字面量前缀分桶的对象模式索引
+    支持增量增删，enforce 时只对路径前缀命中的桶中的模式执行正则匹配
+    前缀桶只由 dict 组成，可以直接以 JSON 写入策略快照
+    """
+
+    def __init__(self):
+        self._groups: Dict[Tuple[str, str], _Group] = {}
+        self.size = 0
+
+    def clear(self) -> None:
+        self._groups = {}
+        self.size = 0
+
+    def build(self, rules: Iterable[List[str]]) -> None:
+        """用 p 规则 [sub, obj, act] 重建索引"""
+        self.clear()
+        for rule in rules:
+            self.add(*rule[:3])
+
+    def add(self, sub: str, obj: str, act: str) -> None:
+        group = self._groups.get((sub, act))
+        if group is None:
+            group = self._groups[(sub, act)] = _Group()
+        prefix = literal_prefix(obj)
+        patterns = group.prefixes.get(prefix)
+        if patterns is None:
+            patterns = group.prefixes[prefix] = {}
+            group.lengths[len(prefix)] = group.lengths.get(len(prefix), 0) + 1
+        patterns[obj] = patterns.get(obj, 0) + 1
+        self.size += 1
+
+    def remove(self, sub: str, obj: str, act: str) -> None:
+        key = (sub, act)
+        group = self._groups.get(key)
+        if group is None:
+            return
+        prefix = literal_prefix(obj)
+        patterns = group.prefixes.get(prefix)
+        if patterns is None or obj not in patterns:
+            return
+        self.size -= 1
+        if patterns[obj] > 1:
+            patterns[obj] -= 1
+            return
+        del patterns[obj]
+        if patterns:
+            return
+
+        # 桶为空时删除，并维护前缀长度计数
+        del group.prefixes[prefix]
+        length = len(prefix)
+        if group.lengths[length] > 1:
+            group.lengths[length] -= 1
+        else:
+            del group.lengths[length]
+        if not group.prefixes:
+            del self._groups[key]
+
+    @staticmethod
+    def _match_group(group: _Group, path: str) -> bool:
+        size = len(path)
+        for length in group.lengths:
+            if length > size:
+                continue
+            patterns = group.prefixes.get(path[:length])
+            if patterns is None:
+                continue
+            for pattern in patterns:
+                if compile_key_match2(pattern).match(path):
+                    return True
+        return False
+
+    def match(self, subjects: Iterable[str], path: str, act: str) -> bool:
+        """subjects 中任一主体存在 act（或 *）下与 path 匹配的模式"""
+        actions = (act,) if act == "*" else (act, "*")
+        for sub in subjects:
+            for action in actions:
+                group = self._groups.get((sub, action))
+                if group is not None and self._match_group(group, path):
+                    return True
+        return False
+
+    def groups(self, subjects: Iterable[str], act: str) -> List[_Group]:
+        """subjects 在 act（或 *）下的全部分组；批量判定时同一 (用户, 动作) 只需查找一次"""
+        actions = (act,) if act == "*" else (act, "*")
+        found = []
+        for sub in subjects:
+            for action in actions:
+                group = self._groups.get((sub, action))
+                if group is not None:
+                    found.append(group)
+        return found
+
+    @classmethod
+    def match_groups(cls, groups: Iterable[_Group], path: str) -> bool:
+        """path 与 groups 中任一模式匹配"""
+        for group in groups:
+            if cls._match_group(group, path):
+                return True
+        return False
+
+    def explain(self, subjects: Iterable[str], path: str, act: str) -> Tuple[int, int, int, Optional[List[str]]]:
+        """
+        与 match 相同的查找过程，返回 (候选模式数, 正则求值次数, 正则求值耗时纳秒, 命中的规则 [sub, obj, act])
+        候选模式为前缀命中的桶中的全部模式
+        """
+        clock = time.perf_counter_ns
+        actions = (act,) if act == "*" else (act, "*")
+        candidates = evaluations = match_ns = 0
+        for sub in subjects:
+            for action in actions:
+                group = self._groups.get((sub, action))
+                if group is None:
+                    continue
+                size = len(path)
+                for length in group.lengths:
+                    if length > size:
+                        continue
+                    patterns = group.prefixes.get(path[:length])
+                    if patterns is None:
+                        continue
+                    candidates += len(patterns)
+                    for pattern in patterns:
+                        evaluations += 1
+                        started = clock()
+                        matched = compile_key_match2(pattern).match(path)
+                        match_ns += clock() - started
+                        if matched:
+                            return candidates, evaluations, match_ns, [sub, pattern, action]
+        return candidates, evaluations, match_ns, None
+
+    def export_state(self) -> List[list]:
+        """导出索引内容（用于策略快照，只含 JSON 类型）: [[sub, act, {前缀: {模式: 规则条数}}], ...]"""
+        return [[sub, act, group.prefixes] for (sub, act), group in self._groups.items()]
+
+    def restore_state(self, state: List[list]) -> None:
+        """从 export_state 的结果恢复索引，前缀长度计数与规则总数由前缀桶推出"""
+        self.clear()
+        for sub, act, prefixes in state:
+            group = self._groups[(sub, act)] = _Group()
+            group.prefixes = prefixes
+            for prefix, patterns in prefixes.items():
+                group.lengths[len(prefix)] = group.lengths.get(len(prefix), 0) + 1
+                self.size += sum(patterns.values())
+
+
+def supports_index(enforcer) -> bool:
+    """执行器的模型是否与索引快速路径的语义一致"""
+    model = enforcer.get_model().model
+    try:
+        matcher = model["m"]["m"].value
+        effect = model["e"]["e"].value
+        p_tokens = model["p"]["p"].tokens
+    except KeyError:
+        return False
+    rm = enforcer.rm_map.get("g")
+    return (
+        matcher == INDEXED_MATCHER
+        and effect == INDEXED_EFFECT
+        and p_tokens == ["p_sub", "p_obj", "p_act"]
+        and rm is not None
+        and rm.matching_func is None
+        and set(enforcer.rm_map) == {"g"}
+    )
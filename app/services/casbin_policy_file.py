@@ -0,0 +1,86 @@
+"""
+策略集解析
+- CSV: 与 app/core/rbac_policy.csv 相同的格式，每行 "p, sub, obj, act" 或 "g, user, role"，# 开头为注释
+- JSON: {"policies": [{"role", "obj", "act"}, ...], "roles": [{"username", "role"}, ...]}
+解析结果为 {"p": [[sub, obj, act], ...], "g": [[user, role], ...]}
+"""
+
+import csv
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 各类规则的字段数
+POLICY_ARITY = {"p": 3, "g": 2}
+
+PolicySet = Dict[str, List[List[str]]]
+
+
+class PolicyFileError(ValueError):
+    """策略集格式错误"""
+
+
+def empty_policy_set() -> PolicySet:
+    return {ptype: [] for ptype in POLICY_ARITY}
+
+
+def parse_policy_row(values: List[str], number: int) -> Optional[Tuple[str, List[str]]]:
+    """
+    解析 csv.reader 得到的一行，返回 (规则类型, 规则)；空行和注释返回 None
+    未知的规则类型或字段数不足时抛出 PolicyFileError（带行号）
+    """
+    values = [value.strip() for value in values]
+    while values and not values[-1]:
+        values.pop()
+    if not values or values[0].startswith("#"):
+        return None
+    ptype = values[0]
+    arity = POLICY_ARITY.get(ptype)
+    if arity is None:
+        raise PolicyFileError(f"第 {number} 行: 未知的规则类型 {ptype!r}")
+    if len(values) < arity + 1 or not all(values[1:arity + 1]):
+        raise PolicyFileError(f"第 {number} 行: {ptype} 规则需要 {arity} 个非空字段")
+    return ptype, values[1:arity + 1]
+
+
+def parse_policy_lines(lines: Iterable[str]) -> PolicySet:
+    """
+    解析 CSV 格式的策略行，字段前后空白会被去掉，值中含逗号时可以用双引号包裹
+    格式错误时抛出 PolicyFileError，避免声明式应用时把规则当作多余规则删除
+    """
+    policy_set = empty_policy_set()
+    for number, row in enumerate(csv.reader(lines, skipinitialspace=True), start=1):
+        parsed = parse_policy_row(row, number)
+        if parsed is not None:
+            policy_set[parsed[0]].append(parsed[1])
+    return policy_set
+
+
+def format_policy_line(ptype: str, rule: Sequence[str]) -> str:
+    """格式化为 rbac_policy.csv 的一行（parse_policy_lines 的逆操作），含逗号、引号或首尾空白的值用双引号包裹"""
+    values = []
+    for value in (ptype, *rule):
+        if "," in value or '"' in value or value != value.strip():
+            value = '"' + value.replace('"', '""') + '"'
+        values.append(value)
+    return ", ".join(values)
+
+
+def parse_policy_json(data: Any) -> PolicySet:
+    """解析 JSON 格式的策略集（已反序列化的对象）"""
+    if not isinstance(data, dict):
+        raise PolicyFileError("JSON 策略集必须是对象")
+    policy_set = empty_policy_set()
+    for key, ptype, fields in (("policies", "p", ("role", "obj", "act")), ("roles", "g", ("username", "role"))):
+        for number, item in enumerate(data.get(key) or (), start=1):
+            if not isinstance(item, dict) or not all(isinstance(item.get(field), str) and item[field] for field in fields):
+                raise PolicyFileError(f"{key} 第 {number} 项需要非空字段 {', '.join(fields)}")
+            policy_set[ptype].append([item[field] for field in fields])
+    return policy_set
+
+
+def read_policy_file(path: str) -> PolicySet:
+    """按扩展名读取策略文件：.json 为 JSON，其他按 CSV 解析"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".json"):
+            return parse_policy_json(json.load(f))
+        return parse_policy_lines(f)
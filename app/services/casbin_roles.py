@@ -0,0 +1,301 @@
+"""
+物化的角色传递闭包
+为每个主体维护其全部有效角色，并缓存有效权限行，enforce 和权限查询不再每次遍历角色图
+
+g 规则增删时只重新计算受影响的主体：新增或删除 u -> r 只会改变能到达 u 的主体
+（u 本身以及有效角色中包含 u 的主体），这些主体通过反向索引直接得到
+可达范围与 RoleManager.has_link 一致，受 max_hierarchy_level 限制
+"""
+
+import sys
+from bisect import bisect_right, insort
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+_EMPTY: FrozenSet[str] = frozenset()
+
+
+class RoleClosure:
+    """
+    主体 -> 有效角色集合 的物化闭包
+    - _parents / _children: g 规则的正向、反向邻接表
+    - _closure: 主体的有效角色（不含自身）
+    - _members: 角色 -> 有效角色中包含它的主体（反向索引，用于增量更新）
+    - _policies: 主体 -> 直接授予它的 p 规则
+    - _permission_rows: 主体 -> 有效权限行（按需计算并缓存）
+    """
+
+    def __init__(self, max_hierarchy_level: int = 10):
+        self.max_hierarchy_level = max_hierarchy_level
+        self._parents: Dict[str, Set[str]] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self._closure: Dict[str, FrozenSet[str]] = {}
+        self._members: Dict[str, Set[str]] = {}
+        self._policies: Dict[str, List[List[str]]] = {}
+        self._permission_rows: Dict[str, List[List[str]]] = {}
+        self.recomputed = 0
+
+    def build(self, g_rules: Iterable[List[str]], p_rules: Iterable[List[str]]) -> None:
+        """用全部 g、p 规则重建闭包"""
+        self._load_rules(g_rules, p_rules)
+        for subject in list(self._parents):
+            self._recompute(subject)
+
+    def _load_rules(self, g_rules: Iterable[List[str]], p_rules: Iterable[List[str]]) -> None:
+        """清空闭包，按规则重建邻接表与直接授予的 p 规则"""
+        self._parents = {}
+        self._children = {}
+        self._closure = {}
+        self._members = {}
+        self._policies = {}
+        self._permission_rows = {}
+        for rule in g_rules:
+            self._parents.setdefault(rule[0], set()).add(rule[1])
+            self._children.setdefault(rule[1], set()).add(rule[0])
+        # 与模型共用规则列表（规则不会被原地修改），避免重复占用内存
+        for rule in p_rules:
+            self._policies.setdefault(rule[0], []).append(rule)
+
+    def _reachable(self, subject: str) -> FrozenSet[str]:
+        """按层广度优先遍历 max_hierarchy_level 层内可达的角色"""
+        seen = {subject}
+        frontier = {subject}
+        level = self.max_hierarchy_level - 1
+        while level > 0 and frontier:
+            next_frontier = set()
+            for name in frontier:
+                next_frontier.update(self._parents.get(name, ()))
+            frontier = next_frontier - seen
+            seen |= frontier
+            level -= 1
+        seen.discard(subject)
+        return frozenset(seen)
+
+    def _recompute(self, subject: str) -> None:
+        old = self._closure.get(subject, _EMPTY)
+        new = self._reachable(subject)
+        self.recomputed += 1
+        if new == old:
+            return
+        for role in old - new:
+            members = self._members.get(role)
+            if members is not None:
+                members.discard(subject)
+                if not members:
+                    del self._members[role]
+        for role in new - old:
+            self._members.setdefault(role, set()).add(subject)
+        if new:
+            self._closure[subject] = new
+        else:
+            self._closure.pop(subject, None)
+        self._permission_rows.pop(subject, None)
+
+    def _affected(self, subject: str) -> Set[str]:
+        """有效角色可能因 subject 的出边变化而改变的主体"""
+        affected = set(self._members.get(subject, ()))
+        affected.add(subject)
+        return affected
+
+    def add_link(self, user: str, role: str) -> None:
+        self._parents.setdefault(user, set()).add(role)
+        self._children.setdefault(role, set()).add(user)
+        for subject in self._affected(user):
+            self._recompute(subject)
+
+    def remove_link(self, user: str, role: str) -> None:
+        parents = self._parents.get(user)
+        if parents is None or role not in parents:
+            return
+        parents.discard(role)
+        if not parents:
+            del self._parents[user]
+        children = self._children.get(role)
+        if children is not None:
+            children.discard(user)
+            if not children:
+                del self._children[role]
+        for subject in self._affected(user):
+            self._recompute(subject)
+
+    def _invalidate_permissions(self, subject: str) -> None:
+        self._permission_rows.pop(subject, None)
+        for member in self._members.get(subject, ()):
+            self._permission_rows.pop(member, None)
+
+    def add_policy(self, rule: List[str]) -> None:
+        self._policies.setdefault(rule[0], []).append(list(rule))
+        self._invalidate_permissions(rule[0])
+
+    def remove_policy(self, rule: List[str]) -> None:
+        rules = self._policies.get(rule[0])
+        if not rules:
+            return
+        rule = list(rule)
+        if rule in rules:
+            rules.remove(rule)
+        if not rules:
+            del self._policies[rule[0]]
+        self._invalidate_permissions(rule[0])
+
+    def has_subject(self, subject: str) -> bool:
+        """主体在规则中出现过：有角色分配或直接授予的 p 规则"""
+        return subject in self._parents or subject in self._policies
+
+    def direct_roles(self, subject: str) -> List[str]:
+        """主体直接分配的角色"""
+        return list(self._parents.get(subject, ()))
+
+    def roles(self, subject: str) -> FrozenSet[str]:
+        """主体的全部有效角色（不含自身）"""
+        return self._closure.get(subject, _EMPTY)
+
+    def subjects(self, subject: str) -> Set[str]:
+        """参与授权匹配的主体集合：自身及全部有效角色"""
+        subjects = set(self._closure.get(subject, _EMPTY))
+        subjects.add(subject)
+        return subjects
+
+    def permissions(self, subject: str) -> List[List[str]]:
+        """主体的有效权限行（直接授予及通过角色继承得到的 p 规则）"""
+        rows = self._permission_rows.get(subject)
+        if rows is None:
+            rows = list(self._policies.get(subject, ()))
+            for role in self._closure.get(subject, _EMPTY):
+                rows.extend(self._policies.get(role, ()))
+            self._permission_rows[subject] = rows
+        return rows
+
+    def export_state(self) -> Dict[str, List[str]]:
+        """导出各主体的有效角色（用于策略快照，只含 JSON 类型）"""
+        return {subject: list(roles) for subject, roles in self._closure.items()}
+
+    def restore_state(self, closure: Dict[str, List[str]], g_rules: Iterable[List[str]], p_rules: Iterable[List[str]]) -> None:
+        """
+        从 export_state 的结果恢复闭包，不再逐个主体遍历角色图
+        邻接表与直接授予的 p 规则由规则重建，反向索引由有效角色推出
+        """
+        self._load_rules(g_rules, p_rules)
+        for subject, roles in closure.items():
+            roles = frozenset(roles)
+            self._closure[subject] = roles
+            for role in roles:
+                self._members.setdefault(role, set()).add(subject)
+
+    def stats(self) -> Dict[str, Any]:
+        """规模与近似内存占用（容器本身的大小，不含共享的字符串）"""
+        closure_bytes = sys.getsizeof(self._closure) + sum(sys.getsizeof(roles) for roles in self._closure.values())
+        members_bytes = sys.getsizeof(self._members) + sum(sys.getsizeof(subjects) for subjects in self._members.values())
+        graph_bytes = (
+            sys.getsizeof(self._parents) + sum(sys.getsizeof(roles) for roles in self._parents.values())
+            + sys.getsizeof(self._children) + sum(sys.getsizeof(users) for users in self._children.values())
+        )
+        permission_bytes = sys.getsizeof(self._permission_rows) + sum(
+            sys.getsizeof(rows) for rows in self._permission_rows.values()
+        )
+        return {
+            "subjects": len(self._closure),
+            "links": sum(len(roles) for roles in self._parents.values()),
+            "closure_entries": sum(len(roles) for roles in self._closure.values()),
+            "cached_permission_subjects": len(self._permission_rows),
+            "recomputed": self.recomputed,
+            "approx_bytes": {
+                "graph": graph_bytes,
+                "closure": closure_bytes,
+                "members": members_bytes,
+                "permissions": permission_bytes,
+                "total": graph_bytes + closure_bytes + members_bytes + permission_bytes,
+            },
+        }
+
+
+class RoleRegistry:
+    """
+    角色目录：按名称排序的角色列表，以及每个角色的直接成员与直接授予的 p 规则
+    与 get_all_roles 的定义一致，角色是 p 规则的主体 (v0) 与 g 规则的角色 (v1) 的并集
+    随 p、g 规则增删增量维护，分页只需二分定位游标后取一页，不再遍历全部规则
+    成员与规则都按集合保存：重复的增加、删除不存在的规则不会让计数偏离模型
+    过滤加载模式下 policy_count 只统计已加载主体的规则
+    """
+
+    def __init__(self):
+        self._names: List[str] = []
+        self._members: Dict[str, Set[str]] = {}
+        self._policies: Dict[str, Set[Tuple[str, ...]]] = {}
+
+    def build(self, g_rules: Iterable[List[str]], p_rules: Iterable[List[str]]) -> None:
+        """用全部 g、p 规则重建目录"""
+        self._members = {}
+        self._policies = {}
+        for rule in g_rules:
+            self._members.setdefault(rule[1], set()).add(rule[0])
+        for rule in p_rules:
+            self._policies.setdefault(rule[0], set()).add(tuple(rule[1:]))
+        self._names = sorted(self._members.keys() | self._policies.keys())
+
+    def _touch(self, role: str) -> None:
+        """角色首次出现时按序插入名称列表"""
+        if role not in self._members and role not in self._policies:
+            insort(self._names, role)
+
+    def _discard(self, role: str) -> None:
+        """角色既没有成员也没有规则时从名称列表中移除"""
+        if role in self._members or role in self._policies:
+            return
+        index = bisect_right(self._names, role) - 1
+        if index >= 0 and self._names[index] == role:
+            del self._names[index]
+
+    def add_policy(self, rule: List[str]) -> None:
+        self._touch(rule[0])
+        self._policies.setdefault(rule[0], set()).add(tuple(rule[1:]))
+
+    def remove_policy(self, rule: List[str]) -> None:
+        policies = self._policies.get(rule[0])
+        if policies is None:
+            return
+        policies.discard(tuple(rule[1:]))
+        if not policies:
+            del self._policies[rule[0]]
+            self._discard(rule[0])
+
+    def add_link(self, user: str, role: str) -> None:
+        self._touch(role)
+        self._members.setdefault(role, set()).add(user)
+
+    def remove_link(self, user: str, role: str) -> None:
+        members = self._members.get(role)
+        if members is None:
+            return
+        members.discard(user)
+        if not members:
+            del self._members[role]
+            self._discard(role)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, role: str) -> bool:
+        return role in self._members or role in self._policies
+
+    def names(self) -> List[str]:
+        """全部角色（按名称排序）"""
+        return list(self._names)
+
+    def members(self, role: str) -> List[str]:
+        """直接分配了该角色的主体（按名称排序）"""
+        return sorted(self._members.get(role, ()))
+
+    def policy_count(self, role: str) -> int:
+        """直接授予该角色的 p 规则条数"""
+        return len(self._policies.get(role, ()))
+
+    def page(self, cursor: Optional[str] = None, limit: int = 100, skip: int = 0) -> Tuple[List[str], Optional[str]]:
+        """
+        取一页角色名：名称大于 cursor 的角色中跳过 skip 个后的 limit 个
+        返回 (角色名列表, 下一页游标)，没有更多角色时游标为 None
+        """
+        start = bisect_right(self._names, cursor) if cursor is not None else 0
+        start += skip
+        names = self._names[start:start + limit]
+        next_cursor = names[-1] if names and start + limit < len(self._names) else None
+        return names, next_cursor
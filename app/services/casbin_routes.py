@@ -0,0 +1,254 @@
+"""
+路由级授权预计算表
+应用注册的路由在启动后固定，按 keyMatch2 p 规则预先计算每个 (路由模板, 方法) 允许哪些主体访问，
+enforce 时匹配到路由后只需查表并与请求主体的有效角色集合求交集
+
+规则模式对路由模板的覆盖分三种：
+- ALL: 该路由的任意具体路径都与模式匹配（如 /api/v1/users/* 覆盖 /api/v1/users/{user_id}）
+- NONE: 任意具体路径都不匹配
+- PARTIAL: 取决于路径参数的取值（如 /api/v1/users/me 之于 /api/v1/users/{user_id}），
+  请求主体命中此类规则时回退到逐条匹配，保证判定与执行器完全一致
+静态路由直接用 keyMatch2 判定；带参数的路由只对由字面量、:param 和末尾 /* 组成的模式做结构判定，
+其他模式一律视为 PARTIAL
+
+规则增删时按规则增量更新各路由的计数，不需要重新计算整张表
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+from app.services.casbin_index import key_match2, literal_prefix
+
+ALL, NONE, PARTIAL = "all", "none", "partial"
+
+# 模式中出现这些字符时其正则可能跨越路径段，不做结构判定
+_PATTERN_META = re.compile(r"[.^$*+?{}\[\]\\|()]")
+# 路由模板中整段的路径参数 {name} 或 {name:converter}
+_ROUTE_PARAM = re.compile(r"^\{(\w+)(?::(\w+))?\}$")
+
+# 路由模板的一段：字面量字符串或 None（路径参数）
+Segment = Optional[str]
+
+
+class _Route:
+    __slots__ = ("template", "prefix", "segments", "regex")
+
+    def __init__(self, template: str, segments: Optional[List[Segment]], regex: Pattern):
+        self.template = template
+        # 第一个路径参数之前的字面量前缀（静态路由为整个模板）
+        self.prefix = template.split("{", 1)[0]
+        # 静态路由为 None
+        self.segments = segments
+        self.regex = regex
+
+
+class _Entry:
+    __slots__ = ("allowed", "partial")
+
+    def __init__(self):
+        # 主体 -> 覆盖该路由的规则条数
+        self.allowed: Dict[str, int] = {}
+        self.partial: Dict[str, int] = {}
+
+
+def parse_template(template: str) -> Tuple[bool, Optional[List[Segment]]]:
+    """
+    解析路由模板，返回 (是否支持预计算, 路径段)
+    静态路由的路径段为 None；段内混有参数（如 {name}.txt）或使用 path 转换器时不支持预计算
+    """
+    if "{" not in template:
+        return True, None
+    segments: List[Segment] = []
+    for part in template.split("/"):
+        if "{" not in part:
+            segments.append(part)
+            continue
+        match = _ROUTE_PARAM.match(part)
+        if match is None or match.group(2) == "path":
+            return False, None
+        segments.append(None)
+    return True, segments
+
+
+def coverage(template: str, segments: Optional[List[Segment]], pattern: str) -> str:
+    """keyMatch2 模式对路由模板的覆盖：ALL / NONE / PARTIAL"""
+    if segments is None:
+        return ALL if key_match2(template, pattern) else NONE
+    if pattern == "*":
+        return ALL
+    wildcard = pattern.endswith("/*")
+    body = pattern[:-2] if wildcard else pattern
+    parts = body.split("/")
+    for part in parts:
+        literal = part[1:] if part.startswith(":") else part
+        if ":" in literal or _PATTERN_META.search(literal):
+            return PARTIAL
+
+    # /* 之前的段必须与路由的前若干段对应，且路由至少还多一段（可以为空）
+    if wildcard:
+        if len(segments) <= len(parts):
+            return NONE
+    elif len(segments) != len(parts):
+        return NONE
+    result = ALL
+    for segment, part in zip(segments, parts):
+        if part.startswith(":"):
+            # [^/]+ 不匹配空段；路径参数总是非空
+            if segment == "":
+                return NONE
+        elif segment is not None:
+            if segment != part:
+                return NONE
+        elif part == "":
+            return NONE
+        else:
+            # 只有参数取值恰好等于该字面量时才匹配
+            result = PARTIAL
+    return result
+
+
+class RouteTable:
+    """
+    (路由模板, 方法) -> 允许访问的主体
+    decide 返回 None 表示无法由表确定（未匹配到路由、方法不在路由上、或主体命中 PARTIAL 规则），由调用方回退
+    """
+
+    def __init__(self, routes: Iterable):
+        self._routes: List[_Route] = []
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+        self._static: Dict[str, str] = {}
+        # 带参数路由按字面量前缀分桶（与路径模式索引相同的做法）
+        self._dynamic: Dict[str, List[_Route]] = {}
+        self._lengths: Set[int] = set()
+        self._coverage: Dict[Tuple[str, str], str] = {}
+        self.skipped: List[str] = []
+
+        seen: Set[str] = set()
+        for route in routes:
+            template = getattr(route, "path", None)
+            methods = getattr(route, "methods", None)
+            if template is None or not methods:
+                continue
+            supported, segments = parse_template(template)
+            if not supported:
+                self.skipped.append(template)
+                continue
+            for method in methods:
+                self._entries.setdefault((template, method), _Entry())
+            if template in seen:
+                continue
+            seen.add(template)
+            item = _Route(template, segments, route.path_regex)
+            self._routes.append(item)
+            if segments is None:
+                self._static[template] = template
+            else:
+                self._dynamic.setdefault(item.prefix, []).append(item)
+                self._lengths.add(len(item.prefix))
+        self._methods: Dict[str, List[str]] = {}
+        for template, method in self._entries:
+            self._methods.setdefault(template, []).append(method)
+        self._by_template = {route.template: route for route in self._routes}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _coverage_of(self, route: _Route, pattern: str) -> str:
+        key = (route.template, pattern)
+        result = self._coverage.get(key)
+        if result is None:
+            result = self._coverage[key] = coverage(route.template, route.segments, pattern)
+        return result
+
+    def build(self, rules: Iterable[List[str]]) -> None:
+        """用全部 p 规则 [sub, obj, act] 重建表：先按 (obj, act) 合并主体，每个模式对每个路由只判定一次"""
+        for entry in self._entries.values():
+            entry.allowed = {}
+            entry.partial = {}
+        # 只保留当前规则用到的模式的判定结果
+        self._coverage = {}
+        grouped: Dict[Tuple[str, str], Dict[str, int]] = {}
+        for rule in rules:
+            subjects = grouped.setdefault((rule[1], rule[2]), {})
+            subjects[rule[0]] = subjects.get(rule[0], 0) + 1
+        for (pattern, act), subjects in grouped.items():
+            for route, method, entry in self._affected(pattern, act):
+                result = self._coverage_of(route, pattern)
+                if result == NONE:
+                    continue
+                counts = entry.allowed if result == ALL else entry.partial
+                for sub, count in subjects.items():
+                    counts[sub] = counts.get(sub, 0) + count
+
+    def _affected(self, pattern: str, act: str):
+        """可能受 (pattern, act) 影响的 (路由, 方法, 表项)：方法一致，且路由与模式的字面量前缀互为前缀"""
+        prefix = literal_prefix(pattern)
+        for route in self._routes:
+            if not (route.prefix.startswith(prefix) or prefix.startswith(route.prefix)):
+                continue
+            template = route.template
+            for method in self._methods[template]:
+                if act == method or act == "*":
+                    yield route, method, self._entries[(template, method)]
+
+    def _update(self, sub: str, pattern: str, act: str, delta: int) -> None:
+        for route, method, entry in self._affected(pattern, act):
+            result = self._coverage_of(route, pattern)
+            if result == NONE:
+                continue
+            counts = entry.allowed if result == ALL else entry.partial
+            count = counts.get(sub, 0) + delta
+            if count > 0:
+                counts[sub] = count
+            else:
+                counts.pop(sub, None)
+
+    def add(self, sub: str, obj: str, act: str) -> None:
+        self._update(sub, obj, act, 1)
+
+    def remove(self, sub: str, obj: str, act: str) -> None:
+        self._update(sub, obj, act, -1)
+
+    def match(self, path: str) -> Optional[str]:
+        """具体路径对应的路由模板（静态路由优先）"""
+        template = self._static.get(path)
+        if template is not None:
+            return template
+        size = len(path)
+        for length in self._lengths:
+            if length > size:
+                continue
+            for route in self._dynamic.get(path[:length], ()):
+                if route.regex.match(path):
+                    return route.template
+        return None
+
+    def decide(self, subjects: Set[str], path: str, method: str) -> Optional[bool]:
+        """查表判定：命中 ALL 规则返回 True；命中 PARTIAL 规则或无法匹配路由返回 None；否则 False"""
+        template = self.match(path)
+        if template is None:
+            return None
+        entry = self._entries.get((template, method))
+        if entry is None:
+            return None
+        if not entry.allowed.keys().isdisjoint(subjects):
+            return True
+        if not entry.partial.keys().isdisjoint(subjects):
+            return None
+        return False
+
+    def routes(self) -> List[Tuple[str, str, Optional[List[Segment]]]]:
+        """全部 (路由模板, 方法, 路径段)，用于校验"""
+        return [
+            (template, method, self._by_template[template].segments)
+            for template, method in self._entries
+        ]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "routes": len(self._routes),
+            "entries": len(self._entries),
+            "skipped": self.skipped,
+            "partial_entries": sum(1 for entry in self._entries.values() if entry.partial),
+            "coverage_cache": len(self._coverage),
+        }
@@ -1,11 +1,25 @@
+import asyncio
 import os
+import random
+import sys
+import time
 import casbin
-from casbin_sqlalchemy_adapter import Adapter
-from typing import List, Optional
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, create_engine
-from app.users.models import User
+from casbin.model import Model
+from casbin.model.policy_op import PolicyOp
+from collections import Counter, OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from app.core.cache import TTLCache
 from app.core.config import get_settings
+from app.services.casbin_adapter import DEFAULT_DOMAIN, AsyncSQLAlchemyAdapter, PolicyFilter
+from app.services.casbin_explain import DecisionTrace, elapsed_us, explain_sampler
+from app.services.casbin_index import PathPatternIndex, compile_key_match2, key_match2_func, supports_index
+from app.services.casbin_policy_file import POLICY_ARITY, PolicySet, parse_policy_lines
+from app.services.casbin_roles import RoleClosure, RoleRegistry
+from app.services.casbin_routes import RouteTable
+from app.services.casbin_snapshot import (
+    SnapshotError, dump_state, encode_snapshot, paused_gc, read_snapshot, write_snapshot_file,
+)
+from app.services.principal_cache import invalidate_all_principals, invalidate_principals_for_usernames
 
 # 添加日志
 from app.core.logging import get_logger, log_casbin, log_permission, log_error
@@ -13,69 +27,723 @@ from app.core.logging import get_logger, log_casbin, log_permission, log_error
 settings = get_settings()
 logger = get_logger("casbin")
 
+# 授权决策缓存：键为 (sub, obj, act) 三元组，策略版本变化时整体清空
+decision_cache = TTLCache(max_size=settings.CASBIN_DECISION_CACHE_MAX_SIZE)
+
+# 批量权限检查时每段的条目数：每段按需加载一次主体并让出一次事件循环，结果按段流式返回
+CHECK_BATCH_CHUNK_SIZE = 2000
+
+# 一次删除的 g 规则超过该条数时整体重建角色继承关系
+# 逐条删除的开销与角色总数成正比：1k ~ 50k 条角色分配时一次重建约相当于 1.5 ~ 5 次删除，取中间值 3
+ROLE_LINK_REBUILD_THRESHOLD = 3
+
+# 声明式应用策略集时，结果中逐条列出的变更规则上限（计数不受限制）
+APPLY_REPORT_LIMIT = 1000
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), '../core/rbac_model.conf')
+
+
+def _rss_bytes() -> Optional[int]:
+    """当前进程常驻内存（Linux 读取 /proc，其他平台退化为峰值 RSS）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return None
+
+
 class CasbinService:
-    _enforcer: Optional[casbin.Enforcer] = None
-    _adapter: Optional[Adapter] = None
+    _enforcer: Optional[casbin.AsyncEnforcer] = None
+    _adapter: Optional[AsyncSQLAlchemyAdapter] = None
+    # 策略版本号，每次内存策略变更（增删、重新加载）时单调递增
+    _policy_version: int = 0
+    # p 规则对象模式索引，模型与索引语义一致时用于 enforce 快速路径
+    _path_index: Optional[PathPatternIndex] = None
+    # 应用注册的路由，以及按路由模板预计算的授权表（依赖路径模式索引的模型语义）
+    _routes: Optional[List[Any]] = None
+    _route_table: Optional[RouteTable] = None
+    # 主体 -> 有效角色 / 有效权限的物化闭包，随 g、p 规则增量维护
+    _role_closure: Optional[RoleClosure] = None
+    # 角色目录：排序的角色列表及其直接成员、规则条数，用于角色列表分页
+    _role_registry: Optional[RoleRegistry] = None
+    # 过滤加载模式：已加载 p 规则的主体 -> 规则条数（按最近使用排序，用于 LRU 淘汰）
+    _loaded_subjects: "OrderedDict[str, int]" = OrderedDict()
+    _loaded_rules: int = 0
+    # 正在按需加载的主体，以及加载期间收到远程变更、本次加载结果已过期的主体
+    _loading: Set[str] = set()
+    _stale: Set[str] = set()
+    _filtered_stats: Dict[str, Any] = {"page_ins": 0, "paged_rules": 0, "evictions": 0, "evicted_rules": 0}
+    _last_load: Dict[str, Any] = {}
+    # 延迟写快照的后台任务与快照读写统计
+    _snapshot_task: Optional[asyncio.Task] = None
+    _snapshot_stats: Dict[str, Any] = {
+        "writes": 0, "write_errors": 0, "stale_skips": 0, "last_write": None, "last_boot": None,
+    }
+    # 已确认内存模型包含的数据库标记 (行数, 最大 id)：全量加载或快照补齐时记录，写快照时在此基础上核对增量
+    _snapshot_base: Optional[Tuple[int, int]] = None
+    # 策略写入（单条、批量、声明式应用）串行执行：差集基于前一次写入之后的策略，内存模型的变更顺序与数据库一致
+    _apply_lock = asyncio.Lock()
     
     @classmethod
-    def get_adapter(cls) -> Adapter:
+    def get_adapter(cls) -> AsyncSQLAlchemyAdapter:
         """获取数据库适配器实例"""
         if cls._adapter is None:
             logger.info("🔧 初始化Casbin数据库适配器")
-            # 创建同步数据库连接用于 Casbin 适配器
-            sync_url = settings.SQLALCHEMY_DATABASE_URI.replace('+aiomysql', '+pymysql')
-            logger.debug(f"📡 数据库连接: {sync_url.split('@')[0]}@***")
-            cls._adapter = Adapter(sync_url)
+            # 复用应用的异步数据库连接池，不再单独创建同步连接
+            cls._adapter = AsyncSQLAlchemyAdapter()
             logger.info("✅ Casbin数据库适配器初始化完成")
         return cls._adapter
     
     @classmethod
-    def get_enforcer(cls) -> casbin.Enforcer:
-        """获取Casbin执行器实例"""
+    def get_enforcer(cls) -> casbin.AsyncEnforcer:
+        """
+        获取Casbin执行器实例
+        异步执行器创建时不加载策略，需在应用启动时调用 await load_policy()
+        """
         if cls._enforcer is None:
             logger.info("🚀 初始化Casbin执行器")
             
             # 获取模型配置文件路径
-            model_path = os.path.join(os.path.dirname(__file__), '../core/rbac_model.conf')
-            logger.debug(f"📋 模型配置文件: {model_path}")
+            logger.debug(f"📋 模型配置文件: {MODEL_PATH}")
             
             # 创建执行器
             adapter = cls.get_adapter()
-            cls._enforcer = casbin.Enforcer(model_path, adapter)
-            
-            # 加载策略
-            cls._enforcer.load_policy()
+            cls._enforcer = casbin.AsyncEnforcer(MODEL_PATH, adapter)
+            # 持久化由 CasbinService 按单行写穿完成，关闭执行器自带的 auto_save
+            cls._enforcer.enable_auto_save(False)
+            # 使用缓存编译结果的 keyMatch2，避免每次匹配都重新构造正则
+            cls._enforcer.add_function("keyMatch2", key_match2_func)
+            cls._role_closure = RoleClosure(cls._enforcer.rm_map["g"].max_hierarchy_level)
+            cls._role_registry = RoleRegistry()
+            cls._loaded_subjects = OrderedDict()
+            cls._loaded_rules = 0
+            cls._path_index = None
+            if settings.CASBIN_PATH_INDEX_ENABLED and supports_index(cls._enforcer):
+                cls._path_index = PathPatternIndex()
+                logger.info("🌲 已启用Casbin路径模式索引")
+            cls._route_table = cls._new_route_table()
             logger.info("✅ Casbin执行器初始化完成")
             
-            # 记录当前策略统计
-            policies = cls._enforcer.get_policy()
-            groupings = cls._enforcer.get_grouping_policy()
-            logger.info(f"📊 已加载策略: {len(policies)} 个权限策略, {len(groupings)} 个角色分配")
-            
         return cls._enforcer
     
+    @classmethod
+    def policy_version(cls) -> int:
+        """当前策略版本号"""
+        return cls._policy_version
+    
+    @classmethod
+    def _policy_changed(cls, reason: str) -> None:
+        """内存策略发生变化：递增策略版本并清空授权决策缓存"""
+        cls._policy_version += 1
+        decision_cache.clear()
+        logger.debug(f"🔄 策略版本 -> {cls._policy_version} ({reason})")
+    
+    @classmethod
+    def enforce(cls, sub: str, obj: str, act: str) -> bool:
+        """
+        执行授权判断，结果按 (sub, obj, act) 缓存
+        缓存只在策略版本不变期间有效，任何策略变更都会清空缓存
+        """
+        if settings.CASBIN_EXPLAIN_SAMPLE_RATE and random.random() < settings.CASBIN_EXPLAIN_SAMPLE_RATE:
+            return cls._sample(sub, obj, act)
+        if not settings.CASBIN_DECISION_CACHE_ENABLED:
+            return cls._evaluate(sub, obj, act)
+        
+        key = (sub, obj, act)
+        result = decision_cache.get(key)
+        if result is None:
+            result = cls._evaluate(sub, obj, act)
+            decision_cache.set(key, result)
+        return result
+    
+    @classmethod
+    def _evaluate(cls, sub: str, obj: str, act: str) -> bool:
+        """不经缓存执行授权判断：可用时走路径模式索引，否则由执行器逐条匹配"""
+        enforcer = cls.get_enforcer()
+        if cls._path_index is None:
+            return enforcer.enforce(sub, obj, act)
+        subjects = cls._role_closure.subjects(sub)
+        if cls._route_table is not None:
+            decision = cls._route_table.decide(subjects, obj, act)
+            if decision is not None:
+                return decision
+        return cls._path_index.match(subjects, obj, act)
+    
+    @classmethod
+    def _new_route_table(cls) -> Optional[RouteTable]:
+        if cls._routes is None or cls._path_index is None or not settings.CASBIN_ROUTE_TABLE_ENABLED:
+            return None
+        return RouteTable(cls._routes)
+    
+    @classmethod
+    def register_routes(cls, routes: Iterable[Any]) -> None:
+        """
+        登记应用路由（启动时、加载策略前调用），之后按路由模板预计算授权表
+        未匹配到路由或依赖路径参数取值的判定仍由路径模式索引完成
+        """
+        cls._routes = list(routes)
+        cls.get_enforcer()
+        cls._route_table = cls._new_route_table()
+        if cls._route_table is None:
+            return
+        cls._route_table.build(cls._enforcer.get_model().model["p"]["p"].policy)
+        decision_cache.clear()
+        stats = cls._route_table.stats()
+        logger.info(f"🗺️ 已启用路由级授权表: {stats['routes']} 个路由, {stats['entries']} 个 (路由, 方法)")
+        if stats["skipped"]:
+            logger.info(f"🗺️ 以下路由不做预计算: {stats['skipped']}")
+    
+    @classmethod
+    def get_route_table_stats(cls) -> Dict[str, Any]:
+        """路由级授权表规模"""
+        cls.get_enforcer()
+        if cls._route_table is None:
+            return {"enabled": False}
+        return {"enabled": True, **cls._route_table.stats()}
+    
+    @classmethod
+    def explain(cls, sub: str, obj: str, act: str) -> DecisionTrace:
+        """
+        不经缓存执行一次授权判断并记录剖析结果：
+        角色展开、候选规则查找、匹配器求值的耗时，候选规则数、求值次数与命中的规则
+        """
+        enforcer = cls.get_enforcer()
+        trace = DecisionTrace(sub, obj, act)
+        trace.cached = decision_cache.peek((sub, obj, act)) if settings.CASBIN_DECISION_CACHE_ENABLED else None
+        started = time.perf_counter_ns()
+        subjects = cls._role_closure.subjects(sub)
+        trace.role_expansion_us = elapsed_us(started)
+        trace.subjects = sorted(subjects)
+
+        if cls._path_index is not None:
+            lookup_started = time.perf_counter_ns()
+            candidates, evaluations, match_ns, matched_rule = cls._path_index.explain(subjects, obj, act)
+            # 候选查找与正则求值交替进行：正则求值单独计时，其余计入候选查找
+            trace.match_us = match_ns / 1000
+            trace.candidate_lookup_us = elapsed_us(lookup_started) - trace.match_us
+            trace.candidate_rules = candidates
+            trace.matcher_evaluations = evaluations
+            trace.matched_rule = matched_rule
+            trace.allowed = matched_rule is not None
+        else:
+            trace.strategy = "enforcer"
+            trace.candidate_rules = len(enforcer.get_model().model["p"]["p"].policy)
+            trace.matcher_evaluations = None
+            match_started = time.perf_counter_ns()
+            allowed, explain_rule = enforcer.enforce_ex(sub, obj, act)
+            trace.match_us = elapsed_us(match_started)
+            trace.allowed = bool(allowed)
+            trace.matched_rule = list(explain_rule) if explain_rule else None
+        trace.total_us = elapsed_us(started)
+        return trace
+    
+    @classmethod
+    def _sample(cls, sub: str, obj: str, act: str) -> bool:
+        """被采样的判定：生成剖析结果写入直方图，结果照常写入决策缓存"""
+        trace = cls.explain(sub, obj, act)
+        explain_sampler.observe(trace)
+        if settings.CASBIN_DECISION_CACHE_ENABLED:
+            decision_cache.set((sub, obj, act), trace.allowed)
+        return trace.allowed
+    
+    @classmethod
+    def get_explain_stats(cls) -> Dict[str, Any]:
+        """授权判定采样直方图"""
+        return explain_sampler.stats(settings.CASBIN_EXPLAIN_SAMPLE_RATE)
+    
+    @classmethod
+    def get_recent_denied(cls) -> List[Dict[str, Any]]:
+        """最近采样到的被拒绝判定（新的在前）"""
+        return list(reversed(explain_sampler.recent_denied))
+    
+    @classmethod
+    def enforce_batch(cls, requests: Sequence[Tuple[str, str, str]]) -> List[bool]:
+        """
+        批量授权判断，结果与逐条 enforce 相同
+        - 相同的 (sub, obj, act) 只判定一次
+        - 路径模式索引可用时，同一 (sub, act) 的有效角色与规则分组只解析一次，之后每条只做前缀查表和正则匹配
+        - 否则交给执行器的 batch_enforce
+        批量检查不读写授权决策缓存，避免大批量请求把在线请求的热点挤出缓存
+        """
+        enforcer = cls.get_enforcer()
+        unique = list(dict.fromkeys(requests))
+        if cls._path_index is None:
+            decisions = dict(zip(unique, enforcer.batch_enforce([list(request) for request in unique])))
+        else:
+            index = cls._path_index
+            groups: Dict[Tuple[str, str], list] = {}
+            decisions = {}
+            for request in unique:
+                sub, obj, act = request
+                key = (sub, act)
+                found = groups.get(key)
+                if found is None:
+                    found = groups[key] = index.groups(cls._role_closure.subjects(sub), act)
+                decisions[request] = index.match_groups(found, obj)
+        return [decisions[request] for request in requests]
+    
+    @classmethod
+    async def check_permissions(
+        cls, requests: Sequence[Tuple[str, str, str]], chunk_size: int = CHECK_BATCH_CHUNK_SIZE
+    ) -> AsyncIterator[List[bool]]:
+        """
+        分段执行批量权限检查，逐段产出结果（顺序与 requests 一致）
+        过滤加载模式下每段一次性读入该段全部用户及其角色的 p 规则
+        """
+        cls.get_enforcer()
+        allowed = 0
+        for start in range(0, len(requests), chunk_size):
+            chunk = requests[start:start + chunk_size]
+            if cls.is_filtered():
+                subjects: Set[str] = set()
+                for sub in {request[0] for request in chunk}:
+                    subjects |= cls._role_closure.subjects(sub)
+                await cls._page_in(subjects)
+            results = cls.enforce_batch(chunk)
+            allowed += sum(results)
+            yield results
+            # 让出事件循环，大批量检查不会长时间阻塞其他请求
+            await asyncio.sleep(0)
+        log_casbin("批量权限检查", f"{len(requests)} 条, 允许 {allowed} 条")
+    
+    @classmethod
+    def get_decision_cache_stats(cls) -> Dict[str, Any]:
+        """授权决策缓存命中统计"""
+        stats = decision_cache.stats()
+        stats["enabled"] = settings.CASBIN_DECISION_CACHE_ENABLED
+        stats["policy_version"] = cls._policy_version
+        return stats
+    
     @classmethod
     def check_permission(cls, username: str, resource: str, action: str) -> bool:
         """检查用户权限"""
-        enforcer = cls.get_enforcer()
-        result = enforcer.enforce(username, resource, action)
+        result = cls.enforce(username, resource, action)
         
         log_permission(username, resource, action, result)
         return result
     
     @classmethod
-    def add_policy(cls, role: str, resource: str, action: str) -> bool:
+    def _apply_local(cls, add: bool, sec: str, ptype: str, rules: List[List[str]], changed: bool = True) -> None:
+        """
+        将已持久化的规则变更应用到内存模型（g 规则同时增量更新角色继承关系）
+        规则与当前模型比对后只应用实际生效的部分；即使没有规则需要应用，changed=True 时也递增策略版本，
+        由调用方判断数据库是否真的没有变化（例如并发的相同写入，见 _write_through）
+        changed=False 用于过滤加载模式下的按需加载/淘汰：数据库中的策略没有变化，不递增策略版本；
+        也用于一次变更需要多次更新时，由调用方在全部更新后统一递增
+        """
+        enforcer = cls.get_enforcer()
+        model = enforcer.get_model()
+        assertion = model.model[sec][ptype]
+        # 并发的相同写入在数据库中只生效一次，内存模型与各索引的计数也只能更新一次
+        rules = cls._effective(assertion.policy, add, rules)
+        # 按集合一次性更新，避免逐条 has_policy 的 O(N) 扫描
+        if add:
+            assertion.policy.extend(rules)
+        else:
+            removed = {tuple(rule) for rule in rules}
+            assertion.policy[:] = [rule for rule in assertion.policy if tuple(rule) not in removed]
+        if sec == "p":
+            update_closure = cls._role_closure.add_policy if add else cls._role_closure.remove_policy
+            update_registry = cls._role_registry.add_policy if add else cls._role_registry.remove_policy
+            for rule in rules:
+                update_closure(rule)
+                update_registry(rule)
+            if cls._route_table is not None:
+                update_route = cls._route_table.add if add else cls._route_table.remove
+                for rule in rules:
+                    update_route(*rule[:3])
+            if cls._path_index is not None:
+                update = cls._path_index.add if add else cls._path_index.remove
+                for rule in rules:
+                    update(*rule[:3])
+            if cls._loaded_subjects:
+                cls._count_loaded(rules, 1 if add else -1)
+        else:
+            update_link = cls._role_closure.add_link if add else cls._role_closure.remove_link
+            update_member = cls._role_registry.add_link if add else cls._role_registry.remove_link
+            for rule in rules:
+                update_link(rule[0], rule[1])
+                update_member(rule[0], rule[1])
+        if sec == "g":
+            rm = enforcer.rm_map[ptype]
+            if not add and len(rules) > ROLE_LINK_REBUILD_THRESHOLD:
+                # 角色管理器每删除一条继承关系都要遍历全部角色，批量删除时按剩余规则整体重建更快
+                rm.clear()
+                model.model[sec][ptype].build_role_links(rm)
+            else:
+                op = PolicyOp.Policy_add if add else PolicyOp.Policy_remove
+                model.build_incremental_role_links(rm, op, sec, ptype, rules)
+        if changed:
+            cls._policy_changed(f"{'add' if add else 'remove'} {len(rules)} {ptype}")
+    
+    @staticmethod
+    def _effective(policy: List[List[str]], add: bool, rules: Sequence[Sequence[str]]) -> List[List[str]]:
+        """与当前模型比对：去掉重复规则，以及添加时已存在、删除时不存在的规则"""
+        if len(rules) == 1:
+            # 单条写穿最常见，直接在列表中查找，不为整个模型建集合
+            rule = list(rules[0])
+            return [rule] if (rule in policy) != add else []
+        existing = {tuple(rule) for rule in policy}
+        effective: List[List[str]] = []
+        for rule in rules:
+            key = tuple(rule)
+            if (key in existing) != add:
+                effective.append(list(rule))
+                if add:
+                    existing.add(key)
+                else:
+                    existing.discard(key)
+        return effective
+    
+    @classmethod
+    def is_filtered(cls) -> bool:
+        """当前内存模型是否为过滤加载（只包含部分主体的 p 规则）"""
+        return cls.get_adapter().is_filtered()
+    
+    @classmethod
+    def _count_loaded(cls, rules: Iterable[Sequence[str]], delta: int) -> None:
+        """按主体累计已加载 p 规则条数（只统计已加载的主体）"""
+        for rule in rules:
+            if rule[0] in cls._loaded_subjects:
+                cls._loaded_subjects[rule[0]] += delta
+                cls._loaded_rules += delta
+    
+    @classmethod
+    def _resident(cls, sec: str, rules: List[List[str]]) -> List[List[str]]:
+        """
+        需要同步到内存模型的规则：过滤加载模式下未加载主体的 p 规则只存在于数据库，
+        之后按需加载时会连同其他规则一起读入
+        """
+        if sec != "p" or not cls.is_filtered():
+            return rules
+        return [rule for rule in rules if rule[0] in cls._loaded_subjects]
+    
+    @classmethod
+    async def ensure_loaded(cls, subject: str) -> None:
+        """
+        过滤加载模式下确保主体及其全部有效角色的 p 规则已在内存中（enforce 前调用）
+        非过滤模式下不做任何事
+        """
+        if not cls.is_filtered():
+            return
+        await cls._page_in(cls._role_closure.subjects(subject))
+    
+    @classmethod
+    async def _page_in(cls, subjects: Iterable[str]) -> None:
+        """从数据库读入尚未加载主体的 p 规则，并在超出内存上限时淘汰最久未用的主体"""
+        subjects = set(subjects)
+        for subject in subjects & cls._loaded_subjects.keys():
+            cls._loaded_subjects.move_to_end(subject)
+        missing = subjects - cls._loaded_subjects.keys()
+        if not missing:
+            return
+
+        cls._loading |= missing
+        try:
+            rules = await cls.get_adapter().load_policy_for_subjects("p", sorted(missing))
+        finally:
+            cls._loading -= missing
+        stale = missing & cls._stale
+        cls._stale -= missing
+
+        # 等待数据库期间其他请求可能已加载同一主体，或执行了重新加载；加载期间收到远程变更的主体下次重新读取
+        if not cls.is_filtered():
+            return
+        missing = missing - cls._loaded_subjects.keys() - stale
+        if not missing:
+            return
+        rules = [rule for rule in rules if rule[0] in missing]
+        cls._apply_local(True, "p", "p", rules, changed=False)
+        counts = Counter(rule[0] for rule in rules)
+        for subject in missing:
+            cls._loaded_subjects[subject] = counts.get(subject, 0)
+        cls._loaded_rules += len(rules)
+        cls._filtered_stats["page_ins"] += len(missing)
+        cls._filtered_stats["paged_rules"] += len(rules)
+        logger.debug(f"📥 按需加载 {len(missing)} 个主体的 {len(rules)} 条策略")
+        cls._evict(protect=subjects)
+    
+    @classmethod
+    def _evict(cls, protect: Iterable[str] = ()) -> None:
+        """已加载 p 规则超出上限时，按最近最少使用淘汰主体（常驻主体与 protect 中的主体除外）"""
+        budget = settings.CASBIN_FILTERED_MAX_RULES
+        if cls._loaded_rules <= budget:
+            return
+        keep = set(settings.CASBIN_PRELOAD_SUBJECTS) | set(protect)
+        remaining = cls._loaded_rules
+        victims = set()
+        for subject, count in cls._loaded_subjects.items():
+            if remaining <= budget:
+                break
+            if subject in keep:
+                continue
+            victims.add(subject)
+            remaining -= count
+        if not victims:
+            return
+
+        policy = cls.get_enforcer().get_model().model["p"]["p"].policy
+        rules = [rule for rule in policy if rule[0] in victims]
+        cls._apply_local(False, "p", "p", rules, changed=False)
+        for subject in victims:
+            cls._loaded_rules -= cls._loaded_subjects.pop(subject)
+        cls._filtered_stats["evictions"] += len(victims)
+        cls._filtered_stats["evicted_rules"] += len(rules)
+        logger.debug(f"📤 淘汰 {len(victims)} 个主体的 {len(rules)} 条策略")
+    
+    @classmethod
+    def get_filtered_loading_stats(cls) -> Dict[str, Any]:
+        """过滤加载模式的内存占用与按需加载/淘汰统计"""
+        cls.get_enforcer()
+        return {
+            "enabled": cls.is_filtered(),
+            "loaded_subjects": len(cls._loaded_subjects),
+            "loaded_rules": cls._loaded_rules,
+            "max_rules": settings.CASBIN_FILTERED_MAX_RULES,
+            **cls._filtered_stats,
+            "last_load": cls._last_load,
+        }
+    
+    @classmethod
+    async def _write_through(cls, add: bool, sec: str, rule: List[str]) -> bool:
+        """
+        写穿式持久化单条规则：先在一个事务中插入/删除对应的一行，成功后再更新内存模型
+        数据库写入失败时内存模型保持不变；写入与更新内存模型在 _apply_lock 内完成，内存中的变更顺序与数据库一致
+        """
+        adapter = cls.get_adapter()
+        async with cls._apply_lock:
+            try:
+                if add:
+                    await adapter.add_policy(sec, sec, rule)
+                else:
+                    await adapter.remove_policy(sec, sec, rule)
+            except Exception as e:
+                log_error(e, "策略持久化")
+                return False
+            rules = cls._resident(sec, [rule])
+            policy = cls.get_enforcer().get_model().model[sec][sec].policy
+            # 并发的相同写入：前一个请求已应用到内存，数据库也没有变化，不再递增策略版本
+            if not rules or cls._effective(policy, add, rules):
+                cls._apply_local(add, sec, sec, rules)
+        cls._schedule_snapshot()
+        await cls._broadcast(add, sec, [rule])
+        return True
+    
+    @classmethod
+    def _diff(cls, add: bool, sec: str, rules: Sequence[Sequence[str]]):
+        """
+        将规则与当前内存模型比对，返回 (逐条处理结果, 需要实际写入的规则)
+        - added / removed: 需要写入
+        - exists / not_found: 添加时已存在 / 删除时不存在，跳过
+        - duplicate: 与同一批次中前面的规则重复，跳过
+        """
+        model = cls.get_enforcer().get_model()
+        existing = {tuple(rule) for rule in model.model[sec][sec].policy}
+        done = "added" if add else "removed"
+        skipped = "exists" if add else "not_found"
+
+        seen = set()
+        pending: List[List[str]] = []
+        statuses: List[str] = []
+        for rule in rules:
+            key = tuple(rule)
+            if key in seen:
+                statuses.append("duplicate")
+            elif (key in existing) == add:
+                statuses.append(skipped)
+            else:
+                seen.add(key)
+                pending.append(list(rule))
+                statuses.append(done)
+        return statuses, pending
+
+    @classmethod
+    async def _write_batch(cls, add: bool, sec: str, rules: List[List[str]]) -> List[str]:
+        """
+        批量写穿：过滤已存在/不存在及重复的规则后，在一个事务中多行写入，成功后一次性更新内存模型
+        返回与输入一一对应的处理结果（见 _diff），数据库写入失败时为 failed，整个批次已回滚
+        """
+        await cls._page_in_rules(sec, rules)
+        adapter = cls.get_adapter()
+        async with cls._apply_lock:
+            statuses, pending = cls._diff(add, sec, rules)
+            if not pending:
+                return statuses
+            try:
+                if add:
+                    await adapter.add_policies(sec, sec, pending)
+                else:
+                    await adapter.remove_policies(sec, sec, pending)
+            except Exception as e:
+                log_error(e, "批量策略持久化")
+                done = "added" if add else "removed"
+                return ["failed" if status == done else status for status in statuses]
+            cls._apply_local(add, sec, sec, cls._resident(sec, pending))
+        cls._schedule_snapshot()
+        await cls._broadcast(add, sec, pending)
+        return statuses
+
+    @classmethod
+    async def _broadcast(cls, add: bool, sec: str, rules: List[List[str]]) -> None:
+        """
+        将已持久化的规则变更广播给其他 worker（未启用策略同步时不做任何事）
+        g 规则变更时同时失效相关用户的身份缓存（身份缓存本身会广播到其他 worker）
+        """
+        from app.services.casbin_watcher import publish_policy_change
+        await publish_policy_change("add" if add else "remove", sec, rules)
+        if sec == "g":
+            await invalidate_principals_for_usernames(rule[0] for rule in rules)
+
+    @classmethod
+    def apply_remote_change(cls, add: bool, sec: str, rules: Sequence[Sequence[str]]) -> int:
+        """
+        应用其他 worker 广播的规则变更（数据库已由对方写入，这里只更新内存模型）
+        按当前模型过滤后再应用，重复收到的变更不会产生副作用，返回实际应用的规则数
+        过滤加载模式下未加载主体的 p 规则不进入内存，但策略版本照常递增：
+        缓存的决策可能是在该主体被淘汰前计算的，重新加载后须按新规则重新判定
+        """
+        if sec == "p" and cls.is_filtered():
+            cls._stale |= {rule[0] for rule in rules} & cls._loading
+            _, pending = cls._diff(add, sec, cls._resident(sec, [list(rule) for rule in rules]))
+            cls._apply_local(add, sec, sec, pending, changed=False)
+            if rules:
+                cls._policy_changed(f"remote {'add' if add else 'remove'} {len(rules)} {sec}")
+            return len(pending)
+        _, pending = cls._diff(add, sec, rules)
+        if pending:
+            cls._apply_local(add, sec, sec, pending)
+        return len(pending)
+
+    @classmethod
+    async def _page_in_rules(cls, sec: str, rules: Sequence[Sequence[str]]) -> None:
+        """过滤加载模式下修改 p 规则前先加载规则主体的现有规则，保证与内存模型比对的结果准确"""
+        if sec == "p" and cls.is_filtered():
+            await cls._page_in({rule[0] for rule in rules})
+
+    @staticmethod
+    def summarize(statuses: Sequence[str]) -> Dict[str, int]:
+        """统计批量操作中各处理结果的数量"""
+        return dict(Counter(statuses))
+
+    @classmethod
+    async def add_policies(cls, rules: List[List[str]]) -> List[str]:
+        """批量添加策略，rules 为 [role, resource, action] 列表"""
+        statuses = await cls._write_batch(True, "p", rules)
+        log_casbin("批量添加策略", f"{cls.summarize(statuses)}")
+        return statuses
+
+    @classmethod
+    async def remove_policies(cls, rules: List[List[str]]) -> List[str]:
+        """批量删除策略，rules 为 [role, resource, action] 列表"""
+        statuses = await cls._write_batch(False, "p", rules)
+        log_casbin("批量删除策略", f"{cls.summarize(statuses)}")
+        return statuses
+
+    @classmethod
+    async def apply_policy_set(
+        cls, desired: PolicySet, dry_run: bool = False, domain: str = DEFAULT_DOMAIN
+    ) -> Dict[str, Any]:
+        """
+        声明式应用完整策略集：与当前策略按规则哈希求差集，只写入差异
+        数据库在一个事务中删除多余规则、插入缺少的规则，成功后一次性更新内存模型并广播增量
+        过滤加载模式下内存中只有部分 p 规则，p 规则改为与数据库中的全部规则比对
+        domain 非空时应用到该租户（见 DomainEnforcerPool.apply_policy_set）
+        返回结果中 status 为 unchanged / dry_run / applied / failed（数据库写入失败，事务已回滚）
+        """
+        if domain:
+            from app.services.casbin_domains import DomainEnforcerPool
+            return await DomainEnforcerPool.apply_policy_set(domain, desired, dry_run)
+        started = time.perf_counter()
+        async with cls._apply_lock:
+            model = cls.get_enforcer().get_model().model
+            added: Dict[str, List[List[str]]] = {}
+            removed: Dict[str, List[List[str]]] = {}
+            summary: Dict[str, Dict[str, int]] = {}
+            for sec in POLICY_ARITY:
+                if sec == "p" and cls.is_filtered():
+                    current = await cls.get_adapter().load_rules(sec)
+                else:
+                    current = model[sec][sec].policy
+                existing = dict.fromkeys(tuple(rule) for rule in current)
+                wanted = dict.fromkeys(tuple(rule) for rule in desired.get(sec, ()))
+                added[sec] = [list(rule) for rule in wanted if rule not in existing]
+                removed[sec] = [list(rule) for rule in existing if rule not in wanted]
+                summary[sec] = {
+                    "desired": len(wanted),
+                    "added": len(added[sec]),
+                    "removed": len(removed[sec]),
+                    "unchanged": len(wanted) - len(added[sec]),
+                }
+
+            changes = sum(len(rules) for rules in added.values()) + sum(len(rules) for rules in removed.values())
+            if not changes:
+                result_status = "unchanged"
+            elif dry_run:
+                result_status = "dry_run"
+            else:
+                try:
+                    await cls.get_adapter().apply_changes(removed, added)
+                except Exception as e:
+                    log_error(e, "声明式策略应用")
+                    result_status = "failed"
+                else:
+                    result_status = "applied"
+                    for sec in POLICY_ARITY:
+                        cls._apply_local(False, sec, sec, cls._resident(sec, removed[sec]), changed=False)
+                        cls._apply_local(True, sec, sec, cls._resident(sec, added[sec]), changed=False)
+                    cls._policy_changed(f"apply +{sum(len(rules) for rules in added.values())} "
+                                        f"-{sum(len(rules) for rules in removed.values())}")
+                    cls._schedule_snapshot()
+                    for sec in POLICY_ARITY:
+                        if removed[sec]:
+                            await cls._broadcast(False, sec, removed[sec])
+                        if added[sec]:
+                            await cls._broadcast(True, sec, added[sec])
+
+        listed = [rules for group in (added, removed) for rules in group.values()]
+        result = {
+            "status": result_status,
+            "summary": summary,
+            "added": {sec: rules[:APPLY_REPORT_LIMIT] for sec, rules in added.items()},
+            "removed": {sec: rules[:APPLY_REPORT_LIMIT] for sec, rules in removed.items()},
+            "truncated": any(len(rules) > APPLY_REPORT_LIMIT for rules in listed),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+        log_casbin("声明式应用策略集", f"{result_status} {summary}")
+        return result
+
+    @classmethod
+    async def add_roles_for_users(cls, assignments: List[List[str]]) -> List[str]:
+        """批量分配角色，assignments 为 [username, role] 列表"""
+        statuses = await cls._write_batch(True, "g", assignments)
+        log_casbin("批量分配角色", f"{cls.summarize(statuses)}")
+        return statuses
+
+    @classmethod
+    async def delete_roles_for_users(cls, assignments: List[List[str]]) -> List[str]:
+        """批量移除角色，assignments 为 [username, role] 列表"""
+        statuses = await cls._write_batch(False, "g", assignments)
+        log_casbin("批量移除角色", f"{cls.summarize(statuses)}")
+        return statuses
+
+    @classmethod
+    async def add_policy(cls, role: str, resource: str, action: str) -> bool:
         """添加策略"""
         enforcer = cls.get_enforcer()
+        await cls._page_in_rules("p", [[role]])
         
         # 检查策略是否已存在
         if enforcer.has_policy(role, resource, action):
             logger.debug(f"📝 策略已存在: {role} {resource} {action}")
             return False
         
-        result = enforcer.add_policy(role, resource, action)
+        result = await cls._write_through(True, "p", [role, resource, action])
         if result:
-            enforcer.save_policy()
             log_casbin("添加策略", f"{role} -> {resource} {action}")
         else:
             logger.warning(f"⚠️ 策略添加失败: {role} {resource} {action}")
@@ -83,13 +751,17 @@ class CasbinService:
         return result
     
     @classmethod
-    def remove_policy(cls, role: str, resource: str, action: str) -> bool:
+    async def remove_policy(cls, role: str, resource: str, action: str) -> bool:
         """删除策略"""
         enforcer = cls.get_enforcer()
-        result = enforcer.remove_policy(role, resource, action)
+        await cls._page_in_rules("p", [[role]])
+        
+        if not enforcer.has_policy(role, resource, action):
+            logger.warning(f"⚠️ 策略删除失败，策略不存在: {role} {resource} {action}")
+            return False
         
+        result = await cls._write_through(False, "p", [role, resource, action])
         if result:
-            enforcer.save_policy()
             log_casbin("删除策略", f"{role} -> {resource} {action}")
         else:
             logger.warning(f"⚠️ 策略删除失败: {role} {resource} {action}")
@@ -97,18 +769,17 @@ class CasbinService:
         return result
     
     @classmethod
-    def add_role_for_user(cls, username: str, role: str) -> bool:
+    async def add_role_for_user(cls, username: str, role: str) -> bool:
         """为用户分配角色"""
         enforcer = cls.get_enforcer()
         
         # 检查角色分配是否已存在
-        if enforcer.has_role_for_user(username, role):
+        if enforcer.has_grouping_policy(username, role):
             logger.debug(f"👤 角色分配已存在: {username} -> {role}")
             return False
         
-        result = enforcer.add_role_for_user(username, role)
+        result = await cls._write_through(True, "g", [username, role])
         if result:
-            enforcer.save_policy()
             log_casbin("分配角色", f"{username} -> {role}")
         else:
             logger.warning(f"⚠️ 角色分配失败: {username} -> {role}")
@@ -116,13 +787,16 @@ class CasbinService:
         return result
     
     @classmethod
-    def delete_role_for_user(cls, username: str, role: str) -> bool:
+    async def delete_role_for_user(cls, username: str, role: str) -> bool:
         """删除用户角色"""
         enforcer = cls.get_enforcer()
-        result = enforcer.delete_role_for_user(username, role)
         
+        if not enforcer.has_grouping_policy(username, role):
+            logger.warning(f"⚠️ 角色移除失败，角色分配不存在: {username} <- {role}")
+            return False
+        
+        result = await cls._write_through(False, "g", [username, role])
         if result:
-            enforcer.save_policy()
             log_casbin("移除角色", f"{username} <- {role}")
         else:
             logger.warning(f"⚠️ 角色移除失败: {username} <- {role}")
@@ -130,52 +804,360 @@ class CasbinService:
         return result
     
     @classmethod
-    def get_roles_for_user(cls, username: str) -> List[str]:
-        """获取用户的所有角色"""
-        enforcer = cls.get_enforcer()
-        roles = enforcer.get_roles_for_user(username)
+    async def get_roles_for_user(cls, username: str) -> List[str]:
+        """获取用户直接分配的角色"""
+        cls.get_enforcer()
+        roles = cls._role_closure.direct_roles(username)
         logger.debug(f"👤 {username} 的角色: {roles}")
         return roles
     
     @classmethod
-    def get_users_for_role(cls, role: str) -> List[str]:
-        """获取拥有指定角色的所有用户"""
-        enforcer = cls.get_enforcer()
-        users = enforcer.get_users_for_role(role)
+    async def get_effective_roles_for_user(cls, username: str) -> List[str]:
+        """获取用户的全部有效角色（包括通过角色继承得到的角色）"""
+        cls.get_enforcer()
+        roles = sorted(cls._role_closure.roles(username))
+        logger.debug(f"👤 {username} 的有效角色: {roles}")
+        return roles
+    
+    @classmethod
+    async def get_users_for_role(cls, role: str) -> List[str]:
+        """获取直接分配了指定角色的所有用户"""
+        cls.get_enforcer()
+        users = cls._role_registry.members(role)
         logger.debug(f"👥 角色 {role} 的用户: {users}")
         return users
     
     @classmethod
-    def get_permissions_for_user(cls, username: str) -> List[List[str]]:
-        """获取用户的所有权限"""
-        enforcer = cls.get_enforcer()
-        permissions = enforcer.get_permissions_for_user(username)
+    async def get_permissions_for_user(cls, username: str) -> List[List[str]]:
+        """获取用户的有效权限（直接授予及通过角色继承得到的策略）"""
+        cls.get_enforcer()
+        await cls.ensure_loaded(username)
+        permissions = cls._role_closure.permissions(username)
         logger.debug(f"🔐 {username} 的权限: {len(permissions)} 个")
         return permissions
     
     @classmethod
-    def save_policy(cls) -> bool:
+    def get_role_closure_stats(cls) -> Dict[str, Any]:
+        """角色闭包规模与内存占用"""
+        cls.get_enforcer()
+        return cls._role_closure.stats()
+    
+    @classmethod
+    async def save_policy(cls) -> bool:
         """保存策略到数据库"""
         enforcer = cls.get_enforcer()
-        result = enforcer.save_policy()
-        if result:
-            log_casbin("保存策略", "策略已同步到数据库")
-        else:
-            logger.error("💥 策略保存失败")
-        return result
+        try:
+            await enforcer.save_policy()
+        except Exception as e:
+            logger.error(f"💥 策略保存失败: {e}")
+            log_error(e, "保存策略")
+            return False
+        log_casbin("保存策略", "策略已同步到数据库")
+        return True
     
     @classmethod
-    def load_policy(cls) -> bool:
-        """从数据库加载策略"""
+    async def load_policy(cls) -> bool:
+        """
+        从数据库加载策略（不阻塞事件循环）
+        启用 CASBIN_FILTERED_LOADING 时只加载全部 g 规则及常驻、已加载主体的 p 规则
+        """
         enforcer = cls.get_enforcer()
-        result = enforcer.load_policy()
-        if result:
-            policies = enforcer.get_policy()
-            groupings = enforcer.get_grouping_policy()
-            log_casbin("加载策略", f"从数据库加载 {len(policies)} 个策略, {len(groupings)} 个角色分配")
-        else:
-            logger.error("💥 策略加载失败")
-        return result
+        filtered = settings.CASBIN_FILTERED_LOADING
+        started = time.perf_counter()
+        rss_before = _rss_bytes()
+        cls._snapshot_base = None
+        try:
+            if filtered:
+                await cls._load_filtered(enforcer)
+            else:
+                # 加载前读取数据库标记：加载期间新增的行也会读入，之后写快照时按增量核对
+                base = await cls.get_adapter().policy_stamp() if cls._snapshot_enabled() else None
+                await enforcer.load_policy()
+                cls._loaded_subjects = OrderedDict()
+                cls._loaded_rules = 0
+                cls._snapshot_base = base
+        except Exception as e:
+            logger.error(f"💥 策略加载失败: {e}")
+            log_error(e, "加载策略")
+            return False
+        finally:
+            model = enforcer.get_model().model
+            compile_key_match2.cache_clear()
+            cls._role_closure.build(model["g"]["g"].policy, model["p"]["p"].policy)
+            cls._role_registry.build(model["g"]["g"].policy, model["p"]["p"].policy)
+            if cls._path_index is not None:
+                cls._path_index.build(model["p"]["p"].policy)
+            if cls._route_table is not None:
+                cls._route_table.build(model["p"]["p"].policy)
+            cls._policy_changed("load_policy")
+        model = enforcer.get_model().model
+        rss_after = _rss_bytes()
+        cls._last_load = {
+            "mode": "filtered" if filtered else "full",
+            "p_rules": len(model["p"]["p"].policy),
+            "g_rules": len(model["g"]["g"].policy),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+            "rss_bytes": rss_after,
+            "rss_delta_bytes": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+        }
+        log_casbin(
+            "加载策略",
+            f"从数据库加载 {cls._last_load['p_rules']} 个策略, {cls._last_load['g_rules']} 个角色分配 "
+            f"({cls._last_load['mode']}, {cls._last_load['elapsed_ms']}ms, RSS {rss_after})",
+        )
+        return True
+    
+    @classmethod
+    async def _load_filtered(cls, enforcer: casbin.AsyncEnforcer) -> None:
+        """
+        过滤加载：在新模型中读入策略后再整体替换，加载期间旧模型继续提供服务
+        重新加载时保留已加载的主体，按需加载的结果不会因 reload 丢失
+        """
+        subjects = list(cls._loaded_subjects)
+        subjects += [subject for subject in settings.CASBIN_PRELOAD_SUBJECTS if subject not in cls._loaded_subjects]
+        new_model = Model()
+        new_model.load_model(MODEL_PATH)
+        await cls.get_adapter().load_filtered_policy(new_model, PolicyFilter(("g",), subjects))
+        new_model.sort_policies_by_priority()
+        for rm in enforcer.rm_map.values():
+            rm.clear()
+        new_model.build_role_links(enforcer.rm_map)
+        enforcer.model = new_model
+
+        counts = Counter(rule[0] for rule in new_model.model["p"]["p"].policy)
+        cls._loaded_subjects = OrderedDict((subject, counts.get(subject, 0)) for subject in subjects)
+        cls._loaded_rules = sum(cls._loaded_subjects.values())
+    
+    @classmethod
+    async def reload_policy(cls) -> bool:
+        """从数据库重新加载策略，并通知其他 worker 同样重新加载"""
+        if not await cls.load_policy():
+            return False
+        cls._schedule_snapshot()
+        from app.services.casbin_watcher import publish_policy_change
+        await publish_policy_change("reload")
+        # 数据库中的角色分配可能被整体修改，无法得知涉及哪些用户
+        await invalidate_all_principals()
+        return True
+    
+    @classmethod
+    def _snapshot_enabled(cls) -> bool:
+        return bool(settings.CASBIN_SNAPSHOT_PATH) and not settings.CASBIN_FILTERED_LOADING
+    
+    @classmethod
+    async def boot_policy(cls) -> bool:
+        """
+        应用启动时加载策略
+        配置了 CASBIN_SNAPSHOT_PATH 时优先从快照恢复，并按数据库标记补齐快照之后新增的规则；
+        快照不可用或与数据库不一致时回退为从数据库加载，并重新写入快照
+        """
+        if not cls._snapshot_enabled():
+            return await cls.load_policy()
+        if await cls.load_snapshot():
+            return True
+        if not await cls.load_policy():
+            return False
+        await cls.write_snapshot()
+        return True
+    
+    @classmethod
+    async def load_snapshot(cls) -> bool:
+        """
+        从快照恢复编译后的策略状态
+        数据库标记 (行数, 最大 id) 与快照一致时直接使用；只有新增行时读取这些行补齐；
+        有行被删除时无法增量补齐，返回 False 由调用方全量加载
+        """
+        enforcer = cls.get_enforcer()
+        adapter = cls.get_adapter()
+        started = time.perf_counter()
+        try:
+            snapshot = read_snapshot(settings.CASBIN_SNAPSHOT_PATH, MODEL_PATH)
+            stamp = await adapter.policy_stamp()
+            delta = []
+            if stamp != snapshot.stamp:
+                if stamp[1] > snapshot.stamp[1]:
+                    delta = await adapter.load_rows_after(snapshot.stamp[1])
+                if stamp[0] != snapshot.stamp[0] + len(delta):
+                    raise SnapshotError(f"快照 {snapshot.stamp} 与数据库 {stamp} 不一致")
+        except SnapshotError as e:
+            logger.info(f"📦 策略快照不可用，从数据库加载: {e}")
+            return False
+        except Exception as e:
+            log_error(e, "读取策略快照")
+            return False
+
+        try:
+            with paused_gc():
+                cls._restore_state(enforcer, snapshot.state)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.info(f"📦 策略快照内容不符，从数据库加载: {type(e).__name__}: {e}")
+            return False
+        applied = 0
+        for sec in ("p", "g"):
+            rules = [rule for ptype, rule in delta if ptype == sec]
+            if rules:
+                applied += cls.apply_remote_change(True, sec, rules)
+        cls._snapshot_base = stamp
+
+        model = enforcer.get_model().model
+        cls._snapshot_stats["last_boot"] = {
+            "snapshot_bytes": snapshot.size,
+            "stamp": list(snapshot.stamp),
+            "delta_rules": applied,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+        log_casbin(
+            "加载策略快照",
+            f"{len(model['p']['p'].policy)} 个策略, {len(model['g']['g'].policy)} 个角色分配, "
+            f"补齐 {applied} 条 ({cls._snapshot_stats['last_boot']['elapsed_ms']}ms)",
+        )
+        return True
+    
+    @classmethod
+    def _export_state(cls, enforcer: casbin.AsyncEnforcer) -> Dict[str, Any]:
+        """
+        导出编译后的策略状态：规则、角色闭包与路径模式索引（只含 JSON 类型）
+        角色管理器与角色目录由规则直接重建，开销与规则条数成正比
+        """
+        model = enforcer.get_model().model
+        # 规则值按字符串表编号保存：恢复时每个不同的值只需 intern 一次
+        strings: Dict[str, int] = {}
+        p_rules = [[strings.setdefault(value, len(strings)) for value in rule] for rule in model["p"]["p"].policy]
+        g_rules = [[strings.setdefault(value, len(strings)) for value in rule] for rule in model["g"]["g"].policy]
+        return {
+            "strings": list(strings),
+            "p": p_rules,
+            "g": g_rules,
+            "closure": cls._role_closure.export_state(),
+            "index": cls._path_index.export_state() if cls._path_index is not None else None,
+        }
+    
+    @classmethod
+    def _restore_state(cls, enforcer: casbin.AsyncEnforcer, state: Dict[str, Any]) -> None:
+        """用快照中的状态替换当前模型、角色管理器、角色闭包、角色目录与路径模式索引"""
+        # 规则值与从数据库加载时一样 intern，同名的角色、资源共享同一个字符串对象
+        strings = [sys.intern(value) for value in state["strings"]]
+        p_rules = [[strings[i] for i in rule] for rule in state["p"]]
+        g_rules = [[strings[i] for i in rule] for rule in state["g"]]
+        new_model = Model()
+        new_model.load_model(MODEL_PATH)
+        new_model.model["p"]["p"].policy = p_rules
+        new_model.model["g"]["g"].policy = g_rules
+        for role_manager in enforcer.rm_map.values():
+            role_manager.clear()
+        new_model.build_role_links(enforcer.rm_map)
+        enforcer.model = new_model
+
+        cls._role_closure.restore_state(state["closure"], g_rules, p_rules)
+        cls._role_registry.build(g_rules, p_rules)
+        if cls._path_index is not None:
+            if state["index"] is not None:
+                cls._path_index.restore_state(state["index"])
+            else:
+                cls._path_index.build(p_rules)
+        if cls._route_table is not None:
+            cls._route_table.build(p_rules)
+        cls._policy_changed("load_snapshot")
+    
+    @classmethod
+    async def write_snapshot(cls) -> bool:
+        """
+        将当前策略状态写入快照
+        先在事件循环线程中序列化内存模型（期间策略不会被修改），再与数据库核对，文件写入放到线程池
+        快照头中的数据库标记必须与写入的内存状态一致：其他 worker 的变更尚未同步到本 worker 时
+        （未启用策略同步或广播尚未到达），内存比数据库旧，此时不写快照
+        """
+        if not cls._snapshot_enabled():
+            return False
+        enforcer = cls.get_enforcer()
+        started = time.perf_counter()
+        try:
+            model = enforcer.get_model().model
+            rules = {("p", *rule) for rule in model["p"]["p"].policy} | {("g", *rule) for rule in model["g"]["g"].policy}
+            payload = dump_state(cls._export_state(enforcer))
+            stamp = await cls._verified_stamp(rules)
+            if stamp is None:
+                cls._snapshot_stats["stale_skips"] += 1
+                logger.debug("📦 内存策略与数据库不一致（其他 worker 的变更尚未同步），跳过本次快照")
+                return False
+            data = encode_snapshot(MODEL_PATH, stamp, payload)
+            await asyncio.to_thread(write_snapshot_file, settings.CASBIN_SNAPSHOT_PATH, data)
+        except Exception as e:
+            cls._snapshot_stats["write_errors"] += 1
+            log_error(e, "写入策略快照")
+            return False
+        cls._snapshot_base = stamp
+        cls._snapshot_stats["writes"] += 1
+        cls._snapshot_stats["last_write"] = {
+            "bytes": len(data),
+            "stamp": list(stamp),
+            "policy_version": cls._policy_version,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+        logger.debug(f"📦 策略快照已写入: {len(data)} 字节, 数据库标记 {stamp}")
+        return True
+    
+    @classmethod
+    async def _verified_stamp(cls, rules: Set[Tuple[str, ...]]) -> Optional[Tuple[int, int]]:
+        """
+        核对内存中的规则 rules 与数据库是否一致，一致时返回数据库标记 (行数, 最大 id)，否则返回 None
+        - 自上次确认的标记之后只有新增行时，只读取这些行：全部在内存中且总数相同即一致
+        - 有行被删除或没有可用的标记时，读取全部规则比对
+        """
+        adapter = cls.get_adapter()
+        stamp = await adapter.policy_stamp()
+        if len(rules) != stamp[0]:
+            return None
+        base = cls._snapshot_base
+        if base is not None and stamp[1] >= base[1]:
+            delta = await adapter.load_rows_after(base[1])
+            if stamp[0] == base[0] + len(delta):
+                return stamp if all((ptype, *rule) in rules for ptype, rule in delta) else None
+        current = set()
+        for sec in ("p", "g"):
+            current.update((sec, *rule) for rule in await adapter.load_rules(sec))
+        return stamp if current == rules else None
+    
+    @classmethod
+    def _schedule_snapshot(cls) -> None:
+        """本 worker 写库成功后延迟写快照，短时间内的连续变更只写一次"""
+        if not cls._snapshot_enabled():
+            return
+        if cls._snapshot_task is None or cls._snapshot_task.done():
+            cls._snapshot_task = asyncio.create_task(cls._delayed_snapshot())
+    
+    @classmethod
+    async def _delayed_snapshot(cls) -> None:
+        while True:
+            await asyncio.sleep(settings.CASBIN_SNAPSHOT_WRITE_DELAY)
+            version = cls._policy_version
+            await cls.write_snapshot()
+            # 写入期间又有变更时再写一次
+            if cls._policy_version == version:
+                return
+    
+    @classmethod
+    async def stop_snapshot_writer(cls) -> None:
+        """应用关闭时取消延迟任务，并立即写入尚未落盘的变更"""
+        task = cls._snapshot_task
+        if task is None or task.done():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        cls._snapshot_task = None
+        await cls.write_snapshot()
+    
+    @classmethod
+    def get_snapshot_stats(cls) -> Dict[str, Any]:
+        """策略快照读写统计"""
+        return {
+            "enabled": cls._snapshot_enabled(),
+            "path": settings.CASBIN_SNAPSHOT_PATH,
+            **cls._snapshot_stats,
+        }
     
     @classmethod
     def get_all_policies(cls) -> List[List[str]]:
@@ -185,28 +1167,54 @@ class CasbinService:
         logger.debug(f"📊 当前策略总数: {len(policies)}")
         return policies
     
+    @classmethod
+    async def export_policies(
+        cls,
+        ptype: Optional[str] = None,
+        subject: Optional[str] = None,
+        obj_prefix: Optional[str] = None,
+        after_id: int = 0,
+        domain: str = DEFAULT_DOMAIN,
+    ) -> AsyncIterator[Tuple[int, str, List[str]]]:
+        """
+        按 id 顺序流式导出数据库中的规则，产出 (id, ptype, 规则)
+        直接从数据库分页读取，过滤加载模式下同样导出全部规则；after_id 为上次导出的最后一个 id
+        domain 非空时导出该租户的规则（不需要加载该租户的执行器）
+        """
+        adapter = cls.get_adapter().for_domain(domain) if domain else cls.get_adapter()
+        async for item in adapter.iter_rules(ptype, subject, obj_prefix, after_id):
+            yield item
+    
     @classmethod
     def get_all_roles(cls) -> List[str]:
-        """获取所有角色"""
-        enforcer = cls.get_enforcer()
-        roles = set()
-        
-        # 从策略中提取角色
-        for policy in enforcer.get_policy():
-            if len(policy) > 0:
-                roles.add(policy[0])
-        
-        # 从角色分配中提取角色
-        for group in enforcer.get_grouping_policy():
-            if len(group) > 1:
-                roles.add(group[1])
-        
-        role_list = list(roles)
-        logger.debug(f"👥 当前角色总数: {len(role_list)} - {role_list}")
+        """获取所有角色（p 规则的主体与 g 规则的角色，按名称排序）"""
+        cls.get_enforcer()
+        role_list = cls._role_registry.names()
+        logger.debug(f"👥 当前角色总数: {len(role_list)}")
         return role_list
     
     @classmethod
-    def initialize_default_policies(cls):
+    def get_role_policy_count(cls, role: str) -> int:
+        """直接授予指定角色的策略数"""
+        cls.get_enforcer()
+        return cls._role_registry.policy_count(role)
+    
+    @classmethod
+    def list_roles(
+        cls, cursor: Optional[str] = None, limit: int = 100, skip: int = 0
+    ) -> Tuple[List[Tuple[str, List[str], int]], Optional[str], int]:
+        """
+        分页获取角色：名称大于 cursor 的角色中跳过 skip 个后取 limit 个
+        返回 ([(角色, 直接成员, 规则条数)], 下一页游标, 角色总数)，开销只与页大小有关
+        """
+        cls.get_enforcer()
+        registry = cls._role_registry
+        names, next_cursor = registry.page(cursor, limit, skip)
+        roles = [(name, registry.members(name), registry.policy_count(name)) for name in names]
+        return roles, next_cursor, len(registry)
+    
+    @classmethod
+    async def initialize_default_policies(cls):
         """初始化默认策略"""
         logger.info("🔧 开始初始化默认策略")
         
@@ -225,30 +1233,12 @@ class CasbinService:
         logger.info(f"📁 从文件导入策略: {csv_path}")
         
         try:
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            policy_count = 0
-            group_count = 0
+            with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+                policy_set = parse_policy_lines(f)
             
-            for line in lines:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                
-                parts = [part.strip() for part in line.split(',')]
-                
-                if parts[0] == 'p' and len(parts) >= 4:
-                    # 策略规则
-                    result = cls.add_policy(parts[1], parts[2], parts[3])
-                    if result:
-                        policy_count += 1
-                        
-                elif parts[0] == 'g' and len(parts) >= 3:
-                    # 角色分配
-                    result = cls.add_role_for_user(parts[1], parts[2])
-                    if result:
-                        group_count += 1
+            # 每类规则一个事务批量写入
+            policy_count = (await cls.add_policies(policy_set["p"])).count("added")
+            group_count = (await cls.add_roles_for_users(policy_set["g"])).count("added")
             
             log_casbin("初始化完成", f"导入 {policy_count} 个策略, {group_count} 个角色分配")
             
@@ -0,0 +1,130 @@
+"""
+Casbin 策略快照
+把编译后的策略状态（规则、角色闭包、路径模式索引）写入带版本头的二进制文件，
+worker 启动时通过 mmap 读取并直接恢复，不再逐行读取数据库、逐个主体遍历角色图和重建索引
+
+文件格式: 固定长度头部 + JSON 负载
+- 头部: 魔数、格式版本、模型文件摘要、数据库标记 (行数, 最大 id)、负载长度、负载 CRC32
+- 负载只包含 JSON 类型（列表、字典、字符串、数字），读取时不会执行任何代码
+- 格式版本或 rbac_model.conf 变化时快照自动失效
+写入时先写临时文件再原子替换，读取方不会看到写了一半的文件
+"""
+
+import contextlib
+import gc
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from typing import Any, Dict, Tuple
+
+MAGIC = b"CMDBCSNP"
+# 快照内容结构变化时递增，旧版本快照会被忽略
+FORMAT_VERSION = 3
+# 魔数, 格式版本, 模型文件 SHA1, 行数, 最大 id, 负载长度, 负载 CRC32
+_HEADER = struct.Struct("<8sH20sQQQI")
+
+
+class SnapshotError(Exception):
+    """快照不存在、版本不符或已损坏"""
+
+
+class PolicySnapshot:
+    """读取到的快照：数据库标记 (行数, 最大 id) 与编译后的策略状态"""
+
+    def __init__(self, stamp: Tuple[int, int], state: Dict[str, Any], size: int):
+        self.stamp = stamp
+        self.state = state
+        self.size = size
+
+
+@contextlib.contextmanager
+def paused_gc():
+    """反序列化、恢复状态会一次性创建大量容器对象，期间暂停循环垃圾回收，避免反复触发全量扫描"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def model_digest(model_path: str) -> bytes:
+    """模型文件摘要，模型变化后旧快照不再适用"""
+    with open(model_path, "rb") as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def dump_state(state: Dict[str, Any]) -> bytes:
+    """序列化策略状态（需在修改策略的同一线程中调用，避免序列化过程中状态被修改）"""
+    return json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_snapshot(model_path: str, stamp: Tuple[int, int], payload: bytes) -> bytes:
+    """为 dump_state 的结果加上头部，stamp 为负载对应的数据库标记 (行数, 最大 id)"""
+    header = _HEADER.pack(
+        MAGIC, FORMAT_VERSION, model_digest(model_path), stamp[0], stamp[1], len(payload), zlib.crc32(payload)
+    )
+    return header + payload
+
+
+def write_snapshot_file(path: str, data: bytes) -> None:
+    """写入临时文件后原子替换快照文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".casbin-snapshot-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_snapshot(path: str, model_path: str) -> PolicySnapshot:
+    """通过 mmap 读取并校验快照，不满足条件时抛出 SnapshotError"""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        raise SnapshotError(f"快照文件不存在: {path}")
+
+    with f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise SnapshotError("快照文件为空")
+        with mm:
+            if len(mm) < _HEADER.size:
+                raise SnapshotError("快照文件头不完整")
+            magic, version, digest, count, max_id, length, crc = _HEADER.unpack_from(mm, 0)
+            if magic != MAGIC:
+                raise SnapshotError("不是策略快照文件")
+            if version != FORMAT_VERSION:
+                raise SnapshotError(f"快照格式版本不符: {version} != {FORMAT_VERSION}")
+            if digest != model_digest(model_path):
+                raise SnapshotError("模型文件已变化")
+            if len(mm) != _HEADER.size + length:
+                raise SnapshotError("快照文件长度不符")
+
+            payload = memoryview(mm)[_HEADER.size:]
+            try:
+                if zlib.crc32(payload) != crc:
+                    raise SnapshotError("快照校验和不符")
+                try:
+                    with paused_gc():
+                        state = json.loads(bytes(payload))
+                except ValueError as e:
+                    raise SnapshotError(f"快照负载无法解析: {e}")
+                if not isinstance(state, dict):
+                    raise SnapshotError("快照负载格式不符")
+            finally:
+                payload.release()
+            return PolicySnapshot((count, max_id), state, len(mm))
@@ -0,0 +1,322 @@
+"""
+Casbin 多 worker 策略同步
+每个 worker 持有独立的执行器，策略变更写库成功后通过 Redis pub/sub 广播增量，
+其他 worker 收到后直接更新内存模型，无需重新加载全部策略
+
+消息带有 Redis INCR 生成的全局序号:
+- 序号连续: 应用增量
+- 序号跳跃（消息丢失、订阅断开等）: 回退为一次全量 load_policy
+- 序号不大于已处理序号: 已包含在之前的全量加载中，忽略
+
+其他租户的变更消息带有 domain，收到后丢弃该租户的执行器，下次访问时重新加载
+
+订阅连接断开时按指数退避重连，重新订阅后执行一次全量加载（断开期间的消息已丢失）
+传播延迟按 Redis 服务器时钟计算：各 worker 订阅时用 TIME 估算本机时钟与 Redis 的偏差，
+发布与接收时间戳都换算到 Redis 时钟，不受各主机之间时钟偏差的影响
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+from app.core.config import get_settings
+from app.core.logging import get_logger, log_error
+
+settings = get_settings()
+logger = get_logger("casbin_watcher")
+
+
+class RedisPolicyWatcher:
+    """
+    基于 Redis pub/sub 的策略变更广播与订阅
+    client 为 redis.asyncio 兼容客户端（测试时可传入 fakeredis.aioredis.FakeRedis）
+    service 为应用变更的目标，默认是 CasbinService；domains 为租户执行器池，默认是 DomainEnforcerPool
+    """
+
+    def __init__(
+        self,
+        client,
+        channel: str,
+        seq_key: str,
+        service=None,
+        domains=None,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ):
+        if service is None:
+            from app.services.casbin_service import CasbinService
+            service = CasbinService
+        if domains is None:
+            from app.services.casbin_domains import DomainEnforcerPool
+            domains = DomainEnforcerPool
+        self.client = client
+        self.channel = channel
+        self.seq_key = seq_key
+        self.service = service
+        self.domains = domains
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.worker_id = uuid.uuid4().hex
+        self.last_seq: Optional[int] = None
+        self._pubsub = None
+        # Redis 服务器时钟 - 本机时钟（秒）
+        self.clock_offset = 0.0
+        self.published = 0
+        self.received = 0
+        self.applied = 0
+        self.reloads = 0
+        self.reconnects = 0
+        self.errors = 0
+        self.last_lag_ms: Optional[float] = None
+        self.max_lag_ms = 0.0
+        self.total_lag_ms = 0.0
+        self.lag_samples = 0
+
+    async def publish(
+        self, op: str, sec: Optional[str] = None, rules: Sequence[Sequence[str]] = (), domain: str = ""
+    ) -> Optional[int]:
+        """
+        广播一次策略变更，op 为 add / remove / reload；domain 非空时为该租户的变更
+        广播失败只记录日志：序号已递增时其他 worker 会在下一条消息处发现跳跃并全量加载
+        """
+        try:
+            seq = await self.client.incr(self.seq_key)
+            message = {
+                "seq": seq,
+                "origin": self.worker_id,
+                "op": op,
+                "sec": sec,
+                "rules": [list(rule) for rule in rules],
+                "ts": self._now(),
+            }
+            if domain:
+                message["domain"] = domain
+            await self.client.publish(self.channel, json.dumps(message, separators=(",", ":")))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ 策略变更广播失败: {type(e).__name__}: {e}")
+            return None
+        self.published += 1
+        return seq
+
+    async def subscribe(self) -> None:
+        """订阅变更频道并记录当前序号；订阅后到达的消息会缓存在连接中，直到开始 listen"""
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+        self.last_seq = int(await self.client.get(self.seq_key) or 0)
+        await self._sync_clock()
+        logger.info(f"📡 已订阅策略变更频道: {self.channel} (序号 {self.last_seq})")
+
+    async def listen(self) -> None:
+        """
+        持续处理变更消息
+        订阅断开（或启动时未能订阅）时按指数退避重新订阅，之后全量加载一次，补上期间错过的变更
+        """
+        delay = self.reconnect_delay
+        resync = self._pubsub is None
+        try:
+            while True:
+                try:
+                    if self._pubsub is None:
+                        await self.subscribe()
+                    if resync:
+                        await self._resync()
+                        resync = False
+                    delay = self.reconnect_delay
+                    async for message in self._pubsub.listen():
+                        if message.get("type") != "message":
+                            continue
+                        await self.handle(message["data"])
+                    raise ConnectionError("订阅连接已关闭")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    resync = True
+                    logger.warning(f"⚠️ 策略变更订阅断开，{delay:.1f}s 后重连: {type(e).__name__}: {e}")
+                    await self._close()
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+        finally:
+            await self._close()
+
+    async def _resync(self) -> None:
+        """重新订阅后全量加载：断开期间的变更无法逐条补回"""
+        self.domains.invalidate()
+        await self.service.load_policy()
+        self.reconnects += 1
+        self.reloads += 1
+        logger.info(f"📡 已重新订阅策略变更频道并全量加载 (序号 {self.last_seq})")
+
+    async def _close(self) -> None:
+        """关闭订阅连接，连接已断开时忽略错误"""
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is None:
+            return
+        try:
+            await pubsub.unsubscribe(self.channel)
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def _sync_clock(self) -> None:
+        """用 Redis TIME 估算本机时钟偏差（按往返时间的一半修正），失败时沿用上一次的估计"""
+        try:
+            sent = time.time()
+            seconds, microseconds = await self.client.time()
+            received = time.time()
+        except Exception as e:
+            logger.warning(f"⚠️ 读取 Redis 时钟失败，传播延迟可能受时钟偏差影响: {type(e).__name__}: {e}")
+            return
+        self.clock_offset = seconds + microseconds / 1_000_000 - (sent + received) / 2
+
+    def _now(self) -> float:
+        """当前时间（Redis 服务器时钟）"""
+        return time.time() + self.clock_offset
+
+    async def handle(self, raw: str) -> None:
+        """处理一条变更消息"""
+        try:
+            message = json.loads(raw)
+            seq = int(message["seq"])
+        except (TypeError, ValueError, KeyError):
+            self.errors += 1
+            logger.warning(f"⚠️ 无效的策略变更消息: {raw!r}")
+            return
+
+        self.received += 1
+        self._record_lag(message.get("ts"))
+
+        if self.last_seq is not None and seq <= self.last_seq:
+            logger.debug(f"⏭️ 忽略已处理的策略变更: 序号 {seq} <= {self.last_seq}")
+            return
+
+        expected = None if self.last_seq is None else self.last_seq + 1
+        gap = expected is not None and seq != expected
+        self.last_seq = seq
+
+        try:
+            if gap:
+                logger.warning(f"⚠️ 策略变更序号跳跃，执行全量加载: 期望 {expected}, 收到 {seq}")
+                self.reloads += 1
+                self.domains.invalidate()
+                await self.service.load_policy()
+            elif message.get("origin") == self.worker_id:
+                # 本 worker 发出的变更已在本地生效
+                return
+            elif message.get("domain"):
+                self.reloads += 1
+                self.domains.invalidate(message["domain"])
+            elif message["op"] == "reload":
+                self.reloads += 1
+                await self.service.load_policy()
+            else:
+                add = message["op"] == "add"
+                count = self.service.apply_remote_change(add, message["sec"], message["rules"])
+                self.applied += count
+                logger.debug(f"🔄 应用远程策略变更: {message['op']} {count} 条 {message['sec']} (序号 {seq})")
+        except Exception as e:
+            self.errors += 1
+            log_error(e, "应用远程策略变更")
+
+    def _record_lag(self, published_at: Optional[float]) -> None:
+        if published_at is None:
+            return
+        lag_ms = max(0.0, (self._now() - float(published_at)) * 1000)
+        self.last_lag_ms = round(lag_ms, 3)
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        self.total_lag_ms += lag_ms
+        self.lag_samples += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "last_seq": self.last_seq,
+            "published": self.published,
+            "received": self.received,
+            "applied": self.applied,
+            "reloads": self.reloads,
+            "reconnects": self.reconnects,
+            "errors": self.errors,
+            "last_lag_ms": self.last_lag_ms,
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "avg_lag_ms": round(self.total_lag_ms / self.lag_samples, 3) if self.lag_samples else None,
+            "clock_offset_ms": round(self.clock_offset * 1000, 3),
+        }
+
+
+_watcher: Optional[RedisPolicyWatcher] = None
+_listener_task: Optional[asyncio.Task] = None
+
+
+def configure_policy_watcher(client=None) -> Optional[RedisPolicyWatcher]:
+    """
+    配置策略同步
+    未传入 client 时使用 app.database.redis_client 的异步客户端
+    """
+    global _watcher
+    if client is None:
+        if not settings.CASBIN_WATCHER_ENABLED:
+            _watcher = None
+            return None
+        from app.database.redis_client import get_async_redis_client
+        client = get_async_redis_client()
+    _watcher = RedisPolicyWatcher(
+        client,
+        channel=settings.CASBIN_WATCHER_CHANNEL,
+        seq_key=settings.CASBIN_WATCHER_SEQ_KEY,
+    )
+    return _watcher
+
+
+async def subscribe_policy_watcher() -> None:
+    """
+    订阅策略变更（应用启动时在 load_policy 之前调用）
+    先订阅再加载，加载期间到达的变更不会丢失
+    """
+    watcher = _watcher or configure_policy_watcher()
+    if watcher is None:
+        return
+    try:
+        await watcher.subscribe()
+    except Exception as e:
+        logger.error(f"💥 订阅策略变更失败: {type(e).__name__}: {e}")
+        log_error(e, "订阅策略变更")
+
+
+def start_policy_watcher() -> None:
+    """
+    启动后台变更处理任务（应用启动时在 load_policy 之后调用）
+    启动时订阅失败的，由后台任务重试订阅并在成功后全量加载
+    """
+    global _listener_task
+    if _watcher is None or _listener_task is not None:
+        return
+    _listener_task = asyncio.create_task(_watcher.listen())
+
+
+async def stop_policy_watcher() -> None:
+    """停止后台变更处理任务（应用关闭时调用）"""
+    global _listener_task
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except asyncio.CancelledError:
+        pass
+    _listener_task = None
+
+
+async def publish_policy_change(
+    op: str, sec: Optional[str] = None, rules: List[List[str]] = (), domain: str = ""
+) -> None:
+    """广播本 worker 的策略变更，未启用策略同步时不做任何事"""
+    if _watcher is not None:
+        await _watcher.publish(op, sec, rules, domain)
+
+
+def get_policy_watcher_stats() -> Optional[Dict[str, Any]]:
+    """策略同步状态与传播延迟"""
+    return _watcher.stats() if _watcher is not None else None
@@ -0,0 +1,385 @@
+"""
+用户身份(principal)缓存
+CasbinAuthBackend 按用户ID缓存认证所需的用户信息，避免每个请求都查询数据库
+
+两级缓存:
+- L1: 进程内 LRU + TTL 缓存
+- L2: Redis 共享缓存（可选），多个 worker / 节点共享
+用户或角色发生变更时由服务层显式失效，并通过 Redis pub/sub 通知其他 worker
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple
+from sqlalchemy import select
+from app.core.cache import TTLCache
+from app.core.config import get_settings
+from app.core.logging import get_logger
+from app.database.session import SessionLocal
+from app.schemas.auth import Principal
+from app.users.models import User
+
+settings = get_settings()
+logger = get_logger("principal_cache")
+
+principal_cache = TTLCache(
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+)
+
+# 失效广播中表示清空全部身份缓存的消息
+ALL_PRINCIPALS = "*"
+
+# 本进程的失效计数：读取数据库前记录，回填 L1 时若已变化说明期间发生过失效，放弃回填
+_invalidation_epoch = 0
+
+# 紧凑序列化时的字段顺序
+_PRINCIPAL_FIELDS = ("id", "username", "email", "is_active", "is_superuser")
+
+
+def dump_principal(principal: Principal) -> str:
+    """将用户身份序列化为紧凑的 JSON 数组"""
+    return json.dumps([getattr(principal, field) for field in _PRINCIPAL_FIELDS], separators=(",", ":"))
+
+
+def load_principal(raw: str) -> Principal:
+    """从紧凑 JSON 数组还原用户身份"""
+    return Principal(**dict(zip(_PRINCIPAL_FIELDS, json.loads(raw))))
+
+
+class RedisPrincipalTier:
+    """
+    Redis 共享身份缓存 + 失效广播
+    client 为 redis.asyncio 兼容客户端（测试时可传入 fakeredis.aioredis.FakeRedis）
+
+    失效时递增代数（generation）：每个用户一个代数键，另有一个全局代数键（清空全部时递增）
+    回填的条目带上查询数据库之前读到的代数，读取时与当前代数不一致的条目视为未命中，
+    这样在"读数据库 → 失效 → 回填"的竞争中写入的旧身份不会被其他 worker 读到
+    """
+
+    def __init__(
+        self,
+        client,
+        ttl: int,
+        channel: str,
+        key_prefix: str = "cmdb:principal:",
+        generation_prefix: str = "cmdb:principal-gen:",
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.channel = channel
+        self.key_prefix = key_prefix
+        self.generation_prefix = generation_prefix
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.errors = 0
+        self.published = 0
+        self.received = 0
+        self.reconnects = 0
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.key_prefix}{user_id}"
+
+    def _generation_key(self, user_id: int) -> str:
+        return f"{self.generation_prefix}{user_id}"
+
+    @property
+    def _global_generation_key(self) -> str:
+        return f"{self.generation_prefix}all"
+
+    async def get(self, user_id: int) -> Tuple[Optional[Principal], Optional[str]]:
+        """
+        读取共享缓存条目，返回 (身份, 当前代数)
+        代数用于未命中时回填（见 set），读取失败时为 None，此时不回填
+        """
+        try:
+            raw, user_generation, global_generation = await self.client.mget(
+                self._key(user_id), self._generation_key(user_id), self._global_generation_key
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Redis身份缓存读取失败: {type(e).__name__}: {e}")
+            return None, None
+        generation = f"{global_generation or 0}.{user_generation or 0}"
+        if raw is None:
+            self.misses += 1
+            return None, generation
+        stored_generation, _, payload = raw.partition("|")
+        if stored_generation != generation:
+            self.stale += 1
+            return None, generation
+        self.hits += 1
+        return load_principal(payload), generation
+
+    async def set(self, user_id: int, principal: Principal, generation: Optional[str]) -> None:
+        """写入共享缓存条目，generation 为查询数据库之前 get 返回的代数"""
+        if generation is None:
+            return
+        try:
+            await self.client.set(self._key(user_id), f"{generation}|{dump_principal(principal)}", ex=self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Redis身份缓存写入失败: {type(e).__name__}: {e}")
+
+    async def invalidate(self, user_id: int) -> None:
+        """递增用户代数、删除共享缓存条目并广播失效消息"""
+        try:
+            await self.client.incr(self._generation_key(user_id))
+            await self.client.delete(self._key(user_id))
+            await self.client.publish(self.channel, str(user_id))
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Redis身份缓存失效广播失败: {type(e).__name__}: {e}")
+
+    async def invalidate_all(self) -> None:
+        """递增全局代数（已有条目全部视为过期，随 TTL 淘汰）并广播清空消息（*）"""
+        try:
+            await self.client.incr(self._global_generation_key)
+            await self.client.publish(self.channel, ALL_PRINCIPALS)
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Redis身份缓存清空广播失败: {type(e).__name__}: {e}")
+
+    async def listen(self) -> None:
+        """
+        订阅失效频道，收到消息时淘汰本进程 L1 缓存条目
+        连接断开时按指数退避重连；断开期间的失效消息已丢失，重新订阅后清空 L1
+        """
+        delay = self.reconnect_delay
+        disconnected = False
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                try:
+                    await pubsub.subscribe(self.channel)
+                    if disconnected:
+                        self.reconnects += 1
+                        _forget_all()
+                        logger.info(f"📡 已重新订阅身份缓存失效频道，清空本进程身份缓存: {self.channel}")
+                    else:
+                        logger.info(f"📡 已订阅身份缓存失效频道: {self.channel}")
+                    delay = self.reconnect_delay
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._on_message(message.get("data"))
+                finally:
+                    await _close_pubsub(pubsub, self.channel)
+                raise ConnectionError("订阅连接已关闭")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                disconnected = True
+                logger.warning(f"⚠️ 身份缓存失效订阅断开，{delay:.1f}s 后重连: {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _on_message(self, data) -> None:
+        self.received += 1
+        if data == ALL_PRINCIPALS:
+            _forget_all()
+            return
+        try:
+            _forget(int(data))
+        except (TypeError, ValueError):
+            logger.warning(f"⚠️ 无效的身份缓存失效消息: {data!r}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "errors": self.errors,
+            "published": self.published,
+            "received": self.received,
+            "reconnects": self.reconnects,
+        }
+
+
+async def _close_pubsub(pubsub, channel: str) -> None:
+    """关闭订阅连接，连接已断开时忽略错误"""
+    try:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
+    except Exception:
+        pass
+
+
+_redis_tier: Optional[RedisPrincipalTier] = None
+_listener_task: Optional[asyncio.Task] = None
+
+
+def configure_redis_tier(client=None) -> Optional[RedisPrincipalTier]:
+    """
+    配置 Redis 共享缓存层
+    未传入 client 时使用 app.database.redis_client 的异步客户端
+    """
+    global _redis_tier
+    if client is None:
+        if not settings.PRINCIPAL_CACHE_REDIS_ENABLED:
+            _redis_tier = None
+            return None
+        from app.database.redis_client import get_async_redis_client
+        client = get_async_redis_client()
+    _redis_tier = RedisPrincipalTier(
+        client,
+        ttl=settings.PRINCIPAL_CACHE_REDIS_TTL,
+        channel=settings.PRINCIPAL_CACHE_CHANNEL,
+    )
+    return _redis_tier
+
+
+async def start_invalidation_listener() -> None:
+    """启动后台失效订阅任务（应用启动时调用）"""
+    global _listener_task
+    tier = _redis_tier or configure_redis_tier()
+    if tier is None or _listener_task is not None:
+        return
+    _listener_task = asyncio.create_task(tier.listen())
+
+
+async def stop_invalidation_listener() -> None:
+    """停止后台失效订阅任务（应用关闭时调用）"""
+    global _listener_task
+    if _listener_task is None:
+        return
+    _listener_task.cancel()
+    try:
+        await _listener_task
+    except asyncio.CancelledError:
+        pass
+    _listener_task = None
+
+
+async def get_principal(user_id: int) -> Optional[Principal]:
+    """依次从 L1、L2 缓存读取用户身份，未启用缓存时始终返回 None"""
+    principal, _ = await _lookup(user_id)
+    return principal
+
+
+async def _lookup(user_id: int) -> Tuple[Optional[Principal], Optional[str]]:
+    """读取 L1、L2 缓存，返回 (身份, L2 代数)；L2 代数供未命中时回填"""
+    if not settings.PRINCIPAL_CACHE_ENABLED:
+        return None, None
+    user_id = int(user_id)
+    principal = principal_cache.get(user_id)
+    if principal is not None or _redis_tier is None:
+        return principal, None
+    epoch = _invalidation_epoch
+    principal, generation = await _redis_tier.get(user_id)
+    if principal is not None and epoch == _invalidation_epoch:
+        principal_cache.set(user_id, principal)
+    return principal, generation
+
+
+async def set_principal(user_id: int, principal: Principal, generation: Optional[str] = None) -> None:
+    """写入用户身份缓存（L1 + L2），generation 为读取数据库之前 L2 返回的代数，缺省时不写 L2"""
+    if not settings.PRINCIPAL_CACHE_ENABLED:
+        return
+    user_id = int(user_id)
+    principal_cache.set(user_id, principal)
+    if _redis_tier is not None:
+        await _redis_tier.set(user_id, principal, generation)
+
+
+async def resolve_principal(user_id: int) -> Optional[Principal]:
+    """
+    解析用户身份：先查缓存，未命中时查询数据库并回填缓存
+    返回的身份可能是未激活用户，由调用方决定如何处理
+    查询数据库期间发生失效时不回填（返回的身份仍用于本次请求）
+    """
+    epoch = _invalidation_epoch
+    principal, generation = await _lookup(user_id)
+    if principal is not None:
+        logger.debug(f"👤 身份缓存命中: {principal.username} (ID: {principal.id})")
+        return principal
+
+    async with SessionLocal() as db:
+        stmt = select(User).filter(User.id == int(user_id))
+        result = await db.execute(stmt)
+        user = result.scalar_one_or_none()
+
+    if user is None:
+        return None
+
+    principal = Principal(
+        id=user.id,
+        username=user.username,
+        email=user.email,
+        is_active=user.is_active,
+        is_superuser=user.is_superuser,
+    )
+    if epoch == _invalidation_epoch:
+        await set_principal(user.id, principal, generation)
+    return principal
+
+
+async def invalidate_principal(user_id: int) -> None:
+    """失效指定用户的身份缓存，并通知其他 worker"""
+    user_id = int(user_id)
+    if _forget(user_id):
+        logger.debug(f"🧹 已失效用户身份缓存: ID {user_id}")
+    if _redis_tier is not None:
+        await _redis_tier.invalidate(user_id)
+
+
+async def invalidate_principals_for_usernames(usernames: Iterable[str]) -> None:
+    """
+    按用户名失效身份缓存（角色分配变化时由 CasbinService 调用）
+    g 规则中的主体是用户名，缓存按用户ID存储：一次查询得到全部用户ID，不是用户的主体（如角色继承）忽略
+    """
+    usernames = sorted(set(usernames))
+    if not usernames or not settings.PRINCIPAL_CACHE_ENABLED:
+        return
+    try:
+        async with SessionLocal() as db:
+            result = await db.execute(select(User.id).filter(User.username.in_(usernames)))
+            user_ids = result.scalars().all()
+    except Exception as e:
+        # 查不到用户ID时退化为清空全部身份缓存，不能让已变更的身份继续有效
+        logger.warning(f"⚠️ 查询用户ID失败，清空全部身份缓存: {type(e).__name__}: {e}")
+        await invalidate_all_principals()
+        return
+    for user_id in user_ids:
+        await invalidate_principal(user_id)
+
+
+async def invalidate_all_principals() -> None:
+    """清空全部身份缓存（L1 + L2），并通知其他 worker（策略整体重新加载时调用）"""
+    clear_principals()
+    if _redis_tier is not None:
+        await _redis_tier.invalidate_all()
+
+
+def clear_principals() -> None:
+    """清空本进程身份缓存"""
+    _forget_all()
+    logger.debug("🧹 已清空用户身份缓存")
+
+
+def _forget(user_id: int) -> bool:
+    """淘汰本进程 L1 条目并推进失效计数"""
+    global _invalidation_epoch
+    _invalidation_epoch += 1
+    return principal_cache.delete(user_id)
+
+
+def _forget_all() -> None:
+    global _invalidation_epoch
+    _invalidation_epoch += 1
+    principal_cache.clear()
+
+
+def get_principal_cache_stats() -> Dict[str, Any]:
+    """身份缓存命中统计"""
+    stats = principal_cache.stats()
+    stats["enabled"] = settings.PRINCIPAL_CACHE_ENABLED
+    stats["redis"] = _redis_tier.stats() if _redis_tier is not None else None
+    return stats
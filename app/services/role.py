@@ -3,9 +3,10 @@
 完全使用casbin_rule表管理角色和权限
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.services.casbin_service import CasbinService
-from app.schemas.role import CasbinRole, CasbinPolicy
+from app.services.principal_cache import invalidate_principal
+from app.schemas.role import CasbinRole, CasbinPolicy, CasbinRoleList
 from app.users.models import User
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -24,7 +25,7 @@ class RoleService:
         roles = []
         for role_name in casbin_roles:
             # 获取拥有此角色的用户
-            users = CasbinService.get_users_for_role(role_name)
+            users = await CasbinService.get_users_for_role(role_name)
             
             # 创建角色描述
             description = self._get_role_description(role_name)
@@ -32,28 +33,47 @@ class RoleService:
             role = CasbinRole(
                 name=role_name,
                 description=description,
-                users=users
+                users=users,
+                policy_count=CasbinService.get_role_policy_count(role_name)
             )
             roles.append(role)
         
         return roles
     
+    async def list_roles(self, cursor: Optional[str] = None, limit: int = 100, skip: int = 0) -> CasbinRoleList:
+        """分页获取角色（按名称排序，cursor 为上一页返回的 next_cursor）"""
+        roles, next_cursor, total = CasbinService.list_roles(cursor, limit, skip)
+        return CasbinRoleList(
+            roles=[
+                CasbinRole(
+                    name=name,
+                    description=self._get_role_description(name),
+                    users=users,
+                    policy_count=policy_count
+                )
+                for name, users, policy_count in roles
+            ],
+            count=total,
+            next_cursor=next_cursor
+        )
+    
     async def get_role_by_name(self, role_name: str) -> CasbinRole:
         """根据名称获取角色"""
-        users = CasbinService.get_users_for_role(role_name)
+        users = await CasbinService.get_users_for_role(role_name)
         description = self._get_role_description(role_name)
         
         return CasbinRole(
             name=role_name,
             description=description,
-            users=users
+            users=users,
+            policy_count=CasbinService.get_role_policy_count(role_name)
         )
     
     async def create_role(self, role_name: str, description: str = None) -> CasbinRole:
         """创建新角色（通过添加策略）"""
         # 在Casbin中，角色通过策略定义，这里我们可以添加一个默认策略
         # 例如：给角色分配基本权限
-        success = CasbinService.add_policy(role_name, "/basic", "GET")
+        success = await CasbinService.add_policy(role_name, "/basic", "GET")
         
         if success:
             return CasbinRole(
@@ -66,7 +86,7 @@ class RoleService:
     
     async def assign_role_to_user(self, username: str, role_name: str) -> bool:
         """为用户分配角色"""
-        success = CasbinService.add_role_for_user(username, role_name)
+        success = await CasbinService.add_role_for_user(username, role_name)
         
         # 如果是admin角色，同时更新数据库中的is_superuser字段
         if success and role_name == "admin":
@@ -76,12 +96,12 @@ class RoleService:
     
     async def remove_role_from_user(self, username: str, role_name: str) -> bool:
         """从用户移除角色"""
-        success = CasbinService.delete_role_for_user(username, role_name)
+        success = await CasbinService.delete_role_for_user(username, role_name)
         
         # 如果移除admin角色，检查是否需要更新is_superuser
         if success and role_name == "admin":
             # 检查用户是否还有其他admin权限
-            remaining_roles = CasbinService.get_roles_for_user(username)
+            remaining_roles = await CasbinService.get_roles_for_user(username)
             if "admin" not in remaining_roles:
                 await self._sync_superuser_status(username, False)
         
@@ -89,7 +109,7 @@ class RoleService:
     
     async def get_user_roles(self, username: str) -> List[str]:
         """获取用户的所有角色"""
-        return CasbinService.get_roles_for_user(username)
+        return await CasbinService.get_roles_for_user(username)
     
     async def get_role_policies(self, role_name: str) -> List[CasbinPolicy]:
         """获取角色的所有策略"""
@@ -126,6 +146,7 @@ class RoleService:
             if user:
                 user.is_superuser = is_superuser
                 await self.db.commit()
+                await invalidate_principal(user.id)
         except Exception as e:
             print(f"同步超级用户状态失败: {e}")
             await self.db.rollback()
@@ -138,7 +159,7 @@ class RoleService:
         
         count = 0
         for user in superusers:
-            success = CasbinService.add_role_for_user(user.username, "admin")
+            success = await CasbinService.add_role_for_user(user.username, "admin")
             if success:
                 count += 1
         
@@ -2,7 +2,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.users.models import User
 from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import get_password_hash
+from app.core.hashing import get_password_hash_async
+from app.services.principal_cache import invalidate_principal
 from typing import List, Optional
 
 class UserService:
@@ -25,7 +26,7 @@ class UserService:
         return result.scalars().all()
 
     async def create_user(self, user: UserCreate) -> User:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
         db_user = User(
             email=user.email,
             username=user.username,
@@ -45,13 +46,14 @@ class UserService:
         
         update_data = user.model_dump(exclude_unset=True)
         if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            update_data["hashed_password"] = await get_password_hash_async(update_data.pop("password"))
         
         for field, value in update_data.items():
             setattr(db_user, field, value)
         
         await self.db.commit()
         await self.db.refresh(db_user)
+        await invalidate_principal(user_id)
         return db_user
 
     async def delete_user(self, user_id: int) -> bool:
@@ -61,4 +63,5 @@ class UserService:
         
         await self.db.delete(db_user)
         await self.db.commit()
+        await invalidate_principal(user_id)
         return True
@@ -1,10 +1,14 @@
 from fastapi import Depends
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import exceptions
 from fastapi_users.manager import BaseUserManager
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from app.users.models import User
 from app.database.session import SessionLocal
 from app.core.config import get_settings
-from typing import AsyncGenerator
+from app.core.hashing import get_password_hash_async, verify_password_async, password_needs_update
+from app.services.principal_cache import invalidate_principal
+from typing import Any, AsyncGenerator, Optional
 
 settings = get_settings()
 
@@ -16,9 +20,62 @@ class UserManager(BaseUserManager[User, int]):
     def parse_id(user_id: int) -> int:
         return user_id
 
+    # 密码哈希全部走异步哈希服务，不在事件循环中同步执行 argon2
+
+    async def create(self, user_create, safe: bool = False, request=None) -> User:
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop("password")
+        user_dict["hashed_password"] = await get_password_hash_async(password)
+
+        created_user = await self.user_db.create(user_dict)
+        await self.on_after_register(created_user, request)
+        return created_user
+
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # 仍然执行一次哈希，避免通过响应时间探测用户是否存在
+            await get_password_hash_async(credentials.password)
+            return None
+
+        if not await verify_password_async(credentials.password, user.hashed_password):
+            return None
+        if password_needs_update(user.hashed_password):
+            hashed_password = await get_password_hash_async(credentials.password)
+            await self.user_db.update(user, {"hashed_password": hashed_password})
+        return user
+
+    async def _update(self, user: User, update_dict: dict[str, Any]) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {k: v for k, v in update_dict.items() if k != "password"}
+            update_dict["hashed_password"] = await get_password_hash_async(password)
+        return await super()._update(user, update_dict)
+
     async def on_after_register(self, user: User, request=None):
         pass
 
+    async def on_after_update(self, user: User, update_dict: dict, request=None):
+        await invalidate_principal(user.id)
+
+    async def on_after_reset_password(self, user: User, request=None):
+        await invalidate_principal(user.id)
+
+    async def on_after_delete(self, user: User, request=None):
+        await invalidate_principal(user.id)
+
 async def get_user_db() -> AsyncGenerator[SQLAlchemyUserDatabase, None]:
     async with SessionLocal() as session:
         yield SQLAlchemyUserDatabase(session, User)
@@ -23,6 +23,19 @@ class User(SQLAlchemyBaseUserTable[int], Base):
 class CasbinRule(Base):
     """Casbin 策略规则表 - 统一管理所有角色和权限"""
     __tablename__ = "casbin_rule"
+    __table_args__ = (
+        # 唯一约束放在哈希列上：v0 ~ v5 可为空且总长度超过 InnoDB 索引长度上限，无法直接建唯一索引
+        sa.Index("uq_casbin_rule_rule_hash", "rule_hash", unique=True),
+        # 按主体过滤加载、按 (ptype, v0, ...) 删除
+        sa.Index(
+            "idx_casbin_rule_ptype_v0_v1_v2", "ptype", "v0", "v1", "v2",
+            mysql_length={"ptype": 32, "v2": 64},
+        ),
+        # 按对象 (v1) 过滤删除
+        sa.Index("idx_casbin_rule_ptype_v1", "ptype", "v1"),
+        # 按租户加载
+        sa.Index("idx_casbin_rule_domain_ptype", "domain", "ptype", mysql_length={"ptype": 32}),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     ptype = Column(String(255), nullable=False, comment="策略类型")
@@ -32,5 +45,7 @@ class CasbinRule(Base):
     v3 = Column(String(255), nullable=True, comment="扩展字段")
     v4 = Column(String(255), nullable=True, comment="扩展字段")
     v5 = Column(String(255), nullable=True, comment="扩展字段")
+    domain = Column(String(255), nullable=False, server_default="", comment="租户，空字符串为默认租户")
+    rule_hash = Column(sa.CHAR(64), nullable=False, comment="规则哈希 SHA-256(ptype, v0 ~ v5[, domain])，保证规则唯一")
     created_at = Column(sa.DateTime, nullable=False, server_default=sa.func.now())
     updated_at = Column(sa.DateTime, nullable=False, server_default=sa.func.now(), onupdate=sa.func.now())
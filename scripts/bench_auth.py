@@ -0,0 +1,380 @@
+"""
+认证路径性能基准
+用户数据放在临时 SQLite 数据库中（需要 aiosqlite），--db-latency-ms 为每次数据库会话附加的往返延迟，
+模拟应用与 MySQL 之间的网络开销；结果以 JSON 输出到标准输出，便于在不同提交之间对比
+
+用法:
+    python scripts/bench_auth.py principal-cache --users 1000 --requests 20000 --db-latency-ms 0.5
+    python scripts/bench_auth.py token-decode --tokens 1000 --requests 50000
+    python scripts/bench_auth.py login-storm --logins 32 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from typing import Dict, List, Sequence
+
+# 只需满足 Settings 的必填项，数据库会话在基准中替换为 SQLite
+for _key, _value in {
+    "MYSQL_HOST": "localhost",
+    "MYSQL_USER": "bench",
+    "MYSQL_PASSWORD": "bench",
+    "MYSQL_DB": "bench",
+    "SECRET_KEY": "bench",
+}.items():
+    os.environ.setdefault(_key, _value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app.core.config import get_settings  # noqa: E402
+from app.core.logging import get_logger  # noqa: E402,F401  导入时配置日志，之后再替换输出
+
+settings = get_settings()
+
+# 应用日志默认输出到 stdout，基准只保留警告并输出到 stderr，stdout 只输出 JSON 结果
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
+
+
+def summarize_ns(samples: List[int]) -> Dict[str, float]:
+    """纳秒样本的均值与分位数（微秒）"""
+    cuts = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    return {
+        "count": len(samples),
+        "mean_us": round(statistics.fmean(samples) / 1000, 3),
+        "p50_us": round(cuts[49] / 1000, 3),
+        "p95_us": round(cuts[94] / 1000, 3),
+        "p99_us": round(cuts[98] / 1000, 3),
+    }
+
+
+def zipf_choices(items: Sequence, count: int, exponent: float = 1.1, seed: int = 42) -> List:
+    """按 Zipf 分布抽样：少量活跃用户占大部分请求"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** exponent) for rank in range(1, len(items) + 1)]
+    return rng.choices(list(items), weights=weights, k=count)
+
+
+class DelayedSessions:
+    """在会话工厂外附加固定延迟并计数，模拟每次查询的数据库往返"""
+
+    def __init__(self, session_factory, latency: float):
+        self.session_factory = session_factory
+        self.latency = latency
+        self.sessions = 0
+
+    def __call__(self):
+        self.sessions += 1
+        return _DelayedSession(self.session_factory(), self.latency)
+
+
+class _DelayedSession:
+    def __init__(self, session, latency: float):
+        self.session = session
+        self.latency = latency
+
+    async def __aenter__(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await self.session.__aenter__()
+
+    async def __aexit__(self, *exc_info):
+        return await self.session.__aexit__(*exc_info)
+
+
+async def create_user_db(path: str, users: int, hashed_password: str = "x"):
+    """创建只含 users 表的 SQLite 数据库，返回 (engine, 会话工厂)"""
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.users.models import User
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(User.__table__.create)
+        await conn.execute(insert(User), [
+            {
+                "id": i,
+                "email": f"user{i}@bench.local",
+                "username": f"user{i}",
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "is_superuser": False,
+                "is_verified": True,
+            }
+            for i in range(1, users + 1)
+        ])
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+def bearer_request(token: str) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/users/me",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    })
+
+
+async def bench_principal_cache(args) -> Dict:
+    """
+    CasbinAuthBackend.authenticate 的延迟分布：身份缓存开启与关闭
+    请求按 Zipf 分布落在 --users 个用户上；token 缓存在两种配置下都开启，只比较身份解析
+    缓存开启时每个用户只在第一次请求（及 TTL 过期后）查询数据库
+    """
+    from app.api.middleware import CasbinAuthBackend
+    from app.core.security import create_access_token
+    from app.services import principal_cache
+
+    backend = CasbinAuthBackend()
+    tokens = {i: create_access_token({"sub": str(i)}) for i in range(1, args.users + 1)}
+    requests = [bearer_request(tokens[i]) for i in zipf_choices(range(1, args.users + 1), args.requests)]
+    enabled = settings.PRINCIPAL_CACHE_ENABLED
+    session_local = principal_cache.SessionLocal
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            engine, session_factory = await create_user_db(os.path.join(tmp, "users.db"), args.users)
+            try:
+                for label, cache_enabled in (("cache_off", False), ("cache_on", True)):
+                    settings.PRINCIPAL_CACHE_ENABLED = cache_enabled
+                    principal_cache.clear_principals()
+                    sessions = DelayedSessions(session_factory, args.db_latency_ms / 1000)
+                    principal_cache.SessionLocal = sessions
+                    # 第一轮从空缓存开始（冷启动），第二轮为稳态
+                    for phase in ("cold", "warm"):
+                        queries = sessions.sessions
+                        samples = []
+                        failed = 0
+                        started = time.perf_counter()
+                        for request in requests:
+                            t0 = time.perf_counter_ns()
+                            _, user = await backend.authenticate(request)
+                            samples.append(time.perf_counter_ns() - t0)
+                            failed += user.username == "anonymous"
+                        elapsed = time.perf_counter() - started
+                        results.setdefault(label, {})[phase] = {
+                            **summarize_ns(samples),
+                            "requests_per_sec": round(len(samples) / elapsed, 1),
+                            "db_queries": sessions.sessions - queries,
+                            "failed": failed,
+                        }
+            finally:
+                await engine.dispose()
+    finally:
+        settings.PRINCIPAL_CACHE_ENABLED = enabled
+        principal_cache.SessionLocal = session_local
+        principal_cache.clear_principals()
+
+    off, on = results["cache_off"], results["cache_on"]
+    checks = {
+        "no_failures": all(result[phase]["failed"] == 0 for result in (off, on) for phase in ("cold", "warm")),
+        "one_query_per_user": on["cold"]["db_queries"] <= args.users and on["warm"]["db_queries"] == 0,
+        "p99_improved": on["warm"]["p99_us"] < off["warm"]["p99_us"],
+    }
+    return {
+        "benchmark": "principal-cache",
+        "users": args.users,
+        "db_latency_ms": args.db_latency_ms,
+        **results,
+        "warm_p99_speedup": round(off["warm"]["p99_us"] / on["warm"]["p99_us"], 2),
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+async def bench_token_decode(args) -> Dict:
+    """
+    decode_token 的吞吐与延迟：已验证 token 缓存开启与关闭
+    --tokens 个不同的 token 按 Zipf 分布重复出现，模拟同一批用户在 token 有效期内的请求
+    """
+    from app.core import security
+
+    tokens = [security.create_access_token({"sub": str(i)}, timedelta(hours=1)) for i in range(1, args.tokens + 1)]
+    requests = zipf_choices(tokens, args.requests)
+    enabled = settings.TOKEN_CACHE_ENABLED
+    results = {}
+    claims = {}
+    try:
+        for label, cache_enabled in (("uncached", False), ("cached", True)):
+            settings.TOKEN_CACHE_ENABLED = cache_enabled
+            security._token_cache.clear()
+            samples = []
+            started = time.perf_counter()
+            for token in requests:
+                t0 = time.perf_counter_ns()
+                payload = security.decode_token(token)
+                samples.append(time.perf_counter_ns() - t0)
+                claims.setdefault(label, {})[token] = payload
+            elapsed = time.perf_counter() - started
+            results[label] = {
+                **summarize_ns(samples),
+                "decodes_per_sec": round(len(samples) / elapsed, 1),
+            }
+        results["cached"]["cache"] = security.get_token_cache_stats()
+    finally:
+        settings.TOKEN_CACHE_ENABLED = enabled
+        security._token_cache.clear()
+
+    uncached, cached = results["uncached"], results["cached"]
+    checks = {
+        "same_claims": claims["uncached"] == claims["cached"],
+        "all_valid": all(payload is not None for payload in claims["cached"].values()),
+        "throughput_improved": cached["decodes_per_sec"] > uncached["decodes_per_sec"],
+    }
+    return {
+        "benchmark": "token-decode",
+        "tokens": args.tokens,
+        **results,
+        "speedup": round(cached["decodes_per_sec"] / uncached["decodes_per_sec"], 2),
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+async def bench_login_storm(args) -> Dict:
+    """
+    登录风暴期间无关接口的延迟
+    --concurrency 个客户端共发起 --logins 次密码校验（argon2），同时每隔 --probe-interval-ms 请求一次
+    不做任何计算的 /ping 接口（FastAPI 应用，ASGI 进程内调用），延迟从计划发出时间算起；分别测量
+    - idle: 没有登录请求
+    - inline: 在事件循环中同步校验密码（改造前的做法）
+    - pool: 通过 PasswordHasher 放到进程池中校验（--workers 个进程）
+    被 503 拒绝的登录稍后重试，拒绝次数计入结果
+    """
+    from fastapi import FastAPI, HTTPException
+    import httpx
+    from app.core.hashing import PasswordHasher
+    from app.core.security import get_password_hash, verify_password
+
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    hashed = get_password_hash("correct horse battery staple")
+    results = {}
+
+    async def probe(client: httpx.AsyncClient, stop: asyncio.Event) -> List[int]:
+        # 从计划发出时间算起：事件循环被阻塞时请求被推迟，推迟的时间同样计入延迟
+        samples = []
+        interval_ns = int(args.probe_interval_ms * 1_000_000)
+        while not stop.is_set():
+            scheduled = time.perf_counter_ns() + interval_ns
+            await asyncio.sleep(args.probe_interval_ms / 1000)
+            response = await client.get("/ping")
+            samples.append(time.perf_counter_ns() - scheduled)
+            assert response.status_code == 200
+        return samples
+
+    for mode in ("idle", "inline", "pool"):
+        hasher = PasswordHasher(args.workers, args.workers * 2, args.max_queue) if mode == "pool" else None
+        if hasher is not None:
+            # 预先启动进程池，不把进程创建时间计入风暴
+            await asyncio.gather(*(hasher.verify("warmup", hashed) for _ in range(args.workers)))
+        remaining = args.logins if mode != "idle" else 0
+        verified = 0
+
+        async def login_client() -> None:
+            nonlocal remaining, verified
+            while remaining > 0:
+                remaining -= 1
+                while True:
+                    try:
+                        if hasher is None:
+                            ok = verify_password("correct horse battery staple", hashed)
+                        else:
+                            ok = await hasher.verify("correct horse battery staple", hashed)
+                        break
+                    except HTTPException:
+                        await asyncio.sleep(0.01)
+                verified += ok
+                await asyncio.sleep(0)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            stop = asyncio.Event()
+            probe_task = asyncio.create_task(probe(client, stop))
+            await asyncio.sleep(args.probe_interval_ms / 1000 * 5)
+            started = time.perf_counter()
+            if mode == "idle":
+                await asyncio.sleep(1.0)
+            else:
+                await asyncio.gather(*(login_client() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            samples = await probe_task
+        results[mode] = {
+            "probe": summarize_ns(samples),
+            "logins": verified,
+            "logins_per_sec": round(verified / elapsed, 1) if mode != "idle" else 0.0,
+        }
+        if hasher is not None:
+            results[mode]["hasher"] = hasher.stats()
+            hasher.shutdown()
+
+    idle, inline, pool = results["idle"], results["inline"], results["pool"]
+    checks = {
+        "all_logins_verified": inline["logins"] == args.logins and pool["logins"] == args.logins,
+        # 进程池模式下无关接口的 p99 远低于同步校验，且与空闲时处于同一量级
+        "pool_p99_below_inline": pool["probe"]["p99_us"] * 5 < inline["probe"]["p99_us"],
+        "pool_p99_near_idle": pool["probe"]["p99_us"] < max(idle["probe"]["p99_us"] * 20, 10_000),
+    }
+    return {
+        "benchmark": "login-storm",
+        "logins": args.logins,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        **results,
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="认证路径性能基准")
+    parser.add_argument("--output", help="结果写入文件（默认输出到标准输出）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    principal = subparsers.add_parser("principal-cache", help="认证中间件在身份缓存开启与关闭时的 p50/p99 延迟（SQLite）")
+    principal.add_argument("--users", type=int, default=1000, help="用户数")
+    principal.add_argument("--requests", type=int, default=20000, help="请求数")
+    principal.add_argument("--db-latency-ms", type=float, default=0.5, help="每次数据库会话附加的往返延迟（毫秒）")
+    principal.set_defaults(func=bench_principal_cache)
+
+    token = subparsers.add_parser("token-decode", help="decode_token 在已验证 token 缓存开启与关闭时的吞吐")
+    token.add_argument("--tokens", type=int, default=1000, help="不同 token 数")
+    token.add_argument("--requests", type=int, default=50000, help="解码次数")
+    token.set_defaults(func=bench_token_decode)
+
+    storm = subparsers.add_parser("login-storm", help="登录风暴期间无关接口的延迟（同步校验 vs 进程池）")
+    storm.add_argument("--logins", type=int, default=32, help="密码校验总次数")
+    storm.add_argument("--concurrency", type=int, default=16, help="并发登录客户端数")
+    storm.add_argument("--workers", type=int, default=2, help="哈希进程池大小")
+    storm.add_argument("--max-queue", type=int, default=64, help="哈希最大排队任务数")
+    storm.add_argument("--probe-interval-ms", type=float, default=5.0, help="无关接口的请求间隔（毫秒）")
+    storm.set_defaults(func=bench_login_storm)
+
+    args = parser.parse_args()
+    result = asyncio.run(args.func(args))
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if result.get("ok") is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
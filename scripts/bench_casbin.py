@@ -0,0 +1,1860 @@
+"""
+Casbin 授权性能基准
+离线运行（内存适配器，不连接数据库），结果以 JSON 输出到标准输出，便于在不同提交之间对比
+
+用法:
+    python scripts/bench_casbin.py decision-cache --rules 10000 --requests 200000
+    python scripts/bench_casbin.py path-index --rules 100000
+    python scripts/bench_casbin.py role-closure --depth 8 --users 5000
+    python scripts/bench_casbin.py role-registry --rules 250000
+    python scripts/bench_casbin.py filtered-loading --sizes 10000,100000,1000000
+    python scripts/bench_casbin.py snapshot --sizes 10000,100000  (需要 aiosqlite)
+    python scripts/bench_casbin.py rule-storage --rules 1000000  (需要 aiosqlite)
+    python scripts/bench_casbin.py policy-apply --rules 100000  (需要 aiosqlite)
+    python scripts/bench_casbin.py policy-import --rules 1000000  (需要 aiosqlite)
+    python scripts/bench_casbin.py policy-export --sizes 50000,500000  (需要 aiosqlite)
+    python scripts/bench_casbin.py batch-check --rules 100000 --requests 100000
+    python scripts/bench_casbin.py explain-overhead --rules 100000
+    python scripts/bench_casbin.py route-table --rules 300
+    python scripts/bench_casbin.py domains --tenants 20,100,1000 --active 20  (需要 aiosqlite)
+    python scripts/bench_casbin.py db-pool --concurrency 5,10,20,40 --hold-ms 20  (需要 aiosqlite)
+    python scripts/bench_casbin.py suite --sizes 1000,10000,100000,1000000 --output bench.json
+    python scripts/bench_casbin.py compare baseline.json bench.json --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# 基准不连接数据库，只需满足 Settings 的必填项
+for _key, _value in {
+    "MYSQL_HOST": "localhost",
+    "MYSQL_USER": "bench",
+    "MYSQL_PASSWORD": "bench",
+    "MYSQL_DB": "bench",
+    "SECRET_KEY": "bench",
+}.items():
+    os.environ.setdefault(_key, _value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import casbin  # noqa: E402
+from casbin.persist.adapters.asyncio import AsyncAdapter, AsyncBatchAdapter  # noqa: E402
+from casbin.util import key_match2 as casbin_key_match2  # noqa: E402
+from loguru import logger  # noqa: E402
+from starlette.authentication import AuthCredentials, AuthenticationBackend, SimpleUser, UnauthenticatedUser  # noqa: E402
+from starlette.middleware.authentication import AuthenticationMiddleware  # noqa: E402
+
+from app.services.casbin_service import CasbinService, _rss_bytes, decision_cache, settings  # noqa: E402
+
+# 应用日志默认输出到 stdout，基准只保留警告并输出到 stderr，stdout 只输出 JSON 结果
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
+
+ACTIONS = ("GET", "POST", "PUT", "DELETE")
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app", "core", "rbac_model.conf")
+
+
+class MemoryAdapter(AsyncAdapter, AsyncBatchAdapter):
+    """内存适配器：load_policy 从列表加载，写操作只修改列表"""
+
+    def __init__(self, rules: Sequence[Sequence[str]] = ()):
+        self.rules: List[List[str]] = [list(rule) for rule in rules]
+        self._filtered = False
+        # 主体 -> 规则，模拟数据库 v0 列上的索引，按需加载时不必扫描全部规则
+        self._by_subject: Optional[Dict[Tuple[str, str], List[List[str]]]] = None
+
+    def is_filtered(self) -> bool:
+        return self._filtered
+
+    async def load_policy(self, model):
+        for ptype, *values in self.rules:
+            model.model[ptype[:1]][ptype].policy.append(values)
+        self._filtered = False
+
+    async def load_filtered_policy(self, model, filter):
+        subjects = set(filter.subjects)
+        for ptype, *values in self.rules:
+            if ptype in filter.ptypes or (ptype == "p" and values[0] in subjects):
+                model.model[ptype[:1]][ptype].policy.append(values)
+        self._filtered = True
+
+    async def load_policy_for_subjects(self, ptype, subjects):
+        if self._by_subject is None:
+            self._by_subject = {}
+            for rule_ptype, *values in self.rules:
+                self._by_subject.setdefault((rule_ptype, values[0]), []).append(values)
+        return [list(values) for subject in subjects for values in self._by_subject.get((ptype, subject), ())]
+
+    async def save_policy(self, model):
+        return True
+
+    async def add_policy(self, sec, ptype, rule):
+        self._by_subject = None
+        self.rules.append([ptype, *rule])
+        return True
+
+    async def remove_policy(self, sec, ptype, rule):
+        self._by_subject = None
+        self.rules.remove([ptype, *rule])
+        return True
+
+    async def remove_filtered_policy(self, sec, ptype, field_index, *field_values):
+        return False
+
+    async def add_policies(self, sec, ptype, rules):
+        self._by_subject = None
+        self.rules.extend([ptype, *rule] for rule in rules)
+        return True
+
+    async def remove_policies(self, sec, ptype, rules):
+        self._by_subject = None
+        removed = {(ptype, *rule) for rule in rules}
+        self.rules = [rule for rule in self.rules if tuple(rule) not in removed]
+        return True
+
+    async def load_rules(self, ptype):
+        return [list(values) for rule_ptype, *values in self.rules if rule_ptype == ptype]
+
+    async def apply_changes(self, removed, added):
+        for ptype, rules in removed.items():
+            await self.remove_policies(ptype, ptype, rules)
+        for ptype, rules in added.items():
+            await self.add_policies(ptype, ptype, rules)
+        return True
+
+
+def generate_policy(rules: int, seed: int = 42) -> Tuple[List[List[str]], List[str], List[str]]:
+    """
+    按 app/core/rbac_policy.csv 的结构生成策略:
+    p, role{i}, /api/v1/res{j}/*, ACT 以及 g, user{k}, role{i}
+    约 80% 为 p 规则、20% 为 g 规则
+    """
+    rng = random.Random(seed)
+    p_count = max(1, int(rules * 0.8))
+    g_count = max(1, rules - p_count)
+    roles = [f"role{i}" for i in range(max(1, p_count // 20))]
+    resources = [f"/api/v1/res{j}" for j in range(max(1, p_count // 10))]
+    users = [f"user{k}" for k in range(g_count)]
+
+    # 与 casbin_rule 的唯一约束一致，p 规则不重复
+    p_rules: Dict[Tuple[str, str, str], None] = {}
+    while len(p_rules) < min(p_count, len(roles) * len(resources) * len(ACTIONS)):
+        p_rules[(rng.choice(roles), f"{rng.choice(resources)}/*", rng.choice(ACTIONS))] = None
+    policy = [["p", *rule] for rule in p_rules]
+    policy += [["g", user, rng.choice(roles)] for user in users]
+    return policy, users, resources
+
+
+def zipf_requests(
+    users: Sequence[str], resources: Sequence[str], distinct: int, count: int, exponent: float, seed: int = 42
+) -> List[Tuple[str, str, str]]:
+    """生成服从 Zipf 分布的请求序列：少量热点 (用户, 路径, 方法) 三元组占大部分流量"""
+    rng = random.Random(seed)
+    triples = list({
+        (rng.choice(users), f"{rng.choice(resources)}/{rng.randrange(1000)}", rng.choice(ACTIONS))
+        for _ in range(distinct)
+    })
+    weights = [1.0 / (rank ** exponent) for rank in range(1, len(triples) + 1)]
+    return rng.choices(triples, weights=weights, k=count)
+
+
+def allowed_requests(policy: Sequence[Sequence[str]], count: int, seed: int = 42) -> List[Tuple[str, str, str]]:
+    """按 g 规则和角色的 p 规则构造会被允许的请求（用户通过角色命中一条策略）"""
+    rng = random.Random(seed)
+    by_role: Dict[str, List[Sequence[str]]] = {}
+    for rule in policy:
+        if rule[0] == "p":
+            by_role.setdefault(rule[1], []).append(rule)
+    links = [rule for rule in policy if rule[0] == "g" and rule[2] in by_role]
+    requests = []
+    for _ in range(count if links else 0):
+        _, user, role = rng.choice(links)
+        _, _, obj, act = rng.choice(by_role[role])
+        requests.append((user, obj.replace("*", str(rng.randrange(1000))), act))
+    return requests
+
+
+def measure(fn: Callable[[str, str, str], bool], requests: Sequence[Tuple[str, str, str]]) -> Dict[str, float]:
+    """逐次计时，返回延迟分位数（微秒）和吞吐"""
+    samples = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for sub, obj, act in requests:
+        t0 = clock()
+        fn(sub, obj, act)
+        samples.append(clock() - t0)
+    elapsed = (clock() - start) / 1e9
+    cuts = statistics.quantiles(samples, n=100)
+    return {
+        "requests": len(samples),
+        "mean_us": round(statistics.fmean(samples) / 1000, 3),
+        "p50_us": round(cuts[49] / 1000, 3),
+        "p95_us": round(cuts[94] / 1000, 3),
+        "p99_us": round(cuts[98] / 1000, 3),
+        "ops_per_sec": round(len(samples) / elapsed, 1),
+    }
+
+
+def summarize_ns(samples: List[int]) -> Dict[str, float]:
+    """纳秒样本的均值与分位数（微秒）"""
+    cuts = statistics.quantiles(samples, n=100) if len(samples) > 1 else samples * 99
+    return {
+        "count": len(samples),
+        "mean_us": round(statistics.fmean(samples) / 1000, 3),
+        "p50_us": round(cuts[49] / 1000, 3),
+        "p95_us": round(cuts[94] / 1000, 3),
+        "p99_us": round(cuts[98] / 1000, 3),
+    }
+
+
+def reset_service(adapter) -> None:
+    """丢弃当前执行器，使用指定适配器重新初始化 CasbinService（不加载策略）"""
+    CasbinService._enforcer = None
+    CasbinService._adapter = adapter
+    CasbinService.get_enforcer()
+
+
+async def setup_service(policy: Sequence[Sequence[str]]) -> None:
+    """使用内存适配器初始化 CasbinService"""
+    reset_service(MemoryAdapter(policy))
+    await CasbinService.load_policy()
+
+
+async def bench_decision_cache(args) -> Dict:
+    """对比启用/禁用授权决策缓存时，Zipf 请求分布下的 enforce 开销"""
+    policy, users, resources = generate_policy(args.rules)
+    await setup_service(policy)
+    requests = zipf_requests(users, resources, args.distinct, args.requests, args.zipf)
+
+    settings.CASBIN_DECISION_CACHE_ENABLED = False
+    uncached = measure(CasbinService.enforce, requests[: args.uncached_requests])
+
+    settings.CASBIN_DECISION_CACHE_ENABLED = True
+    decision_cache.clear()
+    decision_cache.hits = decision_cache.misses = 0
+    cached = measure(CasbinService.enforce, requests)
+    cached["hit_rate"] = CasbinService.get_decision_cache_stats()["hit_rate"]
+
+    return {
+        "benchmark": "decision-cache",
+        "rules": len(policy),
+        "distinct_triples": args.distinct,
+        "zipf_exponent": args.zipf,
+        "cache_max_size": decision_cache.max_size,
+        "uncached": uncached,
+        "cached": cached,
+        "speedup_mean": round(uncached["mean_us"] / cached["mean_us"], 2) if cached["mean_us"] else None,
+    }
+
+
+def reference_enforcer(policy: Sequence[Sequence[str]]) -> casbin.Enforcer:
+    """使用 casbin 默认实现（内置 keyMatch2、逐条匹配）的同步执行器，作为对照"""
+    enforcer = casbin.Enforcer(MODEL_PATH)
+    model = enforcer.get_model()
+    for ptype, *values in policy:
+        model.model[ptype[:1]][ptype].policy.append(values)
+    enforcer.build_role_links()
+    return enforcer
+
+
+async def bench_path_index(args) -> Dict:
+    """路径模式索引与逐条匹配的 enforce 开销对比（均不经过决策缓存）"""
+    policy, users, resources = generate_policy(args.rules)
+    await setup_service(policy)
+    requests = zipf_requests(users, resources, args.distinct, args.requests, 0.0)
+
+    reference = reference_enforcer(policy)
+    linear = measure(reference.enforce, requests[: args.linear_requests])
+
+    settings.CASBIN_DECISION_CACHE_ENABLED = False
+    indexed = measure(CasbinService.enforce, requests)
+
+    return {
+        "benchmark": "path-index",
+        "rules": len(policy),
+        "indexed_patterns": CasbinService._path_index.size if CasbinService._path_index else None,
+        "linear": linear,
+        "indexed": indexed,
+        "speedup_mean": round(linear["mean_us"] / indexed["mean_us"], 2) if indexed["mean_us"] else None,
+    }
+
+
+def deep_hierarchy(depth: int, width: int, users: int, rules_per_role: int, seed: int = 42) -> List[List[str]]:
+    """
+    多层角色继承：每层 width 个角色，每个角色继承下一层的一个随机角色
+    用户分配到第 0 层角色，每个角色拥有 rules_per_role 条 p 规则
+    """
+    rng = random.Random(seed)
+    levels = [[f"L{level}_role{i}" for i in range(width)] for level in range(depth)]
+    policy = []
+    for level in range(depth - 1):
+        for role in levels[level]:
+            policy.append(["g", role, rng.choice(levels[level + 1])])
+    for k in range(users):
+        policy.append(["g", f"user{k}", rng.choice(levels[0])])
+    for level in levels:
+        for role in level:
+            for j in range(rules_per_role):
+                policy.append(["p", role, f"/api/v1/{role}/res{j}/*", rng.choice(ACTIONS)])
+    return policy
+
+
+async def bench_role_closure(args) -> Dict:
+    """多层角色继承下，有效权限查询与角色分配增量更新的开销"""
+    policy = deep_hierarchy(args.depth, args.width, args.users, args.rules_per_role)
+    start = time.perf_counter()
+    await setup_service(policy)
+    load_seconds = time.perf_counter() - start
+
+    rng = random.Random(7)
+    users = [f"user{k}" for k in rng.sample(range(args.users), min(args.samples, args.users))]
+    reference = reference_enforcer(policy)
+    linear = measure(lambda sub, obj, act: reference.get_implicit_permissions_for_user(sub), [(u, "", "") for u in users[:200]])
+
+    def closure_permissions(sub, obj, act):
+        return CasbinService._role_closure.permissions(sub)
+
+    cold = measure(closure_permissions, [(u, "", "") for u in users])
+    warm = measure(closure_permissions, [(u, "", "") for u in users])
+
+    # 在中间层角色之间增删继承关系，影响其下所有角色和用户
+    middle = args.depth // 2
+    updates = []
+    for i in range(args.updates):
+        updates.append((f"L{middle}_role{i % args.width}", f"L{middle + 1}_role{(i * 7 + 3) % args.width}"))
+
+    add_samples, remove_samples = [], []
+    for user, role in updates:
+        t0 = time.perf_counter_ns()
+        await CasbinService.add_role_for_user(user, role)
+        add_samples.append(time.perf_counter_ns() - t0)
+        t0 = time.perf_counter_ns()
+        await CasbinService.delete_role_for_user(user, role)
+        remove_samples.append(time.perf_counter_ns() - t0)
+
+    return {
+        "benchmark": "role-closure",
+        "depth": args.depth,
+        "width": args.width,
+        "users": args.users,
+        "rules": len(policy),
+        "load_policy_seconds": round(load_seconds, 3),
+        "implicit_permissions_linear": linear,
+        "permissions_closure_cold": cold,
+        "permissions_closure_warm": warm,
+        "add_role_link": summarize_ns(add_samples),
+        "remove_role_link": summarize_ns(remove_samples),
+        "closure": CasbinService.get_role_closure_stats(),
+    }
+
+
+async def bench_role_registry(args) -> Dict:
+    """
+    角色目录：随机增删 p / g 规则后，对比游标分页取一页与旧实现（扫描全部规则 + 逐个角色查成员后切片）的耗时
+    与逐条扫描结果的一致性由 tests/test_casbin_roles.py 校验
+    """
+    policy, users, _ = generate_policy(args.rules)
+    await setup_service(policy)
+    rng = random.Random(9)
+    roles = sorted({rule[1] for rule in policy if rule[0] == "p"})
+    for i in range(args.mutations):
+        if rng.random() < 0.5:
+            await CasbinService.add_policy(f"new_role{rng.randrange(50)}", f"/api/v1/new{i}/*", rng.choice(ACTIONS))
+            await CasbinService.add_role_for_user(rng.choice(users), rng.choice(roles))
+        else:
+            p_rules = CasbinService.get_all_policies()
+            await CasbinService.remove_policy(*rng.choice(p_rules))
+            g_rules = CasbinService.get_enforcer().get_grouping_policy()
+            await CasbinService.delete_role_for_user(*rng.choice(g_rules)[:2])
+
+    pages, cursor, listed = 0, None, []
+    while True:
+        page, cursor, total = CasbinService.list_roles(cursor, args.page_size)
+        listed.extend(page)
+        pages += 1
+        if cursor is None:
+            break
+
+    samples = []
+    for _ in range(args.requests):
+        start_name = rng.choice(listed)[0]
+        t0 = time.perf_counter_ns()
+        CasbinService.list_roles(start_name, args.page_size)
+        samples.append(time.perf_counter_ns() - t0)
+
+    enforcer = CasbinService.get_enforcer()
+    legacy_samples = []
+    for _ in range(args.legacy_requests):
+        t0 = time.perf_counter_ns()
+        names = {rule[0] for rule in enforcer.get_policy()} | {rule[1] for rule in enforcer.get_grouping_policy()}
+        page = [(name, await enforcer.get_users_for_role(name)) for name in names][:args.page_size]
+        legacy_samples.append(time.perf_counter_ns() - t0)
+
+    cursor_page = summarize_ns(samples)
+    legacy_page = summarize_ns(legacy_samples)
+    return {
+        "benchmark": "role-registry",
+        "rules": args.rules,
+        "roles": total,
+        "page_size": args.page_size,
+        "pages": pages,
+        "cursor_page": cursor_page,
+        "legacy_page": legacy_page,
+        "speedup": round(legacy_page["mean_us"] / cursor_page["mean_us"], 1),
+    }
+
+
+async def bench_load_once(args) -> Dict:
+    """（由 filtered-loading 在子进程中调用）按指定模式加载一次策略，报告耗时与 RSS 增量"""
+    policy, users, resources = generate_policy(args.rules)
+    adapter = MemoryAdapter(policy)
+    del policy
+    settings.CASBIN_FILTERED_LOADING = args.mode == "filtered"
+    settings.CASBIN_FILTERED_MAX_RULES = args.max_rules
+
+    CasbinService._enforcer = None
+    CasbinService._adapter = adapter
+    CasbinService.get_enforcer()
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    await CasbinService.load_policy()
+    load_seconds = time.perf_counter() - start
+    rss_after = _rss_bytes()
+
+    # 冷用户首次请求：按需加载其角色的 p 规则后再判断
+    rng = random.Random(11)
+    first_request = []
+    for user in rng.sample(users, min(args.active, len(users))):
+        t0 = time.perf_counter_ns()
+        await CasbinService.ensure_loaded(user)
+        CasbinService.enforce(user, f"{rng.choice(resources)}/1", "GET")
+        first_request.append(time.perf_counter_ns() - t0)
+    cuts = statistics.quantiles(first_request, n=100)
+
+    model = CasbinService.get_enforcer().get_model().model
+    return {
+        "mode": args.mode,
+        "rules": args.rules,
+        "load_policy_seconds": round(load_seconds, 3),
+        "rss_delta_bytes": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+        "first_request": {
+            "users": len(first_request),
+            "mean_us": round(statistics.fmean(first_request) / 1000, 3),
+            "p50_us": round(cuts[49] / 1000, 3),
+            "p99_us": round(cuts[98] / 1000, 3),
+        },
+        "p_rules_in_memory": len(model["p"]["p"].policy),
+        "filtered_loading": CasbinService.get_filtered_loading_stats(),
+    }
+
+
+async def bench_filtered_loading(args) -> Dict:
+    """
+    不同规模下完整加载与过滤加载的启动耗时与 RSS 对比
+    每种规模、模式在独立子进程中运行，RSS 不受前一次运行影响
+    """
+    results = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        for mode in ("full", "filtered"):
+            command = [
+                sys.executable, os.path.abspath(__file__), "load-once",
+                "--rules", str(size), "--mode", mode,
+                "--active", str(args.active), "--max-rules", str(args.max_rules),
+            ]
+            completed = subprocess.run(command, capture_output=True, text=True, check=True)
+            results.append(json.loads(completed.stdout))
+    return {"benchmark": "filtered-loading", "results": results}
+
+
+async def sqlite_adapter(path: str, policy: Sequence[Sequence[str]]):
+    """创建 SQLite 文件数据库（aiosqlite）并写入策略，返回 (engine, AsyncSQLAlchemyAdapter)"""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.services.casbin_adapter import AsyncSQLAlchemyAdapter, _insert_ignore, _rule_to_row
+    from app.users.models import CasbinRule
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(CasbinRule.__table__.create)
+        rows = [_rule_to_row(rule[0], rule[1:]) for rule in policy]
+        for start in range(0, len(rows), 10000):
+            await conn.execute(_insert_ignore(), rows[start:start + 10000])
+    return engine, AsyncSQLAlchemyAdapter(async_sessionmaker(engine, expire_on_commit=False))
+
+
+async def bench_snapshot(args) -> Dict:
+    """
+    worker 启动耗时：从 SQL 逐行加载并编译 vs 从策略快照恢复
+    使用 SQLite 文件数据库（aiosqlite）和真实的 AsyncSQLAlchemyAdapter，并校验快照之后新增行的补齐
+    """
+    from app.services.casbin_adapter import _insert_ignore, _rule_to_row
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(size) for size in args.sizes.split(",")):
+            policy, users, resources = generate_policy(size)
+            engine, adapter = await sqlite_adapter(os.path.join(tmp, f"policy-{size}.db"), policy)
+            settings.CASBIN_SNAPSHOT_PATH = os.path.join(tmp, f"policy-{size}.snapshot")
+            requests = zipf_requests(users, resources, distinct=2000, count=2000, exponent=1.1)
+
+            reset_service(adapter)
+            start = time.perf_counter()
+            await CasbinService.load_policy()
+            sql_seconds = time.perf_counter() - start
+            expected = [CasbinService._evaluate(*request) for request in requests]
+
+            start = time.perf_counter()
+            await CasbinService.write_snapshot()
+            write_seconds = time.perf_counter() - start
+
+            reset_service(adapter)
+            start = time.perf_counter()
+            loaded = await CasbinService.load_snapshot()
+            snapshot_seconds = time.perf_counter() - start
+            matches = sum(CasbinService._evaluate(*request) == result for request, result in zip(requests, expected))
+
+            # 快照之后新增的行在启动时按 id 补齐
+            extra = [["p", "anonymous", f"/api/v1/extra{i}/*", "GET"] for i in range(args.extra)]
+            async with engine.begin() as conn:
+                await conn.execute(_insert_ignore(), [_rule_to_row(rule[0], rule[1:]) for rule in extra])
+            reset_service(adapter)
+            start = time.perf_counter()
+            caught_up = await CasbinService.load_snapshot()
+            catch_up_seconds = time.perf_counter() - start
+            await engine.dispose()
+
+            results.append({
+                "rules": size,
+                "sql_load_seconds": round(sql_seconds, 3),
+                "snapshot_write_seconds": round(write_seconds, 3),
+                "snapshot_bytes": CasbinService.get_snapshot_stats()["last_write"]["bytes"],
+                "snapshot_load_seconds": round(snapshot_seconds, 3) if loaded else None,
+                "speedup": round(sql_seconds / snapshot_seconds, 1) if loaded else None,
+                "decisions_match": f"{matches}/{len(requests)}",
+                "catch_up": {
+                    "ok": caught_up and CasbinService.get_snapshot_stats()["last_boot"]["delta_rules"] == args.extra,
+                    "rows": args.extra,
+                    "seconds": round(catch_up_seconds, 3),
+                },
+            })
+    ok = all(r["decisions_match"].split("/")[0] == r["decisions_match"].split("/")[1] and r["catch_up"]["ok"] for r in results)
+    return {"benchmark": "snapshot", "results": results, "ok": ok}
+
+
+def policy_csv_lines(policy: Sequence[Sequence[str]]) -> List[str]:
+    """rbac_policy.csv 格式的策略行"""
+    return [", ".join(rule) for rule in policy]
+
+
+async def bench_policy_apply(args) -> Dict:
+    """
+    声明式应用策略集（SQLite + 真实 AsyncSQLAlchemyAdapter）
+    - 应用与现有策略相同的策略集：只求差集，不写库
+    - 应用增删少量规则后的策略集：校验数据库与内存模型都与期望策略集一致
+    """
+    from sqlalchemy import select
+    from app.services.casbin_policy_file import parse_policy_lines
+    from app.users.models import CasbinRule
+
+    policy, _, _ = generate_policy(args.rules)
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, adapter = await sqlite_adapter(os.path.join(tmp, "policy.db"), policy)
+        reset_service(adapter)
+        await CasbinService.load_policy()
+        version = CasbinService.policy_version()
+
+        lines = policy_csv_lines(policy)
+        start = time.perf_counter()
+        desired = parse_policy_lines(lines)
+        parse_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        unchanged = await CasbinService.apply_policy_set(desired)
+        unchanged_seconds = time.perf_counter() - start
+        untouched = CasbinService.policy_version() == version
+
+        # 删除部分规则、新增部分规则与角色分配
+        kept = [rule for rule in policy if rng.random() >= args.change_ratio]
+        extra = [["p", f"role{i % 7}", f"/api/v1/applied{i}/*", rng.choice(ACTIONS)] for i in range(int(args.rules * args.change_ratio))]
+        extra += [["g", f"applied_user{i}", "role0"] for i in range(int(args.rules * args.change_ratio / 4))]
+        target = parse_policy_lines(policy_csv_lines(kept + extra))
+        start = time.perf_counter()
+        changed = await CasbinService.apply_policy_set(target)
+        changed_seconds = time.perf_counter() - start
+        again = await CasbinService.apply_policy_set(target, dry_run=True)
+
+        async with engine.connect() as conn:
+            rows = await conn.execute(select(CasbinRule.ptype, CasbinRule.v0, CasbinRule.v1, CasbinRule.v2))
+            stored = {tuple(value for value in row if value is not None) for row in rows}
+        await engine.dispose()
+
+    expected = {(sec, *rule) for sec, rules in target.items() for rule in rules}
+    model = CasbinService.get_enforcer().get_model().model
+    in_memory = {(sec, *rule) for sec in ("p", "g") for rule in model[sec][sec].policy}
+    consistent = stored == expected and in_memory == expected and again["status"] == "unchanged"
+    return {
+        "benchmark": "policy-apply",
+        "rules": args.rules,
+        "parse_csv_seconds": round(parse_seconds, 4),
+        "unchanged": {
+            "status": unchanged["status"],
+            "seconds": round(unchanged_seconds, 4),
+            "policy_version_untouched": untouched,
+        },
+        "changed": {
+            "status": changed["status"],
+            "summary": changed["summary"],
+            "seconds": round(changed_seconds, 4),
+        },
+        "consistent": consistent,
+        "ok": consistent and untouched and unchanged["status"] == "unchanged" and changed["status"] == "applied",
+    }
+
+
+async def bench_policy_import(args) -> Dict:
+    """
+    流式批量导入（SQLite + 真实 AsyncSQLAlchemyAdapter）
+    - 文件包含重复行、注释和格式错误的行，数据库中预先存在部分规则
+    - 在第 interrupt_chunk 块写入时模拟中断，再从检查点继续，校验最终数据库内容与期望一致
+    - 与原导入脚本（逐条 enforcer.add_policy）的行/秒对比
+    """
+    from sqlalchemy import select
+    from app.services.casbin_import import PolicyImporter
+    from app.users.models import CasbinRule
+
+    class InterruptedImporter(PolicyImporter):
+        async def _write(self, rows):
+            if self.stats["chunks"] + 1 == args.interrupt_chunk:
+                raise RuntimeError("模拟中断")
+            await super()._write(rows)
+
+    policy, _, _ = generate_policy(args.rules)
+    rng = random.Random(11)
+    existing = rng.sample(policy, len(policy) // 10)
+    lines = policy_csv_lines(policy)
+    lines += rng.sample(lines, len(lines) // 20)
+    rng.shuffle(lines)
+    lines[:0] = ["# IAM export", ""]
+    lines.insert(len(lines) // 2, "q, broken, line")
+    expected = {tuple(rule) for rule in policy}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "policy.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        engine, adapter = await sqlite_adapter(os.path.join(tmp, "policy.db"), existing)
+        session_factory = adapter._session_factory
+
+        interrupted = InterruptedImporter(session_factory, chunk_lines=args.chunk_lines, progress_interval=60)
+        try:
+            await interrupted.run(path)
+        except RuntimeError:
+            pass
+        resumed_from = interrupted.stats["lines"]
+        importer = PolicyImporter(session_factory, chunk_lines=args.chunk_lines)
+        stats = await importer.run(path)
+
+        async with engine.connect() as conn:
+            rows = await conn.execute(select(CasbinRule.ptype, CasbinRule.v0, CasbinRule.v1, CasbinRule.v2))
+            stored = [tuple(value for value in row if value is not None) for row in rows]
+        checkpoint_removed = not os.path.exists(f"{path}.checkpoint.json")
+
+        # 原导入脚本：逐条 enforcer.add_policy / add_role_for_user，每条一个事务
+        enforcer = casbin.AsyncEnforcer(MODEL_PATH, adapter)
+        preexisting = {tuple(rule) for rule in existing}
+        legacy = [rule for rule in policy if tuple(rule) not in preexisting][:args.legacy_rows]
+        start = time.perf_counter()
+        for rule in legacy:
+            if rule[0] == "p":
+                await enforcer.add_policy(*rule[1:])
+            else:
+                await enforcer.add_role_for_user(*rule[1:])
+        legacy_rate = len(legacy) / (time.perf_counter() - start)
+        await engine.dispose()
+
+    consistent = len(stored) == len(set(stored)) and set(stored) == expected
+    return {
+        "benchmark": "policy-import",
+        "lines": len(lines),
+        "unique_rules": len(expected),
+        "preexisting_rules": len(existing),
+        "interrupted_after_lines": resumed_from,
+        "import": stats,
+        "legacy_rows_per_sec": round(legacy_rate, 1),
+        "speedup": round(stats["rows_per_sec"] / legacy_rate, 1),
+        "checkpoint_removed": checkpoint_removed,
+        "consistent": consistent,
+        "ok": consistent and checkpoint_removed and stats["invalid"] == 1,
+    }
+
+
+async def collect_stream(response) -> Tuple[List[str], int]:
+    """逐块读取 StreamingResponse，返回 (全部行, 最大单块字节数)"""
+    lines: List[str] = []
+    largest = 0
+    async for chunk in response.body_iterator:
+        largest = max(largest, len(chunk))
+        lines.extend(chunk.splitlines())
+    return lines, largest
+
+
+async def bench_policy_export(args) -> Dict:
+    """
+    流式导出（SQLite + 真实 AsyncSQLAlchemyAdapter）
+    - 各规模下完整导出与原 GET /policies/（整表 JSONResponse）的耗时及 Python 堆峰值（tracemalloc，单独一轮测量）
+    - 按 cursor 分段导出后拼接与完整导出一致；ptype / subject / obj_prefix 过滤与逐条过滤一致
+    - CSV 导出可以被 parse_policy_lines 解析回相同的规则
+    """
+    import tracemalloc
+    from app.api.v1.endpoints import casbin as casbin_endpoints
+    from app.services.casbin_policy_file import parse_policy_lines
+
+    async def export(**params):
+        query = {"export_format": "ndjson", "ptype": None, "subject": None, "obj_prefix": None, "cursor": 0, "limit": None,
+                 "domain": None}
+        query.update(params)
+        return await casbin_endpoints.export_policies(**query, current_user=None)
+
+    async def drain(response) -> None:
+        async for _ in response.body_iterator:
+            pass
+
+    async def peak(make) -> int:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        await make()
+        result = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        return result
+
+    async def drain_export() -> None:
+        await drain(await export())
+
+    async def legacy_response():
+        return await casbin_endpoints.list_policies(current_user=None)
+
+    async def check(stored: List[Tuple[str, ...]]) -> Dict[str, bool]:
+        lines, _ = await collect_stream(await export())
+        records = [json.loads(line) for line in lines]
+        ids = [record["id"] for record in records]
+        exported = sorted((record["ptype"], *record["rule"]) for record in records)
+        checks = {"complete": exported == sorted(stored) and ids == sorted(set(ids))}
+
+        # 分段续传
+        resumed: List[int] = []
+        cursor = 0
+        while True:
+            part, _ = await collect_stream(await export(cursor=cursor, limit=args.page))
+            if not part:
+                break
+            resumed.extend(json.loads(line)["id"] for line in part)
+            cursor = resumed[-1]
+        checks["resumable"] = resumed == ids
+
+        filters = {
+            "ptype": ({"ptype": "g"}, lambda rule: rule[0] == "g"),
+            "subject": ({"subject": "role3"}, lambda rule: rule[1] == "role3"),
+            "obj_prefix": ({"obj_prefix": "/api/v1/res1"}, lambda rule: rule[2].startswith("/api/v1/res1")),
+            "obj_prefix_escaped": ({"obj_prefix": "/api/v1/a_"}, lambda rule: rule[2].startswith("/api/v1/a_")),
+            "combined": ({"ptype": "p", "subject": "role1", "obj_prefix": "/api/v1/"},
+                         lambda rule: rule[0] == "p" and rule[1] == "role1" and rule[2].startswith("/api/v1/")),
+        }
+        for name, (params, predicate) in filters.items():
+            part, _ = await collect_stream(await export(**params))
+            got = sorted((record["ptype"], *record["rule"]) for record in map(json.loads, part))
+            checks[f"filter_{name}"] = got == sorted(rule for rule in stored if predicate(rule))
+
+        csv_lines, _ = await collect_stream(await export(export_format="csv"))
+        parsed = parse_policy_lines(csv_lines)
+        checks["csv_round_trip"] = sorted((sec, *rule) for sec, rules in parsed.items() for rule in rules) == sorted(stored)
+        return checks
+
+    results = []
+    checks: Dict[str, bool] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(size) for size in args.sizes.split(",")):
+            policy, _, _ = generate_policy(size)
+            # 含 LIKE 通配符与逗号的对象，校验前缀转义与 CSV 引号
+            policy += [["p", "role0", "/api/v1/a_b/*", "GET"], ["p", "role0", "/api/v1/axb/*", "GET"],
+                       ["p", "role1", "/api/v1/x,y", "GET"]]
+            engine, adapter = await sqlite_adapter(os.path.join(tmp, f"policy-{size}.db"), policy)
+            reset_service(adapter)
+            stored = list(dict.fromkeys(tuple(rule) for rule in policy))
+            if not checks:
+                checks = await check(stored)
+
+            start = time.perf_counter()
+            _, largest_chunk = await collect_stream(await export())
+            stream_seconds = time.perf_counter() - start
+            stream_peak = await peak(drain_export)
+
+            await CasbinService.load_policy()
+            start = time.perf_counter()
+            await legacy_response()
+            legacy_seconds = time.perf_counter() - start
+            legacy_peak = await peak(legacy_response)
+            await engine.dispose()
+
+            results.append({
+                "rules": len(stored),
+                "stream_seconds": round(stream_seconds, 3),
+                "stream_rows_per_sec": round(len(stored) / stream_seconds, 1),
+                "stream_peak_heap_bytes": stream_peak,
+                "largest_chunk_bytes": largest_chunk,
+                "legacy_json_seconds": round(legacy_seconds, 3),
+                "legacy_json_peak_heap_bytes": legacy_peak,
+            })
+
+    return {"benchmark": "policy-export", "results": results, "checks": checks, "ok": all(checks.values())}
+
+
+async def time_rule_storage(adapter, policy: Sequence[Sequence[str]], ops: int) -> Dict[str, Dict]:
+    """单点删除 + 重新写入、按主体读取规则的延迟"""
+    rng = random.Random(11)
+    p_rules = [rule[1:] for rule in policy if rule[0] == "p"]
+    samples: Dict[str, List[int]] = {"remove_policy": [], "add_policy": [], "load_policy_for_subjects": []}
+    for _ in range(ops):
+        rule = rng.choice(p_rules)
+        t0 = time.perf_counter_ns()
+        await adapter.remove_policy("p", "p", rule)
+        samples["remove_policy"].append(time.perf_counter_ns() - t0)
+        t0 = time.perf_counter_ns()
+        await adapter.add_policy("p", "p", rule)
+        samples["add_policy"].append(time.perf_counter_ns() - t0)
+        t0 = time.perf_counter_ns()
+        await adapter.load_policy_for_subjects("p", [rule[0]])
+        samples["load_policy_for_subjects"].append(time.perf_counter_ns() - t0)
+    return {name: summarize_ns(values) for name, values in samples.items()}
+
+
+async def bench_rule_storage(args) -> Dict:
+    """
+    casbin_rule 复合索引（SQLite，真实的 AsyncSQLAlchemyAdapter）：
+    同一份数据在有 / 无二级索引时的单点删除、写入与按主体读取延迟
+    查询计划与去重的正确性由 tests/test_casbin_adapter.py 校验
+    """
+    import shutil
+    from sqlalchemy import func, select, text
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.services.casbin_adapter import AsyncSQLAlchemyAdapter
+    from app.users.models import CasbinRule
+
+    policy, _, _ = generate_policy(args.rules)
+    with tempfile.TemporaryDirectory() as tmp:
+        indexed_path = os.path.join(tmp, "indexed.db")
+        start = time.perf_counter()
+        engine, adapter = await sqlite_adapter(indexed_path, policy)
+        build_seconds = time.perf_counter() - start
+
+        async def row_count() -> int:
+            async with engine.connect() as conn:
+                return (await conn.execute(select(func.count(CasbinRule.id)))).scalar_one()
+
+        rows = await row_count()
+        indexed = await time_rule_storage(adapter, policy, args.ops)
+        await engine.dispose()
+
+        # 同一份数据去掉二级索引（等价于迁移之前的全表扫描）
+        scan_path = os.path.join(tmp, "scan.db")
+        shutil.copyfile(indexed_path, scan_path)
+        scan_engine = create_async_engine(f"sqlite+aiosqlite:///{scan_path}")
+        async with scan_engine.begin() as conn:
+            for index in CasbinRule.__table__.indexes:
+                await conn.execute(text(f"DROP INDEX {index.name}"))
+        scan_adapter = AsyncSQLAlchemyAdapter(async_sessionmaker(scan_engine, expire_on_commit=False))
+        scan = await time_rule_storage(scan_adapter, policy, args.scan_ops)
+        await scan_engine.dispose()
+
+    speedup = {
+        name: round(scan[name]["mean_us"] / indexed[name]["mean_us"], 1)
+        for name in indexed if indexed[name]["mean_us"]
+    }
+    return {
+        "benchmark": "rule-storage",
+        "rules": args.rules,
+        "rows": rows,
+        "build_seconds": round(build_seconds, 3),
+        "indexed": indexed,
+        "full_scan": scan,
+        "speedup": speedup,
+    }
+
+
+class HeaderAuthBackend(AuthenticationBackend):
+    """基准用认证后端：用户名取自 X-Bench-User 请求头（代替 JWT 校验，只测量授权部分）"""
+
+    async def authenticate(self, conn):
+        username = conn.headers.get("x-bench-user")
+        if not username:
+            return AuthCredentials(["anonymous"]), UnauthenticatedUser()
+        return AuthCredentials(["authenticated"]), SimpleUser(username)
+
+
+def middleware_stack():
+    """与 app/main.py 相同顺序的认证 + 授权中间件，内层是直接返回 200 的 ASGI 应用"""
+    from app.api.middleware import CachedCasbinMiddleware
+
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    app = CachedCasbinMiddleware(ok, enforcer=CasbinService.get_enforcer())
+    return AuthenticationMiddleware(app, backend=HeaderAuthBackend())
+
+
+async def measure_middleware(app, requests: Sequence[Tuple[str, str, str]]) -> Dict[str, float]:
+    """逐个请求经过中间件栈，返回延迟分位数与允许比例"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    statuses: List[int] = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    samples = []
+    for sub, obj, act in requests:
+        scope = {
+            "type": "http", "method": act, "path": obj, "raw_path": obj.encode(), "root_path": "",
+            "query_string": b"", "headers": [(b"x-bench-user", sub.encode())],
+            "scheme": "http", "server": ("bench", 80), "client": ("127.0.0.1", 0),
+        }
+        t0 = time.perf_counter_ns()
+        await app(scope, receive, send)
+        samples.append(time.perf_counter_ns() - t0)
+    result = summarize_ns(samples)
+    result["allowed_ratio"] = round(statuses.count(200) / len(statuses), 4)
+    return result
+
+
+async def bench_suite_run(args) -> Dict:
+    """（由 suite 在子进程中调用）单个规模下的加载、内存、enforce 与变更开销"""
+    policy, users, resources = generate_policy(args.rules)
+    p_count = sum(1 for rule in policy if rule[0] == "p")
+    tmp = tempfile.TemporaryDirectory() if args.backend == "sqlite" else None
+    if tmp is not None:
+        engine, adapter = await sqlite_adapter(os.path.join(tmp.name, "policy.db"), policy)
+    else:
+        engine, adapter = None, MemoryAdapter(policy)
+    # 一半请求通过角色命中策略，一半为 Zipf 分布的随机请求（大多被拒绝）
+    requests = allowed_requests(policy, args.requests // 2)
+    requests += zipf_requests(users, resources, args.distinct, args.requests - len(requests), 1.1)
+    random.Random(3).shuffle(requests)
+    del policy
+
+    reset_service(adapter)
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    await CasbinService.load_policy()
+    load_seconds = time.perf_counter() - start
+    rss_after = _rss_bytes()
+    rss_delta = rss_after - rss_before if rss_after is not None and rss_before is not None else None
+
+    settings.CASBIN_DECISION_CACHE_ENABLED = False
+    uncached = measure(CasbinService.enforce, requests)
+    settings.CASBIN_DECISION_CACHE_ENABLED = True
+    decision_cache.clear()
+    cached = measure(CasbinService.enforce, requests)
+
+    stack = middleware_stack()
+    middleware_cached = await measure_middleware(stack, requests)
+    settings.CASBIN_DECISION_CACHE_ENABLED = False
+    middleware_uncached = await measure_middleware(stack, requests)
+    settings.CASBIN_DECISION_CACHE_ENABLED = True
+
+    # 变更开销：写库 + 内存模型增量更新（含角色闭包、路径索引与决策缓存失效）
+    rng = random.Random(5)
+    roles = sorted({f"role{i}" for i in range(max(1, p_count // 20))})
+    add_policy_samples, add_role_samples = [], []
+    for i in range(args.mutations):
+        rule = (rng.choice(roles), f"/api/v1/bench{i}/*", rng.choice(ACTIONS))
+        t0 = time.perf_counter_ns()
+        await CasbinService.add_policy(*rule)
+        add_policy_samples.append(time.perf_counter_ns() - t0)
+        t0 = time.perf_counter_ns()
+        await CasbinService.add_role_for_user(f"bench_user{i}", rng.choice(roles))
+        add_role_samples.append(time.perf_counter_ns() - t0)
+
+    if engine is not None:
+        await engine.dispose()
+        tmp.cleanup()
+    return {
+        "rules": args.rules,
+        "backend": args.backend,
+        "load_policy_seconds": round(load_seconds, 3),
+        "rss_delta_bytes": rss_delta,
+        "bytes_per_rule": round(rss_delta / args.rules, 1) if rss_delta is not None else None,
+        "enforce_uncached": uncached,
+        "enforce_cached": cached,
+        "middleware_uncached": middleware_uncached,
+        "middleware_cached": middleware_cached,
+        "add_policy": summarize_ns(add_policy_samples),
+        "add_role_for_user": summarize_ns(add_role_samples),
+    }
+
+
+def casbin_api_app():
+    """只挂载 Casbin 管理路由的应用，跳过超级管理员校验（只测量检查本身）"""
+    from fastapi import FastAPI
+    from app.api.v1.endpoints import casbin as casbin_endpoints
+
+    app = FastAPI()
+    app.include_router(casbin_endpoints.router, prefix="/casbin")
+    app.dependency_overrides[casbin_endpoints.require_superuser] = lambda: None
+    return app
+
+
+async def bench_batch_check(args) -> Dict:
+    """
+    批量权限检查与逐条检查的吞吐对比，并校验两者结果一致
+    - service: 逐条 enforce（不使用决策缓存）vs enforce_batch
+    - http: N 次 POST /check/ vs 一次 POST /check/batch（NDJSON 流式返回）
+    """
+    import httpx
+
+    policy, users, resources = generate_policy(args.rules)
+    await setup_service(policy)
+    requests = allowed_requests(policy, args.requests // 2)
+    requests += zipf_requests(users, resources, args.distinct, args.requests - len(requests), 1.1)
+    random.Random(7).shuffle(requests)
+
+    settings.CASBIN_DECISION_CACHE_ENABLED = False
+    start = time.perf_counter()
+    single = [CasbinService.enforce(*request) for request in requests]
+    single_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = CasbinService.enforce_batch(requests)
+    batch_seconds = time.perf_counter() - start
+    settings.CASBIN_DECISION_CACHE_ENABLED = True
+
+    http_requests = requests[:args.http_requests]
+    body = {"checks": [{"username": sub, "obj": obj, "act": act} for sub, obj, act in http_requests]}
+    transport = httpx.ASGITransport(app=casbin_api_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        decision_cache.clear()
+        start = time.perf_counter()
+        http_single = []
+        for check in body["checks"]:
+            response = await client.post("/casbin/check/", json=check)
+            http_single.append(response.json()["has_permission"])
+        http_single_seconds = time.perf_counter() - start
+
+        decision_cache.clear()
+        start = time.perf_counter()
+        response = await client.post("/casbin/check/batch", json=body)
+        http_batch = [json.loads(line)["has_permission"] for line in response.text.splitlines()]
+        http_batch_seconds = time.perf_counter() - start
+
+    consistent = single == batch and http_single == http_batch == single[:len(http_requests)]
+    return {
+        "benchmark": "batch-check",
+        "rules": args.rules,
+        "service": {
+            "requests": len(requests),
+            "single_per_sec": round(len(requests) / single_seconds, 1),
+            "batch_per_sec": round(len(requests) / batch_seconds, 1),
+            "speedup": round(single_seconds / batch_seconds, 1),
+        },
+        "http": {
+            "requests": len(http_requests),
+            "single_per_sec": round(len(http_requests) / http_single_seconds, 1),
+            "batch_per_sec": round(len(http_requests) / http_batch_seconds, 1),
+            "speedup": round(http_single_seconds / http_batch_seconds, 1),
+        },
+        "allowed_ratio": round(sum(single) / len(single), 4),
+        "consistent": consistent,
+        "ok": consistent,
+    }
+
+
+def enforce_without_explain(sub: str, obj: str, act: str) -> bool:
+    """引入剖析采样之前的 CasbinService.enforce（基线）"""
+    if not settings.CASBIN_DECISION_CACHE_ENABLED:
+        return CasbinService._evaluate(sub, obj, act)
+    key = (sub, obj, act)
+    result = decision_cache.get(key)
+    if result is None:
+        result = CasbinService._evaluate(sub, obj, act)
+        decision_cache.set(key, result)
+    return result
+
+
+def ns_per_call_rounds(
+    fns: Sequence[Callable[[str, str, str], bool]], requests: Sequence[Tuple[str, str, str]], rounds: int,
+    repeats: int = 1,
+) -> List[List[float]]:
+    """
+    各函数每一轮的平均每次调用耗时（纳秒）
+    每轮依次运行全部函数 repeats 次，交替测量，频率变化和调度噪声对被比较的函数影响相近；
+    每轮取 repeats 次中的最小值：噪声只会让耗时变长，最小值最接近函数本身的开销
+    """
+    samples: List[List[float]] = [[] for _ in fns]
+    for _ in range(rounds):
+        best = [float("inf")] * len(fns)
+        for _ in range(repeats):
+            for i, fn in enumerate(fns):
+                start = time.perf_counter_ns()
+                for sub, obj, act in requests:
+                    fn(sub, obj, act)
+                best[i] = min(best[i], (time.perf_counter_ns() - start) / len(requests))
+        for i, value in enumerate(best):
+            samples[i].append(value)
+    return samples
+
+
+async def bench_explain_overhead(args) -> Dict:
+    """
+    授权判定剖析的开销
+    - 采样率为 0 时 enforce 与不含采样判断的基线对比（缓存命中与不使用缓存两种情况）
+    - 不同采样率下 enforce 的平均耗时，以及单次 explain 的耗时
+    """
+    policy, users, resources = generate_policy(args.rules)
+    await setup_service(policy)
+    requests = allowed_requests(policy, args.requests // 2)
+    requests += zipf_requests(users, resources, args.distinct, args.requests - len(requests), 1.1)
+    random.Random(13).shuffle(requests)
+
+    disabled = {}
+    settings.CASBIN_EXPLAIN_SAMPLE_RATE = 0.0
+    for mode, cache_enabled in (("cached", True), ("uncached", False)):
+        settings.CASBIN_DECISION_CACHE_ENABLED = cache_enabled
+        decision_cache.clear()
+        # 基线测两次（A/A 对照）：两次基线之差就是本机测量噪声，开销低于噪声时无法判定为回退
+        baseline, current, control = ns_per_call_rounds(
+            (enforce_without_explain, CasbinService.enforce, enforce_without_explain), requests, args.rounds, args.repeats
+        )
+        # 同一轮内成对比较后取中位数
+        ratio = statistics.median((c - b) / b for b, c in zip(baseline, current))
+        noise = statistics.median((c - b) / b for b, c in zip(baseline, control))
+        disabled[mode] = {
+            "baseline_ns": round(statistics.median(baseline), 1),
+            "disabled_ns": round(statistics.median(current), 1),
+            "overhead_ratio": round(ratio, 4),
+            "noise_ratio": round(noise, 4),
+        }
+    settings.CASBIN_DECISION_CACHE_ENABLED = True
+
+    sampled = {}
+    for rate in (float(rate) for rate in args.rates.split(",")):
+        settings.CASBIN_EXPLAIN_SAMPLE_RATE = rate
+        decision_cache.clear()
+        sampled[str(rate)] = round(statistics.median(ns_per_call_rounds((CasbinService.enforce,), requests, args.rounds)[0]), 1)
+    settings.CASBIN_EXPLAIN_SAMPLE_RATE = 0.0
+
+    explain = measure(CasbinService.explain, requests[:args.explain_requests])
+    ok = all(result["overhead_ratio"] <= args.max_overhead + abs(result["noise_ratio"]) for result in disabled.values())
+    return {
+        "benchmark": "explain-overhead",
+        "rules": args.rules,
+        "requests": len(requests),
+        "disabled": disabled,
+        "enforce_ns_by_sample_rate": sampled,
+        "explain": explain,
+        "sampler": CasbinService.get_explain_stats()["sampled"],
+        "max_overhead": args.max_overhead,
+        "ok": ok,
+    }
+
+
+def application_routes() -> List:
+    """应用实际注册的路由（导入 app.main 时应用日志会重新配置到 stdout，先重定向，导入后恢复基准的日志配置）"""
+    with contextlib.redirect_stdout(sys.stderr):
+        from app.main import app
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    return app.routes
+
+
+def route_policy(table, rules: int, seed: int) -> List[List[str]]:
+    """
+    rbac_policy.csv 风格的策略，加上由路由模板派生的随机模式：
+    参数替换为 :id 或字面量（PARTIAL，如 /users/me 之于 /users/{id}），截断后加 /*，以及含正则字符的模式
+    """
+    rng = random.Random(seed)
+    roles = [f"role{i}" for i in range(8)]
+    policy = [
+        ["p", "admin", "/api/v1/admin/*", "*"],
+        ["p", "admin", "/api/v1/users/*", "*"],
+        ["p", "user_manager", "/api/v1/users/*", "GET"],
+        ["p", "user_manager", "/api/v1/users/*", "POST"],
+        ["p", "viewer", "/api/v1/users/*", "GET"],
+        ["p", "anonymous", "/docs", "GET"],
+        ["p", "anonymous", "/openapi.json", "GET"],
+        ["p", "anonymous", "/health", "GET"],
+        ["p", "anonymous", "/auth/*", "*"],
+    ]
+    templates = sorted({template for template, _, _ in table.routes()})
+    for _ in range(rules):
+        parts = rng.choice(templates).split("/")
+        for i, part in enumerate(parts):
+            if part.startswith("{"):
+                parts[i] = rng.choice((":id", ":name", "me", "alice", "42"))
+        if rng.random() < 0.3:
+            parts = parts[:rng.randint(1, len(parts))] + ["*"]
+        if rng.random() < 0.1:
+            parts[rng.randrange(1, len(parts))] = rng.choice(("user.*", "role?", "(a|b)", "v[0-9]"))
+        pattern = "/".join(parts)
+        if rng.random() < 0.05:
+            pattern = rng.choice(("*", "/*", "/api/v1/*", "/api/v1/a.b/:id", "/api/v1/item+/*"))
+        try:
+            casbin_key_match2("", pattern)
+        except re.error:
+            continue
+        policy.append(["p", rng.choice(roles + ["admin", "viewer"]), pattern, rng.choice(ACTIONS + ("PATCH", "*"))])
+    policy += [["g", roles[i], roles[i + 1]] for i in range(3)]
+    policy += [["g", f"user{k}", rng.choice(roles + ["admin", "user_manager", "viewer"])] for k in range(12)]
+    # 与 casbin_rule 的唯一约束一致，不生成重复规则
+    return [list(rule) for rule in dict.fromkeys(map(tuple, policy))]
+
+
+def route_paths(template: str, segments, literals: Sequence[str]) -> List[str]:
+    """路由模板的具体路径：路径参数分别替换为通用取值和策略中出现的字面量"""
+    if segments is None:
+        return [template]
+    paths = []
+    for value in ("42", "me", "alice", "a.b", *literals):
+        paths.append("/".join(value if segment is None else segment for segment in segments))
+    return paths
+
+
+async def bench_route_table(args) -> Dict:
+    """
+    路由查表与路径模式索引的判定耗时对比（均不经过决策缓存）
+    对应用的每个 (路由, 方法)，以多组路径参数取值生成具体路径作为请求
+    与 casbin 默认执行器的一致性由 tests/test_casbin_routes.py 校验
+    """
+    from app.services.casbin_routes import RouteTable
+
+    routes = application_routes()
+    policy_rng = random.Random(args.seed)
+    table = RouteTable(routes)
+    policy = route_policy(table, args.rules, args.seed)
+    await setup_service(policy)
+    CasbinService.register_routes(routes)
+    settings.CASBIN_DECISION_CACHE_ENABLED = False
+
+    literals = sorted({part for rule in policy if rule[0] == "p" for part in rule[2].split("/")
+                       if part and not part.startswith(":") and "*" not in part})
+    cases = []
+    for template, method, segments in CasbinService._route_table.routes():
+        for path in route_paths(template, segments, literals):
+            cases.append((path, method))
+    subjects = sorted({rule[1] for rule in policy} | {"nobody"})
+
+    requests = [(policy_rng.choice(subjects), path, method) for path, method in cases for _ in range(4)]
+    policy_rng.shuffle(requests)
+    route_table = CasbinService._route_table
+    with_table = measure(CasbinService._evaluate, requests)
+    CasbinService._route_table = None
+    without_table = measure(CasbinService._evaluate, requests)
+    CasbinService._route_table = route_table
+    settings.CASBIN_DECISION_CACHE_ENABLED = True
+
+    return {
+        "benchmark": "route-table",
+        "seed": args.seed,
+        "rules": len([rule for rule in policy if rule[0] == "p"]),
+        "table": CasbinService.get_route_table_stats(),
+        "requests": len(requests),
+        "route_table": with_table,
+        "path_index": without_table,
+        "speedup_mean": round(without_table["mean_us"] / with_table["mean_us"], 2) if with_table["mean_us"] else None,
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+async def bench_domains(args) -> Dict:
+    """
+    多租户执行器（SQLite + 真实 AsyncSQLAlchemyAdapter，每个租户 --rules-per-tenant 条规则）
+    - 活跃租户数固定、租户总数变化：驻留内存（tracemalloc）与 acquire + enforce 延迟不随租户总数增长；
+      对照为全部租户的规则放在同一个执行器中（主体和角色带租户前缀，即引入租户之前的做法）
+    - 租户总数固定、活跃租户数变化：内存随活跃租户数增长
+    - 规则上限只容纳一半活跃租户时按 LRU 淘汰，驻留规则数不超过上限，淘汰后重新加载的判定不变
+    - 判定与每个租户单独的 casbin 执行器一致
+    授权决策缓存在测量期间关闭，测的是判定本身
+    """
+    import gc
+    import tracemalloc
+    from collections import OrderedDict
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.services.casbin_adapter import AsyncSQLAlchemyAdapter, _insert_ignore, _rule_to_row
+    from app.services.casbin_domains import DomainEnforcerPool
+    from app.users.models import CasbinRule
+
+    per_tenant = args.rules_per_tenant
+    totals = [int(total) for total in args.tenants.split(",")]
+    active_sizes = [int(size) for size in args.active_sizes.split(",")]
+    if args.active > min(totals):
+        raise SystemExit("--active 不能大于最小的租户总数")
+    policies = {f"bu{t}": generate_policy(per_tenant, seed=t) for t in range(max(totals + active_sizes))}
+    requests_by_domain = {
+        domain: allowed_requests(policy, args.requests // 2, seed=1)
+        + zipf_requests(users, resources, distinct=500, count=args.requests // 2, exponent=1.1)
+        for domain, (policy, users, resources) in policies.items()
+    }
+
+    def workload(domains: Sequence[str], count: int) -> List[Tuple[str, str, str, str]]:
+        rng = random.Random(7)
+        return [(domain, *rng.choice(requests_by_domain[domain])) for domain in rng.choices(domains, k=count)]
+
+    def reset_pool() -> None:
+        DomainEnforcerPool._domains = OrderedDict()
+        DomainEnforcerPool._known = set()
+        DomainEnforcerPool._loaded_rules = 0
+        for key in DomainEnforcerPool._stats:
+            DomainEnforcerPool._stats[key] = 0
+
+    async def load_domains(domains: Sequence[str]) -> int:
+        """依次加载租户，返回驻留的 Python 堆增量（字节）"""
+        gc.collect()
+        tracemalloc.start()
+        for domain in domains:
+            await DomainEnforcerPool.acquire(domain)
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return current
+
+    async def serve(requests: Sequence[Tuple[str, str, str, str]]) -> Tuple[List[bool], Dict[str, Dict]]:
+        """与中间件相同的路径：await acquire 后同步 enforce，分别记录 enforce 与 acquire + enforce 的延迟"""
+        total_samples, enforce_samples, decisions = [], [], []
+        clock = time.perf_counter_ns
+        for domain, sub, obj, act in requests:
+            t0 = clock()
+            await DomainEnforcerPool.acquire(domain)
+            t1 = clock()
+            decisions.append(DomainEnforcerPool.enforce(domain, sub, obj, act))
+            t2 = clock()
+            enforce_samples.append(t2 - t1)
+            total_samples.append(t2 - t0)
+        return decisions, {"enforce": summarize_ns(enforce_samples), "acquire_enforce": summarize_ns(total_samples)}
+
+    cache_enabled = settings.CASBIN_DECISION_CACHE_ENABLED
+    budget = (settings.CASBIN_DOMAIN_MAX_RULES, settings.CASBIN_DOMAIN_MAX_LOADED)
+    settings.CASBIN_DECISION_CACHE_ENABLED = False
+    settings.CASBIN_DOMAIN_MAX_RULES, settings.CASBIN_DOMAIN_MAX_LOADED = 10 ** 9, 10 ** 6
+    checks: Dict[str, bool] = {}
+    by_total, by_active = [], []
+    engines = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for total in sorted(set(totals + [max(totals + active_sizes)])):
+                engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, f'tenants-{total}.db')}")
+                async with engine.begin() as conn:
+                    await conn.run_sync(CasbinRule.__table__.create)
+                    for t in range(total):
+                        domain = f"bu{t}"
+                        rows = [_rule_to_row(rule[0], rule[1:], domain) for rule in policies[domain][0]]
+                        await conn.execute(_insert_ignore(), rows)
+                engines[total] = engine
+
+            active = [f"bu{t}" for t in range(args.active)]
+            requests = workload(active, args.requests)
+            expected: Optional[List[bool]] = None
+            for total in totals:
+                reset_service(AsyncSQLAlchemyAdapter(async_sessionmaker(engines[total], expire_on_commit=False)))
+                reset_pool()
+                started = time.perf_counter()
+                pool_bytes = await load_domains(active)
+                load_seconds = time.perf_counter() - started
+                # 第一轮预热，第二轮计时
+                await serve(requests)
+                decisions, latency = await serve(requests)
+                if expected is None:
+                    expected = decisions
+                checks[f"same_decisions_{total}_tenants"] = decisions == expected
+
+                # 对照：全部租户的规则在同一个执行器中，主体与角色带租户前缀
+                combined = [
+                    ["g", f"{domain}/{rule[1]}", f"{domain}/{rule[2]}"] if rule[0] == "g"
+                    else ["p", f"{domain}/{rule[1]}", *rule[2:]]
+                    for domain in (f"bu{t}" for t in range(total)) for rule in policies[domain][0]
+                ]
+                gc.collect()
+                tracemalloc.start()
+                await setup_service(combined)
+                gc.collect()
+                global_bytes = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                prefixed = [(f"{domain}/{sub}", obj, act) for domain, sub, obj, act in requests]
+                # 比较判定的同时作为预热
+                checks[f"global_matches_{total}_tenants"] = [
+                    CasbinService._evaluate(*request) for request in prefixed
+                ] == decisions
+                by_total.append({
+                    "tenants": total,
+                    "active_tenants": len(active),
+                    "total_rules": total * per_tenant,
+                    "loaded_rules": DomainEnforcerPool._loaded_rules,
+                    "domains_bytes": pool_bytes,
+                    "domains_load_seconds": round(load_seconds, 3),
+                    "domains_latency": latency,
+                    "global_bytes": global_bytes,
+                    "global_latency": {"enforce": measure(CasbinService._evaluate, prefixed)},
+                })
+                combined = None
+                reset_service(MemoryAdapter())
+
+            largest = max(totals + active_sizes)
+            reset_service(AsyncSQLAlchemyAdapter(async_sessionmaker(engines[largest], expire_on_commit=False)))
+            for size in active_sizes:
+                reset_pool()
+                domains = [f"bu{t}" for t in range(size)]
+                pool_bytes = await load_domains(domains)
+                await serve(workload(domains, args.requests))
+                _, latency = await serve(workload(domains, args.requests))
+                by_active.append({
+                    "tenants": largest,
+                    "active_tenants": size,
+                    "loaded_rules": DomainEnforcerPool._loaded_rules,
+                    "domains_bytes": pool_bytes,
+                    "bytes_per_tenant": pool_bytes // size,
+                    "domains_latency": latency,
+                })
+
+            # 规则上限只够一半活跃租户：按 LRU 淘汰并在再次访问时重新加载
+            reset_pool()
+            settings.CASBIN_DOMAIN_MAX_RULES = per_tenant * max(1, args.active // 2)
+            decisions, latency = [], None
+            max_loaded_rules = 0
+            for domain, sub, obj, act in requests:
+                await DomainEnforcerPool.acquire(domain)
+                decisions.append(DomainEnforcerPool.enforce(domain, sub, obj, act))
+                max_loaded_rules = max(max_loaded_rules, DomainEnforcerPool._loaded_rules)
+            stats = DomainEnforcerPool.get_stats()
+            eviction = {
+                "max_rules": settings.CASBIN_DOMAIN_MAX_RULES,
+                "max_loaded_rules": max_loaded_rules,
+                "loads": stats["loads"],
+                "evictions": stats["evictions"],
+                "hits": stats["hits"],
+            }
+            checks["eviction_within_budget"] = max_loaded_rules <= settings.CASBIN_DOMAIN_MAX_RULES
+            checks["eviction_happened"] = stats["evictions"] > 0
+            checks["eviction_same_decisions"] = decisions == expected
+
+            # 与每个租户单独的 casbin 执行器比较（抽样前几个活跃租户）
+            mismatches = 0
+            for domain in active[:args.reference_tenants]:
+                reference = casbin.Enforcer(MODEL_PATH)
+                reference.add_function("keyMatch2", casbin_key_match2)
+                policy = policies[domain][0]
+                reference.add_policies([rule[1:] for rule in policy if rule[0] == "p"])
+                reference.add_grouping_policies([rule[1:] for rule in policy if rule[0] == "g"])
+                await DomainEnforcerPool.acquire(domain)
+                mismatches += sum(
+                    DomainEnforcerPool.enforce(domain, *request) != reference.enforce(*request)
+                    for request in requests_by_domain[domain]
+                )
+            checks["matches_casbin"] = mismatches == 0
+    finally:
+        for engine in engines.values():
+            await engine.dispose()
+        settings.CASBIN_DECISION_CACHE_ENABLED = cache_enabled
+        settings.CASBIN_DOMAIN_MAX_RULES, settings.CASBIN_DOMAIN_MAX_LOADED = budget
+        reset_pool()
+
+    return {
+        "benchmark": "domains",
+        "rules_per_tenant": per_tenant,
+        "by_total_tenants": by_total,
+        "by_active_tenants": by_active,
+        "eviction": eviction,
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+async def bench_db_pool(args) -> Dict:
+    """
+    数据库连接池饱和测试（SQLite + InstrumentedQueuePool，与 app.database.session 相同的连接池配置项）
+    每个请求在一个会话中执行一次查询并持有连接 --hold-ms 毫秒（模拟 MySQL 往返与事务耗时）
+    - 并发不超过 pool_size + max_overflow 时不排队；超过后吞吐停在容量 / 持有时间，多出的请求排队等待
+    - 签出数不超过 pool_size + max_overflow，等待时间与签出峰值在连接池统计中可见
+    - pool_timeout 很短时排队的请求按时抛出 TimeoutError 而不是无限等待
+    - 主动失效的连接与超过 pool_recycle 的连接在下一次签出时重新建立，并计入 invalidations / connects
+    """
+    from sqlalchemy import exc, select
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from app.database.pool_monitor import InstrumentedQueuePool, PoolMonitor, get_pool_stats, instrument_pool
+
+    capacity = args.pool_size + args.max_overflow
+    hold = args.hold_ms / 1000
+    checks: Dict[str, bool] = {}
+    scenarios = []
+    engines = []
+
+    def new_engine(path: str, **options):
+        options = {
+            "pool_size": args.pool_size,
+            "max_overflow": args.max_overflow,
+            "pool_timeout": args.pool_timeout,
+            "pool_recycle": -1,
+            "pool_pre_ping": True,
+            **options,
+        }
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=InstrumentedQueuePool, **options)
+        instrument_pool(engine)
+        engines.append(engine)
+        return engine
+
+    async def run(engine, concurrency: int, requests: int, hold_seconds: float) -> Dict:
+        """concurrency 个协程共处理 requests 个请求，返回吞吐、请求延迟与连接池统计"""
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        latencies, failures = [], []
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            for _ in remaining:
+                started = time.perf_counter_ns()
+                try:
+                    async with session_factory() as session:
+                        await session.execute(select(1))
+                        await asyncio.sleep(hold_seconds)
+                except exc.TimeoutError:
+                    failures.append(time.perf_counter_ns() - started)
+                    continue
+                latencies.append(time.perf_counter_ns() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stats = get_pool_stats(engine)
+        stats.pop("wait_ms")
+        return {
+            "concurrency": concurrency,
+            "requests": requests,
+            "completed": len(latencies),
+            "failed": len(failures),
+            "requests_per_sec": round(len(latencies) / elapsed, 1),
+            "latency_ms": {
+                key.replace("_us", "_ms"): value / 1000 if key.endswith("_us") else value
+                for key, value in summarize_ns(latencies).items()
+            } if latencies else None,
+            "max_failure_ms": round(max(failures) / 1e6, 3) if failures else None,
+            "pool": stats,
+        }
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for concurrency in (int(value) for value in args.concurrency.split(",")):
+                engine = new_engine(os.path.join(tmp, "pool.db"))
+                # 预热：建满 pool_size 个连接，不计入统计
+                await run(engine, args.pool_size, args.pool_size, 0)
+                engine.sync_engine.pool.monitor = PoolMonitor()
+                scenarios.append(await run(engine, concurrency, args.requests, hold))
+
+            # 理论容量：capacity 个连接各自每 hold 秒完成一个请求
+            ideal = capacity / hold
+            for scenario in scenarios:
+                pool = scenario["pool"]
+                saturated = scenario["concurrency"] > capacity
+                scenario["saturated"] = saturated
+                scenario["ideal_requests_per_sec"] = round(min(scenario["concurrency"], capacity) / hold, 1)
+                checks[f"within_capacity_{scenario['concurrency']}"] = pool["max_checked_out"] <= capacity
+                checks[f"no_failures_{scenario['concurrency']}"] = scenario["failed"] == 0
+                if saturated:
+                    checks[f"waits_recorded_{scenario['concurrency']}"] = pool["waited"] > 0 and pool["max_wait_ms"] > 0
+                    checks[f"throughput_capped_{scenario['concurrency']}"] = scenario["requests_per_sec"] <= ideal * 1.1
+                else:
+                    checks[f"no_waits_{scenario['concurrency']}"] = pool["waited"] == 0
+
+            # 排队超过 pool_timeout：请求按时失败，不会无限等待
+            timeout = args.saturation_timeout_ms / 1000
+            engine = new_engine(os.path.join(tmp, "pool.db"), max_overflow=0, pool_timeout=timeout)
+            exhausted = await run(engine, args.pool_size * 4, args.pool_size * 8, max(hold, timeout * 4))
+            checks["timeouts_recorded"] = exhausted["failed"] > 0 and exhausted["pool"]["timeouts"] == exhausted["failed"]
+            checks["timeouts_bounded"] = exhausted["max_failure_ms"] is not None and (
+                exhausted["max_failure_ms"] <= args.saturation_timeout_ms * 2 + 50
+            )
+
+            # 失效与回收：主动失效的连接和超过 pool_recycle 的连接在下次签出时重建
+            engine = new_engine(os.path.join(tmp, "pool.db"), pool_size=1, max_overflow=0, pool_recycle=1)
+            async with engine.connect() as conn:
+                await conn.execute(select(1))
+                await conn.invalidate()
+            async with engine.connect() as conn:
+                await conn.execute(select(1))
+            await asyncio.sleep(1.1)
+            async with engine.connect() as conn:
+                await conn.execute(select(1))
+            lifecycle = get_pool_stats(engine)
+            lifecycle.pop("wait_ms")
+            checks["invalidation_counted"] = lifecycle["invalidations"] == 1
+            checks["reconnected_after_invalidate_and_recycle"] = lifecycle["connects"] == 3
+    finally:
+        for engine in engines:
+            await engine.dispose()
+
+    return {
+        "benchmark": "db-pool",
+        "pool_size": args.pool_size,
+        "max_overflow": args.max_overflow,
+        "hold_ms": args.hold_ms,
+        "scenarios": scenarios,
+        "exhausted": exhausted,
+        "lifecycle": lifecycle,
+        "checks": checks,
+        "ok": all(checks.values()),
+    }
+
+
+async def bench_suite(args) -> Dict:
+    """
+    授权性能扩展性基准：按 rbac_policy.csv 的结构生成 1k ~ 1M 规则，
+    每个规模在独立子进程中测量加载耗时、每条规则内存、enforce / 中间件延迟分位数与变更延迟
+    """
+    results = []
+    for size in (int(size) for size in args.sizes.split(",")):
+        command = [
+            sys.executable, os.path.abspath(__file__), "suite-run",
+            "--rules", str(size), "--backend", args.backend,
+            "--requests", str(args.requests), "--distinct", str(args.distinct),
+            "--mutations", str(args.mutations),
+        ]
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"规模 {size} 的基准运行失败:\n{completed.stderr}")
+        results.append(json.loads(completed.stdout))
+    return {
+        "benchmark": "suite",
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+
+
+# compare 比较的指标：(路径, 数值越大越差)
+_COMPARED_METRICS = (
+    ("load_policy_seconds", True),
+    ("bytes_per_rule", True),
+    ("enforce_uncached.p50_us", True),
+    ("enforce_uncached.p99_us", True),
+    ("enforce_cached.p50_us", True),
+    ("middleware_uncached.p50_us", True),
+    ("middleware_cached.p50_us", True),
+    ("add_policy.p50_us", True),
+    ("add_role_for_user.p50_us", True),
+)
+
+
+def _metric(result: Dict, path: str) -> Optional[float]:
+    value = result
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+async def bench_compare(args) -> Dict:
+    """比较两次 suite 的结果，变化超过阈值的指标记为回退"""
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = {(r["rules"], r["backend"]): r for r in json.load(f)["results"]}
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    changes, regressions = [], []
+    for result in current["results"]:
+        base = baseline.get((result["rules"], result["backend"]))
+        if base is None:
+            continue
+        for path, higher_is_worse in _COMPARED_METRICS:
+            old, new = _metric(base, path), _metric(result, path)
+            if not old or new is None:
+                continue
+            ratio = (new - old) / old
+            change = {"rules": result["rules"], "metric": path, "baseline": old, "current": new, "change": round(ratio, 3)}
+            changes.append(change)
+            if (ratio if higher_is_worse else -ratio) > args.threshold:
+                regressions.append(change)
+    return {
+        "benchmark": "compare",
+        "threshold": args.threshold,
+        "changes": changes,
+        "regressions": regressions,
+        "ok": not regressions,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Casbin 授权性能基准")
+    parser.add_argument("--output", help="结果 JSON 文件路径（默认输出到 stdout）")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    decision = subparsers.add_parser("decision-cache", help="授权决策缓存在 Zipf 请求分布下的效果")
+    decision.add_argument("--rules", type=int, default=10000, help="策略规则总数")
+    decision.add_argument("--distinct", type=int, default=5000, help="不同 (用户, 路径, 方法) 三元组数量")
+    decision.add_argument("--requests", type=int, default=200000, help="启用缓存时的请求数")
+    decision.add_argument("--uncached-requests", type=int, default=5000, help="禁用缓存时的请求数")
+    decision.add_argument("--zipf", type=float, default=1.1, help="Zipf 分布指数")
+    decision.set_defaults(func=bench_decision_cache)
+
+    index = subparsers.add_parser("path-index", help="路径模式索引与逐条匹配的 enforce 开销对比")
+    index.add_argument("--rules", type=int, default=100000, help="策略规则总数")
+    index.add_argument("--distinct", type=int, default=5000, help="不同 (用户, 路径, 方法) 三元组数量")
+    index.add_argument("--requests", type=int, default=20000, help="索引路径的请求数")
+    index.add_argument("--linear-requests", type=int, default=50, help="逐条匹配的请求数")
+    index.set_defaults(func=bench_path_index)
+
+
+    closure = subparsers.add_parser("role-closure", help="多层角色继承下的有效权限查询与增量更新")
+    closure.add_argument("--depth", type=int, default=8, help="角色继承层数")
+    closure.add_argument("--width", type=int, default=20, help="每层角色数")
+    closure.add_argument("--users", type=int, default=5000, help="用户数")
+    closure.add_argument("--rules-per-role", type=int, default=10, help="每个角色的 p 规则数")
+    closure.add_argument("--samples", type=int, default=2000, help="查询的用户数")
+    closure.add_argument("--updates", type=int, default=200, help="增删继承关系的次数")
+    closure.set_defaults(func=bench_role_closure)
+
+    registry = subparsers.add_parser("role-registry", help="角色目录游标分页与逐条扫描实现的耗时对比")
+    registry.add_argument("--rules", type=int, default=250000, help="策略规则总数（约 rules / 25 个角色）")
+    registry.add_argument("--mutations", type=int, default=200, help="随机增删规则的轮数")
+    registry.add_argument("--page-size", type=int, default=100, help="每页角色数")
+    registry.add_argument("--requests", type=int, default=2000, help="游标分页的请求数")
+    registry.add_argument("--legacy-requests", type=int, default=5, help="旧实现的请求数")
+    registry.set_defaults(func=bench_role_registry)
+
+    filtered = subparsers.add_parser("filtered-loading", help="不同规模下完整加载与过滤加载的启动耗时与 RSS")
+    filtered.add_argument("--sizes", default="10000,100000,1000000", help="策略规则总数，逗号分隔")
+    filtered.add_argument("--active", type=int, default=1000, help="启动后首次请求的冷用户数")
+    filtered.add_argument("--max-rules", type=int, default=200000, help="过滤加载模式下内存中 p 规则上限")
+    filtered.set_defaults(func=bench_filtered_loading)
+
+    load_once = subparsers.add_parser("load-once", help="按指定模式加载一次策略（filtered-loading 的子进程）")
+    load_once.add_argument("--rules", type=int, default=100000, help="策略规则总数")
+    load_once.add_argument("--mode", choices=("full", "filtered"), default="full", help="加载模式")
+    load_once.add_argument("--active", type=int, default=1000, help="启动后首次请求的冷用户数")
+    load_once.add_argument("--max-rules", type=int, default=200000, help="过滤加载模式下内存中 p 规则上限")
+    load_once.set_defaults(func=bench_load_once)
+
+    snapshot = subparsers.add_parser("snapshot", help="SQL 加载与策略快照加载的启动耗时对比（SQLite）")
+    snapshot.add_argument("--sizes", default="10000,100000", help="策略规则总数，逗号分隔")
+    snapshot.add_argument("--extra", type=int, default=100, help="写快照之后新增、启动时需要补齐的行数")
+    snapshot.set_defaults(func=bench_snapshot)
+
+    storage = subparsers.add_parser("rule-storage", help="casbin_rule 有无二级索引时的删除、写入与读取耗时对比（SQLite）")
+    storage.add_argument("--rules", type=int, default=1000000, help="策略规则总数")
+    storage.add_argument("--ops", type=int, default=500, help="有索引时的删除 / 写入 / 读取次数")
+    storage.add_argument("--scan-ops", type=int, default=20, help="无索引（全表扫描）时的删除 / 写入 / 读取次数")
+    storage.set_defaults(func=bench_rule_storage)
+
+    apply = subparsers.add_parser("policy-apply", help="声明式应用策略集的差集耗时与一致性（SQLite）")
+    apply.add_argument("--rules", type=int, default=100000, help="策略规则总数")
+    apply.add_argument("--change-ratio", type=float, default=0.01, help="删除与新增的规则比例")
+    apply.set_defaults(func=bench_policy_apply)
+
+    importer = subparsers.add_parser("policy-import", help="流式批量导入的吞吐、去重与断点续传（SQLite）")
+    importer.add_argument("--rules", type=int, default=1000000, help="文件中不同规则的数量")
+    importer.add_argument("--chunk-lines", type=int, default=50000, help="每块的行数")
+    importer.add_argument("--interrupt-chunk", type=int, default=3, help="模拟中断的块序号")
+    importer.add_argument("--legacy-rows", type=int, default=2000, help="原导入脚本写入的行数")
+    importer.set_defaults(func=bench_policy_import)
+
+    export = subparsers.add_parser("policy-export", help="流式导出的内存峰值、续传与过滤（SQLite）")
+    export.add_argument("--sizes", default="50000,500000", help="策略规则总数，逗号分隔")
+    export.add_argument("--page", type=int, default=30000, help="分段续传时每段的条数")
+    export.set_defaults(func=bench_policy_export)
+
+    batch_check = subparsers.add_parser("batch-check", help="批量权限检查与逐条检查的吞吐对比")
+    batch_check.add_argument("--rules", type=int, default=100000, help="策略规则总数")
+    batch_check.add_argument("--requests", type=int, default=100000, help="服务层检查的三元组数量")
+    batch_check.add_argument("--distinct", type=int, default=20000, help="不同 (用户, 路径, 方法) 三元组数量")
+    batch_check.add_argument("--http-requests", type=int, default=5000, help="HTTP 对比的三元组数量")
+    batch_check.set_defaults(func=bench_batch_check)
+
+    explain = subparsers.add_parser("explain-overhead", help="授权判定剖析在关闭与不同采样率下的开销")
+    explain.add_argument("--rules", type=int, default=100000, help="策略规则总数")
+    explain.add_argument("--requests", type=int, default=50000, help="每轮请求数")
+    explain.add_argument("--distinct", type=int, default=5000, help="不同 (用户, 路径, 方法) 三元组数量")
+    explain.add_argument("--rounds", type=int, default=15, help="每种配置的测量轮数（取中位数）")
+    explain.add_argument("--repeats", type=int, default=3, help="关闭剖析时每轮的重复测量次数（取最小值）")
+    explain.add_argument("--rates", default="0.001,0.01,0.1,1.0", help="采样率，逗号分隔")
+    explain.add_argument("--explain-requests", type=int, default=5000, help="单独测量 explain 的请求数")
+    explain.add_argument("--max-overhead", type=float, default=0.05, help="关闭时允许的相对开销（在 A/A 对照的测量噪声之外）")
+    explain.set_defaults(func=bench_explain_overhead)
+
+    routes = subparsers.add_parser("route-table", help="路由级授权表与路径模式索引在全部路由上的判定耗时对比")
+    routes.add_argument("--rules", type=int, default=300, help="由路由派生的随机 p 规则数")
+    routes.add_argument("--seed", type=int, default=0, help="随机种子")
+    routes.set_defaults(func=bench_route_table)
+
+    domains = subparsers.add_parser("domains", help="按需加载的租户执行器：内存与延迟随活跃租户而非租户总数变化（SQLite）")
+    domains.add_argument("--tenants", default="20,100,1000", help="租户总数，逗号分隔")
+    domains.add_argument("--active", type=int, default=20, help="活跃租户数")
+    domains.add_argument("--active-sizes", default="1,10,50,200", help="租户总数最大时的活跃租户数，逗号分隔")
+    domains.add_argument("--rules-per-tenant", type=int, default=300, help="每个租户的规则数")
+    domains.add_argument("--requests", type=int, default=20000, help="请求数")
+    domains.add_argument("--reference-tenants", type=int, default=3, help="与 casbin 执行器逐条比较的租户数")
+    domains.set_defaults(func=bench_domains)
+
+    db_pool = subparsers.add_parser("db-pool", help="数据库连接池在饱和前后的吞吐、等待时间、超时与连接重建（SQLite）")
+    db_pool.add_argument("--concurrency", default="5,10,20,40", help="并发请求数，逗号分隔")
+    db_pool.add_argument("--requests", type=int, default=400, help="每种并发下的请求数")
+    db_pool.add_argument("--hold-ms", type=float, default=20, help="每个请求持有连接的毫秒数")
+    db_pool.add_argument("--pool-size", type=int, default=5, help="连接池常驻连接数")
+    db_pool.add_argument("--max-overflow", type=int, default=5, help="允许的溢出连接数")
+    db_pool.add_argument("--pool-timeout", type=float, default=10.0, help="等待连接的最长秒数")
+    db_pool.add_argument("--saturation-timeout-ms", type=float, default=50, help="超时场景的 pool_timeout（毫秒）")
+    db_pool.set_defaults(func=bench_db_pool)
+
+    suite = subparsers.add_parser("suite", help="1k ~ 1M 规则下的加载、内存、enforce、中间件与变更开销")
+    suite.add_argument("--sizes", default="1000,10000,100000,1000000", help="策略规则总数，逗号分隔")
+    suite.add_argument("--backend", choices=("memory", "sqlite"), default="memory", help="策略存储（sqlite 需要 aiosqlite）")
+    suite.add_argument("--requests", type=int, default=20000, help="每种 enforce 方式的请求数")
+    suite.add_argument("--distinct", type=int, default=5000, help="不同 (用户, 路径, 方法) 三元组数量")
+    suite.add_argument("--mutations", type=int, default=200, help="add_policy / add_role_for_user 的次数")
+    suite.set_defaults(func=bench_suite)
+
+    suite_run = subparsers.add_parser("suite-run", help="单个规模的 suite 测量（suite 的子进程）")
+    suite_run.add_argument("--rules", type=int, default=10000, help="策略规则总数")
+    suite_run.add_argument("--backend", choices=("memory", "sqlite"), default="memory", help="策略存储")
+    suite_run.add_argument("--requests", type=int, default=20000, help="每种 enforce 方式的请求数")
+    suite_run.add_argument("--distinct", type=int, default=5000, help="不同 (用户, 路径, 方法) 三元组数量")
+    suite_run.add_argument("--mutations", type=int, default=200, help="add_policy / add_role_for_user 的次数")
+    suite_run.set_defaults(func=bench_suite_run)
+
+    compare = subparsers.add_parser("compare", help="比较两次 suite 结果，找出超过阈值的回退")
+    compare.add_argument("baseline", help="基线结果 JSON")
+    compare.add_argument("current", help="当前结果 JSON")
+    compare.add_argument("--threshold", type=float, default=0.2, help="判定为回退的相对变化")
+    compare.set_defaults(func=bench_compare)
+
+    args = parser.parse_args()
+    result = asyncio.run(args.func(args))
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if result.get("ok") is False:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
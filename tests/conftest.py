@@ -0,0 +1,24 @@
+"""
+测试环境：满足 Settings 的必填项，日志只输出警告
+数据库相关的测试使用临时 SQLite 文件（aiosqlite），Redis 相关的测试使用 fakeredis
+"""
+
+import os
+import sys
+
+for _key, _value in {
+    "MYSQL_HOST": "localhost",
+    "MYSQL_USER": "test",
+    "MYSQL_PASSWORD": "test",
+    "MYSQL_DB": "test",
+    "SECRET_KEY": "test",
+}.items():
+    os.environ.setdefault(_key, _value)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger  # noqa: E402
+
+import app.core.logging  # noqa: E402,F401  导入时配置日志，之后再替换输出
+
+logger.remove()
+logger.add(sys.stderr, level="WARNING")
@@ -0,0 +1,58 @@
+"""测试公用的数据库与 Casbin 初始化"""
+
+import asyncio
+from typing import Iterable, Sequence, Tuple
+
+import httpx
+from fastapi import APIRouter, FastAPI
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.api.v1.endpoints.casbin import require_superuser
+from app.schemas.auth import Principal
+from app.services.casbin_adapter import AsyncSQLAlchemyAdapter, _insert_ignore, _rule_to_row
+from app.services.casbin_service import CasbinService
+from app.users.models import CasbinRule, User
+
+
+def run(coro):
+    """在新的事件循环中运行协程（测试不依赖 pytest 异步插件）"""
+    return asyncio.run(coro)
+
+
+async def create_database(path, rules: Iterable[Sequence[str]] = (), usernames: Iterable[str] = ()) -> Tuple[AsyncEngine, async_sessionmaker]:
+    """创建含 users、casbin_rule 表的 SQLite 数据库，rules 为 [ptype, v0, ...]，用户 ID 从 1 开始"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(User.__table__.create)
+        await conn.run_sync(CasbinRule.__table__.create)
+        rows = [_rule_to_row(rule[0], rule[1:]) for rule in rules]
+        if rows:
+            await conn.execute(_insert_ignore(), rows)
+        users = [
+            {"id": i, "username": name, "email": f"{name}@test.local", "hashed_password": "x",
+             "is_active": True, "is_superuser": False, "is_verified": True}
+            for i, name in enumerate(usernames, start=1)
+        ]
+        if users:
+            await conn.execute(insert(User), users)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def reset_casbin(session_factory, routes=None) -> None:
+    """丢弃 CasbinService 的执行器，使用 session_factory 上的适配器重新初始化并加载策略"""
+    CasbinService._enforcer = None
+    CasbinService._adapter = AsyncSQLAlchemyAdapter(session_factory)
+    CasbinService._routes = list(routes) if routes is not None else None
+    CasbinService.get_enforcer()
+    assert await CasbinService.load_policy()
+
+
+def admin_client(router: APIRouter) -> httpx.AsyncClient:
+    """挂载 router 的应用客户端，超级管理员校验替换为固定的管理员身份"""
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[require_superuser] = lambda: Principal(
+        id=1, username="admin", email="admin@test.local", is_active=True, is_superuser=True
+    )
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
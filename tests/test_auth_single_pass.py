@@ -0,0 +1,76 @@
+import httpx
+from fastapi import Depends, FastAPI
+from helpers import create_database, run
+from sqlalchemy import event
+from starlette.middleware.authentication import AuthenticationMiddleware
+
+from app.api.deps import get_current_active_user
+from app.api.middleware import CasbinAuthBackend
+from app.core import security
+from app.core.config import get_settings
+from app.schemas.auth import Principal
+from app.services import principal_cache
+
+settings = get_settings()
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(AuthenticationMiddleware, backend=CasbinAuthBackend())
+
+    @app.get("/me")
+    async def me(current_user: Principal = Depends(get_current_active_user)):
+        return {"username": current_user.username}
+
+    return app
+
+
+def test_request_decodes_token_and_loads_user_once(tmp_path, monkeypatch):
+    decodes = []
+    jwt_decode = security.jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        decodes.append(1)
+        return jwt_decode(*args, **kwargs)
+
+    monkeypatch.setattr(security.jwt, "decode", counting_decode)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", usernames=["alice"])
+        queries = []
+        event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+        monkeypatch.setattr(principal_cache, "SessionLocal", sessions)
+        principal_cache.clear_principals()
+        security._token_cache.clear()
+        headers = {"Authorization": f"Bearer {security.create_access_token({'sub': '1'})}"}
+        transport = httpx.ASGITransport(app=_build_app())
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                # 缓存全部关闭：中间件解码一次、查询一次，依赖项复用 request.state.principal
+                monkeypatch.setattr(settings, "TOKEN_CACHE_ENABLED", False)
+                monkeypatch.setattr(settings, "PRINCIPAL_CACHE_ENABLED", False)
+                for _ in range(3):
+                    decodes.clear()
+                    queries.clear()
+                    response = await client.get("/me", headers=headers)
+                    assert response.json() == {"username": "alice"}
+                    assert len(decodes) == 1
+                    assert len(queries) == 1
+
+                # 缓存开启：第一次请求解码、查询各一次，之后既不解码也不查询
+                monkeypatch.setattr(settings, "TOKEN_CACHE_ENABLED", True)
+                monkeypatch.setattr(settings, "PRINCIPAL_CACHE_ENABLED", True)
+                decodes.clear()
+                queries.clear()
+                for _ in range(3):
+                    assert (await client.get("/me", headers=headers)).status_code == 200
+                assert len(decodes) == 1
+                assert len(queries) == 1
+
+                assert (await client.get("/me")).status_code == 401
+        finally:
+            principal_cache.clear_principals()
+            security._token_cache.clear()
+            await engine.dispose()
+
+    run(scenario())
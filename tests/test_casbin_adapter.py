@@ -0,0 +1,113 @@
+from casbin.model import Model
+from helpers import create_database, run
+from sqlalchemy import event
+
+from app.services.casbin_adapter import AsyncSQLAlchemyAdapter, _insert_ignore, _rule_to_row
+from app.services.casbin_service import MODEL_PATH
+
+
+def test_mixed_length_rows_share_one_insert(tmp_path):
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db")
+        adapter = AsyncSQLAlchemyAdapter(sessions)
+        try:
+            # 多行 INSERT 的列取自第一行：g 行在前时 p 行的 v2 不能被丢掉
+            rows = [_rule_to_row("g", ["alice", "admin"]), _rule_to_row("p", ["admin", "/api/v1/users/*", "GET"])]
+            async with engine.begin() as conn:
+                await conn.execute(_insert_ignore(), rows)
+            assert await adapter.load_rules("g") == [["alice", "admin"]]
+            assert await adapter.load_rules("p") == [["admin", "/api/v1/users/*", "GET"]]
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_save_policy_round_trips_p_and_g_rules(tmp_path):
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=[["p", "stale", "/", "GET"]])
+        adapter = AsyncSQLAlchemyAdapter(sessions)
+        try:
+            model = Model()
+            model.load_model(MODEL_PATH)
+            p_rules = [["admin", "/api/v1/users/*", "GET"], ["viewer", "/api/v1/roles", "GET"]]
+            g_rules = [["alice", "admin"], ["bob", "viewer"]]
+            model.model["p"]["p"].policy = [list(rule) for rule in p_rules]
+            model.model["g"]["g"].policy = [list(rule) for rule in g_rules]
+
+            assert await adapter.save_policy(model)
+            assert await adapter.load_rules("p") == p_rules
+            assert await adapter.load_rules("g") == g_rules
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+# 适配器各类查询应命中的索引
+EXPECTED_PLANS = {
+    "remove_policy": "uq_casbin_rule_rule_hash",
+    "remove_policies": "uq_casbin_rule_rule_hash",
+    "remove_filtered_policy_v0": "idx_casbin_rule_ptype_v0_v1_v2",
+    "remove_filtered_policy_v1": "idx_casbin_rule_ptype_v1",
+    "load_policy_for_subjects": "idx_casbin_rule_ptype_v0_v1_v2",
+}
+
+
+def test_targeted_queries_use_indexes(tmp_path):
+    rules = [["p", f"role{i % 20}", f"/api/v1/res{i}/*", "GET"] for i in range(200)]
+    rules += [["g", f"user{i}", f"role{i % 20}"] for i in range(50)]
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=rules)
+        adapter = AsyncSQLAlchemyAdapter(sessions)
+        # 与生产库一样让优化器拿到索引统计：所有行同属默认租户，(domain, ptype) 索引的选择性很差
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("ANALYZE")
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith(("SELECT", "DELETE")):
+                statements.append((statement, parameters))
+
+        event.listen(engine.sync_engine, "before_cursor_execute", record)
+        calls = {
+            "remove_policy": lambda: adapter.remove_policy("p", "p", rules[0][1:]),
+            "remove_policies": lambda: adapter.remove_policies("g", "g", [rules[-1][1:]]),
+            "remove_filtered_policy_v0": lambda: adapter.remove_filtered_policy("g", "g", 0, "no_such_user"),
+            "remove_filtered_policy_v1": lambda: adapter.remove_filtered_policy("p", "p", 1, "/no/such/path"),
+            "load_policy_for_subjects": lambda: adapter.load_policy_for_subjects("p", ["role1", "no_such_role"]),
+        }
+        try:
+            for name, call in calls.items():
+                statements.clear()
+                await call()
+                assert statements, name
+                details = []
+                async with engine.connect() as conn:
+                    for statement, parameters in list(statements):
+                        rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+                        details.extend(row[-1] for row in rows)
+                assert any(EXPECTED_PLANS[name] in detail for detail in details), (name, details)
+                assert not any(detail.startswith("SCAN") for detail in details), (name, details)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_duplicate_writes_do_not_add_rows(tmp_path):
+    rules = [["p", "admin", "/api/v1/users/*", "GET"], ["g", "alice", "admin"]]
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=rules)
+        adapter = AsyncSQLAlchemyAdapter(sessions)
+        try:
+            await adapter.add_policies("p", "p", [["admin", "/api/v1/users/*", "GET"]] * 3)
+            await adapter.add_policy("g", "g", ["alice", "admin"])
+            assert await adapter.policy_stamp() == (2, 2)
+        finally:
+            await engine.dispose()
+
+    run(scenario())
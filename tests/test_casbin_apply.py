@@ -0,0 +1,149 @@
+import json
+
+import pytest
+from helpers import create_database, reset_casbin, run
+
+from app.database.apply_rbac_policy import apply_policy_file
+from app.services import casbin_adapter, casbin_service
+from app.services.casbin_service import CasbinService
+
+RULES = [
+    ["p", "admin", "/api/v1/*", "*"],
+    ["p", "viewer", "/api/v1/hosts/*", "GET"],
+    ["p", "viewer", "/api/v1/users/:id", "GET"],
+    ["g", "alice", "admin"],
+    ["g", "bob", "viewer"],
+]
+
+# 保留 admin 规则与 alice，删除 viewer 的用户规则与 bob，新增 auditor
+DESIRED = {
+    "p": [
+        ["admin", "/api/v1/*", "*"],
+        ["viewer", "/api/v1/hosts/*", "GET"],
+        ["auditor", "/api/v1/audit/*", "GET"],
+    ],
+    "g": [["alice", "admin"], ["carol", "auditor"]],
+}
+
+
+@pytest.fixture(autouse=True)
+def _no_principal_invalidation(monkeypatch):
+    async def noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(casbin_service, "invalidate_principals_for_usernames", noop)
+
+
+async def _stored():
+    adapter = CasbinService.get_adapter()
+    return {sec: sorted(await adapter.load_rules(sec)) for sec in ("p", "g")}
+
+
+def _in_memory():
+    model = CasbinService.get_enforcer().get_model().model
+    return {sec: sorted(model[sec][sec].policy) for sec in ("p", "g")}
+
+
+def _sorted(policy_set):
+    return {sec: sorted(rules) for sec, rules in policy_set.items()}
+
+
+def test_apply_writes_only_the_diff_and_unchanged_set_is_a_noop(tmp_path):
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            await reset_casbin(sessions)
+            before, version = await _stored(), CasbinService.policy_version()
+
+            # 只计算差异：数据库、内存模型与策略版本都不变
+            result = await CasbinService.apply_policy_set(DESIRED, dry_run=True)
+            assert result["status"] == "dry_run" and result["summary"]["p"]["added"] == 1
+            assert await _stored() == _in_memory() == before
+            assert CasbinService.policy_version() == version
+
+            result = await CasbinService.apply_policy_set(DESIRED)
+            assert result["status"] == "applied"
+            assert result["summary"]["p"] == {"desired": 3, "added": 1, "removed": 1, "unchanged": 2}
+            assert result["summary"]["g"] == {"desired": 2, "added": 1, "removed": 1, "unchanged": 1}
+            assert result["added"] == {"p": [["auditor", "/api/v1/audit/*", "GET"]], "g": [["carol", "auditor"]]}
+            assert result["removed"] == {"p": [["viewer", "/api/v1/users/:id", "GET"]], "g": [["bob", "viewer"]]}
+            assert await _stored() == _in_memory() == _sorted(DESIRED)
+            assert CasbinService.policy_version() == version + 1
+            assert CasbinService._evaluate("carol", "/api/v1/audit/log", "GET")
+            assert not CasbinService._evaluate("bob", "/api/v1/hosts/web", "GET")
+
+            # 同一策略集（顺序不同、含重复）再次应用：不写入，也不递增策略版本
+            again = {sec: list(reversed(rules)) + rules[:1] for sec, rules in DESIRED.items()}
+            result = await CasbinService.apply_policy_set(again)
+            assert result["status"] == "unchanged"
+            assert all(counts["added"] == counts["removed"] == 0 for counts in result["summary"].values())
+            assert CasbinService.policy_version() == version + 1
+            assert await _stored() == _sorted(DESIRED)
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_failed_write_rolls_back_database_and_memory(tmp_path, monkeypatch):
+    def failing_insert():
+        raise RuntimeError("insert failed")
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            await reset_casbin(sessions)
+            before, version = await _stored(), CasbinService.policy_version()
+            # 删除语句已在事务中执行，插入时失败：整个事务回滚，内存模型不变
+            monkeypatch.setattr(casbin_adapter, "_insert_ignore", failing_insert)
+            result = await CasbinService.apply_policy_set(DESIRED)
+            assert result["status"] == "failed"
+            assert await _stored() == _in_memory() == before
+            assert CasbinService.policy_version() == version
+            assert CasbinService._evaluate("bob", "/api/v1/users/7", "GET")
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_cli_dry_run_writes_nothing(tmp_path, capsys):
+    csv_path = tmp_path / "policy.csv"
+    csv_path.write_text(
+        "# 期望的策略集\n"
+        + "".join(f"p, {', '.join(rule)}\n" for rule in DESIRED["p"])
+        + "".join(f"g, {', '.join(rule)}\n" for rule in DESIRED["g"]),
+        encoding="utf-8",
+    )
+    json_path = tmp_path / "policy.json"
+    json_path.write_text(json.dumps({
+        "policies": [{"role": role, "obj": obj, "act": act} for role, obj, act in DESIRED["p"]],
+        "roles": [{"username": user, "role": role} for user, role in DESIRED["g"]],
+    }), encoding="utf-8")
+    bad_path = tmp_path / "bad.csv"
+    bad_path.write_text("p, admin, /api/v1/*, *\nx, typo\n", encoding="utf-8")
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            await reset_casbin(sessions)
+            before = await _stored()
+
+            assert await apply_policy_file(str(csv_path), dry_run=True) == 0
+            report = json.loads(capsys.readouterr().out)
+            assert report["status"] == "dry_run"
+            assert report["summary"]["p"]["added"] == report["summary"]["g"]["removed"] == 1
+            assert await _stored() == _in_memory() == before
+
+            # 格式错误的文件在比对前拒绝，不会把规则当作多余规则删除
+            assert await apply_policy_file(str(bad_path), dry_run=False) == 2
+            assert "第 2 行" in capsys.readouterr().err
+            assert await _stored() == before
+
+            assert await apply_policy_file(str(json_path), dry_run=False) == 0
+            assert json.loads(capsys.readouterr().out)["status"] == "applied"
+            assert await _stored() == _in_memory() == _sorted(DESIRED)
+        finally:
+            await engine.dispose()
+
+    run(scenario())
@@ -0,0 +1,81 @@
+import json
+
+import pytest
+from helpers import admin_client, create_database, reset_casbin, run
+
+from app.api.v1.endpoints import casbin as casbin_endpoints
+from app.services import casbin_service
+from app.services.casbin_service import CasbinService
+
+RULES = [
+    ["p", "admin", "/api/v1/*", "*"],
+    ["p", "viewer", "/api/v1/hosts/*", "GET"],
+    ["p", "viewer", "/api/v1/users/:id", "GET"],
+    ["p", "auditor", "/api/v1/audit/*", "(GET)|(POST)"],
+    ["g", "alice", "admin"],
+    ["g", "bob", "viewer"],
+    ["g", "carol", "auditor"],
+    ["g", "auditor", "viewer"],
+]
+
+# 允许与拒绝混合，并含重复的请求
+REQUESTS = [
+    (sub, path, method)
+    for sub in ("alice", "bob", "carol", "dave", "bob")
+    for path in ("/api/v1/hosts/web/1", "/api/v1/users/7", "/api/v1/users/7/roles", "/api/v1/audit/log", "/api/v2/hosts/1")
+    for method in ("GET", "POST", "DELETE")
+]
+
+
+@pytest.fixture(params=["index", "no_index", "filtered"])
+def mode(request, monkeypatch):
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_PATH_INDEX_ENABLED", request.param != "no_index")
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_FILTERED_LOADING", request.param == "filtered")
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_PRELOAD_SUBJECTS", [])
+    return request.param
+
+
+def test_batch_results_match_single_enforce(tmp_path, mode):
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            await reset_casbin(sessions)
+            # 分段检查：过滤加载模式下每段按需读入该段用户及其角色的规则
+            batched = [result async for chunk in CasbinService.check_permissions(REQUESTS, chunk_size=7) for result in chunk]
+            single = []
+            for request in REQUESTS:
+                await CasbinService.ensure_loaded(request[0])
+                single.append(CasbinService.enforce(*request))
+            assert batched == single
+            assert CasbinService.enforce_batch(REQUESTS) == single
+            assert True in single and False in single
+            assert CasbinService.enforce_batch([]) == []
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_batch_endpoint_streams_results_in_request_order(tmp_path):
+    checks = [{"username": sub, "obj": obj, "act": act} for sub, obj, act in REQUESTS]
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            await reset_casbin(sessions)
+            async with admin_client(casbin_endpoints.router) as client:
+                response = await client.post("/check/batch", json={"checks": checks})
+                assert response.status_code == 200
+                assert response.headers["content-type"].startswith("application/x-ndjson")
+                lines = [json.loads(line) for line in response.text.splitlines()]
+                assert [{key: line[key] for key in ("username", "obj", "act")} for line in lines] == checks
+                assert [line["has_permission"] for line in lines] == [CasbinService.enforce(*request) for request in REQUESTS]
+
+                # 空请求与超出上限的请求在校验阶段拒绝
+                assert (await client.post("/check/batch", json={"checks": []})).status_code == 422
+                too_many = checks[:1] * (casbin_endpoints.BATCH_MAX_ITEMS + 1)
+                assert (await client.post("/check/batch", json={"checks": too_many})).status_code == 422
+        finally:
+            await engine.dispose()
+
+    run(scenario())
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+
+import httpx
+from fastapi import FastAPI
+from helpers import create_database, reset_casbin, run
+from starlette.authentication import AuthCredentials, SimpleUser
+from starlette.middleware.authentication import AuthenticationMiddleware
+
+from app.api.middleware import CachedCasbinMiddleware, CasbinAuthBackend
+from app.services import casbin_domains
+from app.services.casbin_adapter import AsyncSQLAlchemyAdapter, _insert_ignore, _rule_to_row
+from app.services.casbin_domains import DomainEnforcerPool
+from app.services.casbin_service import CasbinService
+
+TENANT_RULES = [
+    ["p", "editor", "/api/v1/hosts/*", "GET"],
+    ["g", "alice", "editor"],
+    ["g", "bob", "viewer"],
+]
+
+
+class _HeaderAuthBackend(CasbinAuthBackend):
+    """用户名取自 X-User 请求头，租户的解析与 CasbinAuthBackend 相同"""
+
+    async def authenticate(self, request):
+        request.state.principal = None
+        request.state.domain = self._resolve_domain(request)
+        return AuthCredentials(["authenticated"]), SimpleUser(request.headers.get("X-User", "anonymous"))
+
+
+def _build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CachedCasbinMiddleware, enforcer=CasbinService.get_enforcer())
+    app.add_middleware(AuthenticationMiddleware, backend=_HeaderAuthBackend())
+
+    @app.get("/api/v1/hosts/{host_id}")
+    async def read_host(host_id: str):
+        return {"host": host_id}
+
+    return app
+
+
+def _reset_pool() -> None:
+    DomainEnforcerPool._domains = OrderedDict()
+    DomainEnforcerPool._known = set()
+    DomainEnforcerPool._loaded_rules = 0
+    DomainEnforcerPool._loading = {}
+    DomainEnforcerPool._stale = set()
+
+
+async def _insert(engine, domain, rules):
+    async with engine.begin() as conn:
+        await conn.execute(_insert_ignore(), [_rule_to_row(rule[0], rule[1:], domain) for rule in rules])
+
+
+def test_tenant_status_codes_and_unknown_tenants_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(casbin_domains.settings, "CASBIN_DOMAINS_ENABLED", True)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db")
+        await _insert(engine, "acme", TENANT_RULES)
+        _reset_pool()
+        try:
+            await reset_casbin(sessions)
+            transport = httpx.ASGITransport(app=_build_app())
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                async def get(user, tenant):
+                    return await client.get("/api/v1/hosts/1", headers={"X-User": user, "X-Tenant": tenant})
+
+                assert (await get("alice", "acme")).status_code == 200
+                # 租户成员但没有该权限：由授权判定拒绝
+                assert (await get("bob", "acme")).status_code == 403
+                response = await get("mallory", "acme")
+                assert response.status_code == 403
+                assert response.json() == {"detail": "Not a member of this tenant"}
+                assert (await get("alice", "bad tenant!")).status_code == 400
+
+                # 不存在的租户返回 404，且不会驻留空的执行器
+                for _ in range(3):
+                    response = await get("alice", "ghost")
+                    assert response.status_code == 404
+                assert list(DomainEnforcerPool._domains) == ["acme"]
+                assert DomainEnforcerPool.get_stats()["unknown"] >= 3
+
+                # 之后创建的租户立即可用
+                await _insert(engine, "ghost", TENANT_RULES)
+                assert (await get("alice", "ghost")).status_code == 200
+
+                # 租户的规则被全部删除后重新加载时视为不存在
+                async with engine.begin() as conn:
+                    await conn.exec_driver_sql("DELETE FROM casbin_rule WHERE domain = 'ghost'")
+                DomainEnforcerPool.invalidate("ghost")
+                assert (await get("alice", "ghost")).status_code == 404
+                assert "ghost" not in DomainEnforcerPool._known
+        finally:
+            _reset_pool()
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_tenant_load_failure_returns_503(tmp_path, monkeypatch):
+    monkeypatch.setattr(casbin_domains.settings, "CASBIN_DOMAINS_ENABLED", True)
+
+    async def failing(self):
+        raise ConnectionError("database is down")
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db")
+        await _insert(engine, "acme", TENANT_RULES)
+        _reset_pool()
+        try:
+            await reset_casbin(sessions)
+            transport = httpx.ASGITransport(app=_build_app())
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                headers = {"X-User": "alice", "X-Tenant": "acme"}
+                with monkeypatch.context() as patch:
+                    patch.setattr(AsyncSQLAlchemyAdapter, "has_rules", failing)
+                    response = await client.get("/api/v1/hosts/1", headers=headers)
+                    assert response.status_code == 503
+                    assert response.headers["Retry-After"] == "1"
+                assert not DomainEnforcerPool._domains
+                assert (await client.get("/api/v1/hosts/1", headers=headers)).status_code == 200
+        finally:
+            _reset_pool()
+            await engine.dispose()
+
+    run(scenario())
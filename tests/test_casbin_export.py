@@ -0,0 +1,106 @@
+import json
+
+from helpers import admin_client, create_database, reset_casbin, run
+
+from app.api.v1.endpoints import casbin as casbin_endpoints
+from app.services.casbin_adapter import EXPORT_PAGE_SIZE, _insert_ignore, _rule_to_row
+from app.services.casbin_policy_file import parse_policy_lines
+
+# 超过一页的规则，p / g 交错写入，对象中含 LIKE 通配符
+RULES = []
+for i in range(EXPORT_PAGE_SIZE + 700):
+    RULES.append(["p", f"role{i % 7}", f"/api/v1/res_{i}/*", "GET"])
+    if i % 10 == 0:
+        RULES.append(["g", f"user{i}", f"role{i % 7}"])
+RULES.append(["p", "role0", "/api/v1/100%/*", "GET"])
+
+
+async def _ndjson(client, **params):
+    response = await client.get("/policies/export", params=params)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+async def _walk(client, page, **params):
+    """每次最多导出 page 条，用最后一行的 id 作为 cursor 继续，直到返回为空"""
+    items, cursor = [], 0
+    while True:
+        batch = await _ndjson(client, cursor=cursor, limit=page, **params)
+        if not batch:
+            return items
+        assert len(batch) <= page
+        items.extend(batch)
+        cursor = batch[-1]["id"]
+
+
+def _rules(items):
+    return [[item["ptype"], *item["rule"]] for item in items]
+
+
+def test_export_resumes_from_cursor_without_gaps_or_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(casbin_endpoints, "EXPORT_FLUSH_ROWS", 300)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            # 删除部分行，id 不连续
+            async with engine.begin() as conn:
+                await conn.exec_driver_sql("DELETE FROM casbin_rule WHERE id % 97 = 0")
+            await reset_casbin(sessions)
+            async with admin_client(casbin_endpoints.router) as client:
+                full = await _ndjson(client)
+                ids = [item["id"] for item in full]
+                assert ids == sorted(set(ids))
+                assert len(full) == len(RULES) - len(RULES) // 97
+
+                walked = await _walk(client, 777)
+                assert walked == full
+
+                # 续传期间新增的规则出现在后续批次中，已导出的部分不重复
+                first = await _ndjson(client, limit=1000)
+                async with engine.begin() as conn:
+                    await conn.execute(_insert_ignore(), [_rule_to_row("g", ["late", "role1"])])
+                rest = await _ndjson(client, cursor=first[-1]["id"])
+                assert first + rest[:-1] == full
+                assert _rules(rest[-1:]) == [["g", "late", "role1"]]
+
+                # CSV：每批之后的注释行给出 cursor，从该处继续的结果与一次导出相同
+                response = await client.get("/policies/export", params={"format": "csv", "limit": 1000})
+                cursors = [int(line.split(":")[1]) for line in response.text.splitlines() if line.startswith("# cursor:")]
+                assert cursors == [full[299]["id"], full[599]["id"], full[899]["id"], full[999]["id"]]
+                rest = await client.get("/policies/export", params={"format": "csv", "cursor": cursors[-1]})
+                exported = parse_policy_lines((response.text + rest.text).splitlines())
+                expected = _rules(full) + [["g", "late", "role1"]]
+                assert exported == {sec: [rule[1:] for rule in expected if rule[0] == sec] for sec in ("p", "g")}
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_export_filters_and_invalid_cursor(tmp_path):
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            await reset_casbin(sessions)
+            async with admin_client(casbin_endpoints.router) as client:
+                g_rules = [rule for rule in RULES if rule[0] == "g"]
+                assert _rules(await _walk(client, 100, ptype="g")) == g_rules
+
+                role3 = [rule for rule in RULES if rule[0] == "p" and rule[1] == "role3"]
+                assert _rules(await _walk(client, 250, ptype="p", subject="role3")) == role3
+
+                # 前缀中的 _ 与 % 按字面匹配
+                assert _rules(await _ndjson(client, obj_prefix="/api/v1/res_12/")) == [["p", "role5", "/api/v1/res_12/*", "GET"]]
+                assert _rules(await _ndjson(client, obj_prefix="/api/v1/100%")) == [RULES[-1]]
+                assert await _ndjson(client, obj_prefix="/api/v1/res%") == []
+
+                # 超出最后一个 id 的 cursor 返回空结果；非法的 cursor / limit / ptype 在校验阶段拒绝
+                last_id = (await _ndjson(client))[-1]["id"]
+                assert await _ndjson(client, cursor=last_id) == []
+                for params in ({"cursor": -1}, {"cursor": "abc"}, {"limit": 0}, {"ptype": "x"}, {"format": "xml"}):
+                    assert (await client.get("/policies/export", params=params)).status_code == 422
+        finally:
+            await engine.dispose()
+
+    run(scenario())
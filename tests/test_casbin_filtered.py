@@ -0,0 +1,46 @@
+from helpers import create_database, reset_casbin, run
+
+from app.services import casbin_service
+from app.services.casbin_adapter import _insert_ignore, _rule_to_row
+from app.services.casbin_service import CasbinService
+
+RULES = [
+    ["p", "viewer", "/api/v1/hosts", "GET"],
+    ["p", "editor", "/api/v1/racks", "GET"],
+    ["g", "alice", "viewer"],
+    ["g", "bob", "editor"],
+]
+
+
+def test_remote_change_for_evicted_subject_clears_cached_decisions(tmp_path, monkeypatch):
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_FILTERED_LOADING", True)
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_FILTERED_MAX_RULES", 1)
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_PRELOAD_SUBJECTS", [])
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_DECISION_CACHE_ENABLED", True)
+    rule = ["viewer", "/api/v1/users", "GET"]
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=RULES)
+        try:
+            await reset_casbin(sessions)
+            await CasbinService.ensure_loaded("alice")
+            assert not CasbinService.enforce("alice", *rule[1:])
+
+            # 加载 bob 的角色超出上限，viewer 被淘汰，alice 的拒绝决策仍在缓存中
+            await CasbinService.ensure_loaded("bob")
+            assert "viewer" not in CasbinService._loaded_subjects
+
+            # 其他 worker 为已淘汰的 viewer 添加规则：不进入内存，但策略版本递增、决策缓存清空
+            async with engine.begin() as conn:
+                await conn.execute(_insert_ignore(), [_rule_to_row("p", rule)])
+            version = CasbinService.policy_version()
+            assert CasbinService.apply_remote_change(True, "p", [rule]) == 0
+            assert CasbinService.policy_version() == version + 1
+
+            await CasbinService.ensure_loaded("alice")
+            assert CasbinService._evaluate("alice", *rule[1:])
+            assert CasbinService.enforce("alice", *rule[1:])
+        finally:
+            await engine.dispose()
+
+    run(scenario())
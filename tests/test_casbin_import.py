@@ -0,0 +1,130 @@
+import os
+
+import pytest
+from helpers import create_database, run
+
+from app.services.casbin_adapter import AsyncSQLAlchemyAdapter
+from app.services.casbin_import import ImportCheckpoint, PolicyImporter
+from app.services.casbin_policy_file import PolicyFileError
+
+EXISTING = [["p", "admin", "/api/v1/*", "*"]]
+
+LINES = [
+    "\ufeff# 导出的策略（带 BOM）",
+    "p, admin, /api/v1/*, *",
+    "p, viewer, /api/v1/hosts/*, GET",
+    "",
+    "g, alice, admin",
+    "p, viewer, /api/v1/hosts/*, GET",
+    "x, typo",
+    "p, auditor",
+    "g, bob, viewer",
+    'p, auditor, "/api/v1/audit/a,b", GET',
+    "g, alice, admin",
+]
+
+EXPECTED = {
+    "p": [["admin", "/api/v1/*", "*"], ["auditor", "/api/v1/audit/a,b", "GET"], ["viewer", "/api/v1/hosts/*", "GET"]],
+    "g": [["alice", "admin"], ["bob", "viewer"]],
+}
+
+
+def _write_lines(path, lines):
+    path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+
+
+async def _stored(sessions):
+    adapter = AsyncSQLAlchemyAdapter(sessions)
+    return {sec: sorted(await adapter.load_rules(sec)) for sec in ("p", "g")}
+
+
+def test_import_skips_duplicates_existing_rules_and_malformed_lines(tmp_path):
+    source = tmp_path / "policy.csv"
+    _write_lines(source, LINES)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=EXISTING)
+        try:
+            stats = await PolicyImporter(session_factory=sessions, chunk_lines=3).run(str(source))
+            assert await _stored(sessions) == EXPECTED
+            assert stats["lines"] == len(LINES) and stats["chunks"] == 4
+            assert (stats["rules"], stats["written"], stats["skipped"], stats["invalid"]) == (7, 4, 3, 2)
+            assert [error.split(":")[0] for error in stats["errors"]] == ["第 7 行", "第 8 行"]
+            assert not os.path.exists(f"{source}.checkpoint.json")
+
+            # 再次导入同一文件：全部规则已存在，不写入
+            stats = await PolicyImporter(session_factory=sessions, chunk_lines=3).run(str(source))
+            assert stats["written"] == 0 and stats["skipped"] == 7
+            assert await _stored(sessions) == EXPECTED
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_strict_import_stops_at_first_malformed_line(tmp_path):
+    source = tmp_path / "policy.csv"
+    _write_lines(source, LINES)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db")
+        try:
+            with pytest.raises(PolicyFileError, match="第 7 行"):
+                await PolicyImporter(session_factory=sessions, chunk_lines=3, strict=True).run(str(source))
+            # 出错之前的块已提交，出错的块整体未写入
+            assert await _stored(sessions) == {
+                "p": [["admin", "/api/v1/*", "*"], ["viewer", "/api/v1/hosts/*", "GET"]],
+                "g": [["alice", "admin"]],
+            }
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_interrupted_import_resumes_from_checkpoint(tmp_path, monkeypatch):
+    source = tmp_path / "policy.csv"
+    _write_lines(source, LINES)
+    checkpoint_path = str(tmp_path / "import.checkpoint.json")
+    save = ImportCheckpoint.save
+    saves = []
+
+    def crash_on_third_save(self, offset, line, stats):
+        # 第三块已提交、检查点尚未更新时中断
+        if len(saves) == 2:
+            raise KeyboardInterrupt
+        saves.append(line)
+        save(self, offset, line, stats)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=EXISTING)
+        try:
+            with monkeypatch.context() as patch:
+                patch.setattr(ImportCheckpoint, "save", crash_on_third_save)
+                with pytest.raises(KeyboardInterrupt):
+                    await PolicyImporter(session_factory=sessions, chunk_lines=3).run(str(source), checkpoint_path)
+            state = ImportCheckpoint(checkpoint_path, str(source)).load()
+            assert state["line"] == 7 and state["stats"]["lines"] == 6
+
+            # 从第 7 行继续：第三块已提交的规则识别为已存在，统计从检查点累计
+            importer = PolicyImporter(session_factory=sessions, chunk_lines=3)
+            stats = await importer.run(str(source), checkpoint_path)
+            assert await _stored(sessions) == EXPECTED
+            assert stats["lines"] == len(LINES) and stats["chunks"] == 4
+            assert (stats["written"], stats["invalid"]) == (3, 2)
+            assert not os.path.exists(checkpoint_path)
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_checkpoint_is_ignored_after_source_changes(tmp_path):
+    source = tmp_path / "policy.csv"
+    _write_lines(source, LINES)
+    checkpoint = ImportCheckpoint(str(tmp_path / "import.checkpoint.json"), str(source))
+    checkpoint.save(100, 5, {"lines": 4})
+    assert checkpoint.load()["offset"] == 100
+
+    _write_lines(source, LINES + ["g, carol, viewer"])
+    assert ImportCheckpoint(checkpoint.path, str(source)).load() is None
@@ -0,0 +1,111 @@
+"""
+keyMatch2 路径模式索引与 casbin 默认实现的随机化等价性（固定种子，失败时可复现）
+"""
+
+import random
+import re
+
+import casbin
+import pytest
+from casbin.util import key_match2 as casbin_key_match2
+from helpers import create_database, reset_casbin, run
+
+from app.services import casbin_service
+from app.services.casbin_index import PathPatternIndex, key_match2
+from app.services.casbin_service import MODEL_PATH, CasbinService
+
+ACTIONS = ("GET", "POST", "PUT", "DELETE")
+# 含正则元字符、命名参数与通配符的路径段
+SEGMENTS = ("api", "v1", "users", "assets", "a.b", "x-y", "item+", "v1?", ":id", ":name", "*", "res*")
+
+
+def random_pattern(rng: random.Random) -> str:
+    """随机生成一个合法的 keyMatch2 模式（转换后的正则无法编译的模式会重新生成）"""
+    while True:
+        if rng.random() < 0.02:
+            return "*"
+        pattern = "".join("/" + rng.choice(SEGMENTS) for _ in range(rng.randint(0, 4)))
+        pattern += rng.choice(("", "", "/*", "/", "*"))
+        try:
+            casbin_key_match2("", pattern)
+        except re.error:
+            continue
+        return pattern
+
+
+def random_path(rng: random.Random, pattern: str) -> str:
+    """从模式派生一个可能匹配、也可能刚好不匹配的路径"""
+    parts = []
+    for segment in pattern.split("/")[1:]:
+        if segment.startswith(":") or segment == "*":
+            segment = rng.choice(("42", "abc", "a.b", "", "x/y"))
+        elif rng.random() < 0.3:
+            segment = segment.replace(rng.choice(segment or "x"), rng.choice(("", "x", "/", ".")), 1)
+        parts.append(segment)
+    path = "/" + "/".join(parts) if parts else rng.choice(("", "/", "/api"))
+    if rng.random() < 0.2:
+        path += rng.choice(("/", "/extra", "x"))
+    return path
+
+
+def reference_enforcer(p_rules, g_rules) -> casbin.Enforcer:
+    """casbin 默认实现（内置 keyMatch2、逐条匹配）"""
+    enforcer = casbin.Enforcer(MODEL_PATH)
+    model = enforcer.get_model()
+    model.model["p"]["p"].policy = [list(rule) for rule in p_rules]
+    model.model["g"]["g"].policy = [list(rule) for rule in g_rules]
+    enforcer.build_role_links()
+    return enforcer
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_single_pattern_matches_casbin_key_match2(seed):
+    rng = random.Random(seed)
+    for _ in range(2000):
+        pattern = random_pattern(rng)
+        path = random_path(rng, pattern)
+        expected = casbin_key_match2(path, pattern)
+        index = PathPatternIndex()
+        index.add("s", pattern, "GET")
+        assert key_match2(path, pattern) == expected, (pattern, path)
+        assert index.match(["s"], path, "GET") == expected, (pattern, path)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_enforce_matches_casbin_under_changes(tmp_path, monkeypatch, seed):
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_DECISION_CACHE_ENABLED", False)
+    rng = random.Random(seed)
+    roles = [f"role{i}" for i in range(40)]
+    p_rules = [[rng.choice(roles), random_pattern(rng), rng.choice(ACTIONS + ("*",))] for _ in range(800)]
+    # role0 -> role1 -> ... 的长继承链，超过角色管理器的层级上限
+    g_rules = [[roles[i], roles[i + 1]] for i in range(15)]
+    g_rules += [[f"user{k}", rng.choice(roles)] for k in range(50)]
+    subjects = [f"user{k}" for k in range(50)] + roles + ["nobody"]
+
+    def check(rules, cases: int) -> None:
+        reference = reference_enforcer(rules, g_rules)
+        for _ in range(cases):
+            rule = rng.choice(rules)
+            request = (rng.choice(subjects), random_path(rng, rule[1]), rng.choice(ACTIONS + ("*",)))
+            assert CasbinService._evaluate(*request) == reference.enforce(*request), request
+
+    async def scenario():
+        engine, sessions = await create_database(
+            tmp_path / "cmdb.db", rules=[["p", *rule] for rule in p_rules] + [["g", *rule] for rule in g_rules]
+        )
+        try:
+            await reset_casbin(sessions)
+            assert CasbinService._path_index is not None
+            check(p_rules, 800)
+
+            # 增量增删之后索引仍与逐条匹配一致
+            removed = rng.sample(p_rules, 200)
+            added = [[rng.choice(roles), random_pattern(rng), rng.choice(ACTIONS)] for _ in range(200)]
+            CasbinService._apply_local(False, "p", "p", removed)
+            CasbinService._apply_local(True, "p", "p", added)
+            current = CasbinService.get_enforcer().get_model().model["p"]["p"].policy
+            check([list(rule) for rule in current], 800)
+        finally:
+            await engine.dispose()
+
+    run(scenario())
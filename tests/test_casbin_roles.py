@@ -0,0 +1,79 @@
+import random
+
+from helpers import create_database, reset_casbin, run
+
+from app.services.casbin_roles import RoleRegistry
+from app.services.casbin_service import CasbinService
+
+ACTIONS = ("GET", "POST", "PUT", "DELETE")
+
+
+def _scanned_roles():
+    """逐条扫描内存模型得到的角色目录（角色 -> (直接成员, 规则条数)），作为角色目录的参照"""
+    enforcer = CasbinService.get_enforcer()
+    roles = {}
+    for rule in enforcer.get_policy():
+        members, count = roles.get(rule[0], (set(), 0))
+        roles[rule[0]] = (members, count + 1)
+    for user, role in (rule[:2] for rule in enforcer.get_grouping_policy()):
+        members, count = roles.get(role, (set(), 0))
+        roles[role] = (members | {user}, count)
+    return {role: (sorted(members), count) for role, (members, count) in roles.items()}
+
+
+def _listed_roles(page_size):
+    listed, cursor = [], None
+    while True:
+        page, cursor, total = CasbinService.list_roles(cursor, page_size)
+        listed.extend(page)
+        if cursor is None:
+            return listed, total
+
+
+def test_registry_counts_ignore_duplicates_and_missing_rules():
+    registry = RoleRegistry()
+    registry.build([["alice", "admin"]], [["admin", "/api/v1/*", "GET"], ["viewer", "/api/v1/users/*", "GET"]])
+
+    registry.add_policy(["admin", "/api/v1/*", "GET"])
+    assert registry.policy_count("admin") == 1
+    registry.remove_policy(["admin", "/api/v1/hosts/*", "GET"])
+    assert registry.policy_count("admin") == 1
+    registry.remove_policy(["viewer", "/api/v1/users/*", "GET"])
+    registry.remove_policy(["viewer", "/api/v1/users/*", "GET"])
+    assert "viewer" not in registry and registry.names() == ["admin"]
+
+    registry.remove_policy(["admin", "/api/v1/*", "GET"])
+    assert registry.policy_count("admin") == 0 and registry.members("admin") == ["alice"]
+    registry.remove_link("alice", "admin")
+    assert len(registry) == 0
+
+
+def test_registry_matches_model_after_random_changes(tmp_path):
+    rng = random.Random(7)
+    roles = [f"role{i}" for i in range(15)]
+    users = [f"user{i}" for i in range(40)]
+    rules = [["p", rng.choice(roles), f"/api/v1/res{rng.randrange(30)}/*", rng.choice(ACTIONS)] for _ in range(200)]
+    rules += [["g", user, rng.choice(roles)] for user in users]
+
+    async def scenario():
+        # 初始规则含重复，写入数据库时按唯一约束去重
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=rules)
+        try:
+            await reset_casbin(sessions)
+            for i in range(150):
+                if rng.random() < 0.5:
+                    await CasbinService.add_policy(f"new_role{rng.randrange(5)}", f"/api/v1/new{i % 20}/*", rng.choice(ACTIONS))
+                    await CasbinService.add_role_for_user(rng.choice(users), rng.choice(roles))
+                else:
+                    await CasbinService.remove_policy(*rng.choice(CasbinService.get_all_policies()))
+                    await CasbinService.delete_role_for_user(*rng.choice(CasbinService.get_enforcer().get_grouping_policy())[:2])
+
+            expected = _scanned_roles()
+            listed, total = _listed_roles(page_size=7)
+            assert total == len(expected)
+            assert [name for name, _, _ in listed] == sorted(expected)
+            assert {name: (members, count) for name, members, count in listed} == expected
+        finally:
+            await engine.dispose()
+
+    run(scenario())
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import casbin
+import fakeredis
+import redis
+from helpers import create_database, reset_casbin, run
+
+from app.services import casbin_watcher, principal_cache
+from app.services.casbin_adapter import AsyncSQLAlchemyAdapter
+from app.services.casbin_service import MODEL_PATH, CasbinService
+from app.services.casbin_watcher import RedisPolicyWatcher
+
+CHANNEL = "test:casbin:policy"
+SEQ_KEY = "test:casbin:seq"
+
+
+class _Worker:
+    """另一个 worker：独立的执行器，与 CasbinService 共用同一个数据库"""
+
+    def __init__(self, session_factory):
+        self.enforcer = casbin.AsyncEnforcer(MODEL_PATH, AsyncSQLAlchemyAdapter(session_factory))
+        self.loads = 0
+
+    async def load_policy(self) -> bool:
+        self.loads += 1
+        await self.enforcer.load_policy()
+        return True
+
+    def apply_remote_change(self, add, sec, rules) -> int:
+        model = self.enforcer.get_model()
+        (model.add_policies if add else model.remove_policies)(sec, sec, rules)
+        if sec == "g":
+            self.enforcer.build_role_links()
+        return len(rules)
+
+
+class _Domains:
+    def invalidate(self, domain=None) -> None:
+        pass
+
+
+class _FlakyClient:
+    """第一个订阅连接在收到第一条变更后断开，之后的订阅正常"""
+
+    def __init__(self, client):
+        self.client = client
+        self.subscriptions = 0
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def pubsub(self):
+        self.subscriptions += 1
+        pubsub = self.client.pubsub()
+        return _DroppingPubSub(pubsub) if self.subscriptions == 1 else pubsub
+
+
+class _DroppingPubSub:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def subscribe(self, channel):
+        await self.pubsub.subscribe(channel)
+
+    async def listen(self):
+        async for message in self.pubsub.listen():
+            yield message
+            if message["type"] == "message":
+                raise redis.exceptions.ConnectionError("connection reset")
+
+    async def unsubscribe(self, channel):
+        await self.pubsub.unsubscribe(channel)
+
+    async def aclose(self):
+        await self.pubsub.aclose()
+
+
+async def _wait_for(predicate, timeout: float = 3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+def test_changes_propagate_across_enforcers_and_survive_reconnect(tmp_path, monkeypatch):
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=[["g", "alice", "viewer"]])
+        server = fakeredis.FakeServer()
+        publisher = RedisPolicyWatcher(
+            fakeredis.aioredis.FakeRedis(server=server, decode_responses=True), CHANNEL, SEQ_KEY,
+            service=CasbinService, domains=_Domains(),
+        )
+        worker = _Worker(sessions)
+        follower = RedisPolicyWatcher(
+            _FlakyClient(fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)), CHANNEL, SEQ_KEY,
+            service=worker, domains=_Domains(), reconnect_delay=0.2,
+        )
+        monkeypatch.setattr(casbin_watcher, "_watcher", publisher)
+        monkeypatch.setattr(principal_cache, "SessionLocal", sessions)
+        try:
+            await reset_casbin(sessions)
+            await publisher.subscribe()
+            await follower.subscribe()
+            await worker.load_policy()
+            task = asyncio.create_task(follower.listen())
+
+            # 增量变更传播到另一个执行器
+            assert await CasbinService.add_policy("viewer", "/api/v1/users/*", "GET")
+            await _wait_for(lambda: worker.enforcer.enforce("alice", "/api/v1/users/1", "GET"))
+            assert follower.applied == 1 and worker.loads == 1
+            assert follower.last_lag_ms is not None and follower.last_lag_ms < 1000
+
+            # 第一条消息之后订阅断开：断开期间的变更丢失，重连后全量加载补上
+            await _wait_for(lambda: follower.errors == 1)
+            assert await CasbinService.remove_policy("viewer", "/api/v1/users/*", "GET")
+            assert await CasbinService.add_role_for_user("bob", "viewer")
+            assert worker.enforcer.enforce("alice", "/api/v1/users/1", "GET")
+            await _wait_for(lambda: follower.reconnects == 1)
+            assert worker.loads == 2
+            assert not worker.enforcer.enforce("alice", "/api/v1/users/1", "GET")
+            assert worker.enforcer.has_grouping_policy("bob", "viewer")
+
+            # 重连后继续按序号应用增量
+            assert await CasbinService.add_policy("viewer", "/api/v1/roles", "GET")
+            await _wait_for(lambda: worker.enforcer.enforce("bob", "/api/v1/roles", "GET"))
+            assert worker.loads == 2
+
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            assert follower._pubsub is None
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_lag_uses_the_redis_clock(monkeypatch):
+    real_time = time.time
+
+    def skewed(seconds: float) -> None:
+        # 只改变 watcher 看到的本机时钟，Redis（fakeredis）仍使用真实时钟
+        monkeypatch.setattr(casbin_watcher, "time", SimpleNamespace(time=lambda: real_time() + seconds))
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        publisher, follower = (
+            RedisPolicyWatcher(
+                fakeredis.aioredis.FakeRedis(server=server, decode_responses=True), CHANNEL, SEQ_KEY,
+                service=object(), domains=_Domains(),
+            )
+            for _ in range(2)
+        )
+        pubsub = follower.client.pubsub()
+        await pubsub.subscribe(CHANNEL)
+
+        # 发布方的本机时钟快一分钟，接收方慢一分钟，换算到 Redis 时钟后延迟仍接近 0
+        skewed(60)
+        await publisher.subscribe()
+        await publisher.publish("add", "g", [["carol", "viewer"]])
+        skewed(-60)
+        await follower.subscribe()
+        message = None
+        while message is None:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+        await pubsub.aclose()
+        await follower.handle(message["data"])
+        assert 0 <= follower.last_lag_ms < 1000
+        assert abs(publisher.clock_offset + 60) < 1 and abs(follower.clock_offset - 60) < 1
+
+    run(scenario())
@@ -0,0 +1,126 @@
+import asyncio
+
+from fastapi import FastAPI
+from helpers import create_database, reset_casbin, run
+
+from app.services import casbin_service
+from app.services.casbin_adapter import AsyncSQLAlchemyAdapter
+from app.services.casbin_service import CasbinService
+
+
+def _routes():
+    app = FastAPI()
+
+    @app.get("/api/v1/users/{user_id}")
+    async def read_user(user_id: int):
+        return {}
+
+    return app.routes
+
+
+class _SlowAdapter(AsyncSQLAlchemyAdapter):
+    """写入数据库前让出事件循环，使并发写入在检查与写入之间交错"""
+
+    async def add_policy(self, sec, ptype, rule):
+        await asyncio.sleep(0.01)
+        return await super().add_policy(sec, ptype, rule)
+
+    async def remove_policy(self, sec, ptype, rule):
+        await asyncio.sleep(0.01)
+        return await super().remove_policy(sec, ptype, rule)
+
+
+def _assert_denied(sub: str, path: str, method: str) -> None:
+    assert not CasbinService._evaluate(sub, path, method)
+    assert not CasbinService._path_index.match(CasbinService._role_closure.subjects(sub), path, method)
+    assert CasbinService._route_table.decide(CasbinService._role_closure.subjects(sub), path, method) is not True
+    assert CasbinService.get_enforcer().enforce(sub, path, method) is False
+
+
+def test_concurrent_identical_adds_are_revoked_by_one_remove(tmp_path, monkeypatch):
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_DECISION_CACHE_ENABLED", False)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=[["g", "alice", "viewer"]])
+        try:
+            await reset_casbin(sessions, routes=_routes())
+            CasbinService._adapter = _SlowAdapter(sessions)
+            rule = ["viewer", "/api/v1/users/*", "GET"]
+            version = CasbinService.policy_version()
+
+            assert await asyncio.gather(*(CasbinService.add_policy(*rule) for _ in range(3))) == [True] * 3
+            policy = CasbinService.get_enforcer().get_model().model["p"]["p"].policy
+            assert policy.count(rule) == 1
+            # 数据库只变化了一次，策略版本也只递增一次
+            assert CasbinService.policy_version() == version + 1
+            assert CasbinService._evaluate("alice", "/api/v1/users/1", "GET")
+
+            assert await CasbinService.remove_policy(*rule)
+            _assert_denied("alice", "/api/v1/users/1", "GET")
+            assert CasbinService._role_registry.policy_count("viewer") == 0
+
+            # 并发的相同角色分配同样只生效一次，一次移除即撤销
+            grant = ["bob", "viewer"]
+            await CasbinService.add_policy(*rule)
+            await asyncio.gather(*(CasbinService.add_role_for_user(*grant) for _ in range(2)))
+            assert await CasbinService.delete_role_for_user(*grant)
+            _assert_denied("bob", "/api/v1/users/1", "GET")
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_apply_local_is_idempotent(tmp_path, monkeypatch):
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_DECISION_CACHE_ENABLED", False)
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=[["g", "alice", "viewer"]])
+        try:
+            await reset_casbin(sessions, routes=_routes())
+            rule = ["viewer", "/api/v1/users/*", "GET"]
+            version = CasbinService.policy_version()
+
+            # 重复收到的变更（如同一条广播、并发写入）只应用一次；是否递增策略版本由调用方决定
+            CasbinService._apply_local(True, "p", "p", [rule, list(rule)])
+            CasbinService._apply_local(True, "p", "p", [rule])
+            assert CasbinService.get_enforcer().get_model().model["p"]["p"].policy.count(rule) == 1
+            assert CasbinService.policy_version() == version + 2
+
+            CasbinService._apply_local(False, "p", "p", [rule])
+            CasbinService._apply_local(False, "p", "p", [rule])
+            _assert_denied("alice", "/api/v1/users/1", "GET")
+            assert CasbinService.policy_version() == version + 4
+            CasbinService._apply_local(True, "p", "p", [rule], changed=False)
+            assert CasbinService.policy_version() == version + 4
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_batch_role_removal_above_and_below_rebuild_threshold(tmp_path, monkeypatch):
+    monkeypatch.setattr(casbin_service.settings, "CASBIN_DECISION_CACHE_ENABLED", False)
+    grants = [[f"user{i}", f"role{i % 3}"] for i in range(12)] + [["role0", "role1"]]
+
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", rules=[["g", *rule] for rule in grants])
+        monkeypatch.setattr(casbin_service, "invalidate_principals_for_usernames", _noop)
+        try:
+            await reset_casbin(sessions)
+            rm = CasbinService.get_enforcer().rm_map["g"]
+            # 超过阈值时整体重建，未超过时逐条删除，结果一致
+            for batch in (grants[:casbin_service.ROLE_LINK_REBUILD_THRESHOLD + 2], grants[6:8]):
+                assert set(await CasbinService.delete_roles_for_users(batch)) == {"removed"}
+                for user, role in batch:
+                    assert not rm.has_link(user, role)
+            assert rm.has_link("user9", "role0") and rm.has_link("user9", "role1")
+            assert not rm.has_link("user0", "role1")
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+async def _noop(*args, **kwargs):
+    return None
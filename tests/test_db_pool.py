@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from helpers import run
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database.pool_monitor import InstrumentedQueuePool, get_pool_stats, instrument_pool
+
+
+def _engine(path, **kwargs):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=2,
+        max_overflow=1,
+        **kwargs,
+    )
+    instrument_pool(engine)
+    return engine
+
+
+async def _hold(engine, seconds: float) -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        await asyncio.sleep(seconds)
+
+
+def test_saturated_pool_counts_waits_and_timeouts(tmp_path):
+    async def scenario():
+        engine = _engine(tmp_path / "pool.db", pool_timeout=0.2)
+        try:
+            # pool_size + max_overflow 个连接全部被长时间占用：第 4 个请求排队后超时
+            holders = [asyncio.create_task(_hold(engine, 0.6)) for _ in range(3)]
+            await asyncio.sleep(0.1)
+            with pytest.raises(exc.TimeoutError):
+                await _hold(engine, 0)
+            stats = get_pool_stats(engine)
+            assert stats["checked_out"] == 3 and stats["overflow"] == 1
+            assert stats["timeouts"] == 1 and stats["max_wait_ms"] >= 150
+            await asyncio.gather(*holders)
+
+            # 占用时间短于超时：排队等到归还的连接
+            holders = [asyncio.create_task(_hold(engine, 0.1)) for _ in range(3)]
+            await asyncio.sleep(0.02)
+            await _hold(engine, 0)
+            await asyncio.gather(*holders)
+            stats = get_pool_stats(engine)
+            assert stats["waited"] == 1 and stats["timeouts"] == 1
+            assert stats["max_checked_out"] == 3
+            assert stats["wait_ms"]["count"] == stats["checkouts"]
+            assert (stats["size"], stats["max_overflow"], stats["timeout"]) == (2, 1, 0.2)
+        finally:
+            await engine.dispose()
+
+    run(scenario())
+
+
+def test_invalidated_and_recycled_connections_are_replaced(tmp_path):
+    async def scenario():
+        engine = _engine(tmp_path / "pool.db", pool_recycle=1, pool_pre_ping=True)
+        try:
+            await _hold(engine, 0)
+            assert get_pool_stats(engine)["connects"] == 1
+
+            # 执行中发现连接断开时 SQLAlchemy 使连接失效，下次签出重新建立连接
+            async with engine.connect() as conn:
+                await conn.invalidate()
+            await _hold(engine, 0)
+            stats = get_pool_stats(engine)
+            assert stats["invalidations"] == 1 and stats["connects"] == 2
+
+            # 超过 pool_recycle 的空闲连接在签出时关闭并重建
+            await asyncio.sleep(1.1)
+            await _hold(engine, 0)
+            stats = get_pool_stats(engine)
+            assert stats["connects"] == 3 and stats["recycle"] == 1 and stats["pre_ping"] is True
+
+            # engine.dispose() 重建的连接池沿用配置与计数
+            await engine.dispose()
+            await _hold(engine, 0)
+            stats = get_pool_stats(engine)
+            assert stats["connects"] == 4 and (stats["max_overflow"], stats["recycle"]) == (1, 1)
+        finally:
+            await engine.dispose()
+
+    run(scenario())
@@ -0,0 +1,178 @@
+import asyncio
+
+import fakeredis
+import redis
+from helpers import create_database, reset_casbin, run
+
+from app.schemas.auth import Principal
+from app.services import principal_cache
+from app.services.casbin_service import CasbinService
+
+
+def test_role_changes_invalidate_cached_principals(tmp_path, monkeypatch):
+    async def scenario():
+        engine, sessions = await create_database(
+            tmp_path / "cmdb.db", rules=[["g", "bob", "viewer"]], usernames=["alice", "bob", "carol"]
+        )
+        monkeypatch.setattr(principal_cache, "SessionLocal", sessions)
+        principal_cache.clear_principals()
+        try:
+            await reset_casbin(sessions)
+            for user_id in (1, 2, 3):
+                assert await principal_cache.resolve_principal(user_id) is not None
+            cached = principal_cache.principal_cache
+
+            # 单条分配、批量移除、声明式应用都会失效涉及的用户，其他用户不受影响
+            assert await CasbinService.add_role_for_user("alice", "admin")
+            assert cached.peek(1) is None and cached.peek(2) is not None
+
+            await principal_cache.resolve_principal(1)
+            assert await CasbinService.delete_roles_for_users([["bob", "viewer"]]) == ["removed"]
+            assert cached.peek(2) is None and cached.peek(1) is not None
+
+            await principal_cache.resolve_principal(2)
+            result = await CasbinService.apply_policy_set({"p": [], "g": [["alice", "admin"], ["carol", "viewer"]]})
+            assert result["status"] == "applied"
+            assert cached.peek(3) is None and cached.peek(1) is not None and cached.peek(2) is not None
+
+            # 整体重新加载时无法得知涉及哪些用户，清空全部
+            assert await CasbinService.reload_policy()
+            assert len(cached) == 0
+        finally:
+            principal_cache.clear_principals()
+            await engine.dispose()
+
+    run(scenario())
+
+
+class _InvalidatingSessions:
+    """查询数据库时触发一次失效，模拟"读数据库 → 失效 → 回填"的竞争"""
+
+    def __init__(self, session_factory, user_id):
+        self.session_factory = session_factory
+        self.user_id = user_id
+
+    def __call__(self):
+        return _InvalidatingSession(self.session_factory(), self.user_id)
+
+
+class _InvalidatingSession:
+    def __init__(self, session, user_id):
+        self.session = session
+        self.user_id = user_id
+
+    async def __aenter__(self):
+        db = await self.session.__aenter__()
+        await principal_cache.invalidate_principal(self.user_id)
+        return db
+
+    async def __aexit__(self, *exc_info):
+        return await self.session.__aexit__(*exc_info)
+
+
+def test_fill_racing_an_invalidation_is_not_cached(tmp_path, monkeypatch):
+    async def scenario():
+        engine, sessions = await create_database(tmp_path / "cmdb.db", usernames=["alice"])
+        tier = principal_cache.configure_redis_tier(fakeredis.aioredis.FakeRedis(decode_responses=True))
+        principal_cache.clear_principals()
+        try:
+            monkeypatch.setattr(principal_cache, "SessionLocal", _InvalidatingSessions(sessions, 1))
+            assert (await principal_cache.resolve_principal(1)).username == "alice"
+            assert principal_cache.principal_cache.peek(1) is None
+            assert (await tier.get(1))[0] is None
+
+            # 其他 worker 在失效之前读到代数、在失效之后回填的旧条目，读取时视为过期
+            _, generation = await tier.get(1)
+            await tier.invalidate(1)
+            await tier.set(1, Principal(id=1, username="stale", email="s@test.local", is_active=True, is_superuser=False), generation)
+            assert (await tier.get(1))[0] is None and tier.stale == 1
+
+            monkeypatch.setattr(principal_cache, "SessionLocal", sessions)
+            await principal_cache.resolve_principal(1)
+            principal_cache.clear_principals()
+            assert (await principal_cache.get_principal(1)).username == "alice"
+
+            await principal_cache.invalidate_all_principals()
+            assert (await tier.get(1))[0] is None
+        finally:
+            principal_cache._redis_tier = None
+            principal_cache.clear_principals()
+            await engine.dispose()
+
+    run(scenario())
+
+
+class _FlakyClient:
+    """第一个订阅连接在收到一条消息后断开"""
+
+    def __init__(self, client):
+        self.client = client
+        self.subscriptions = 0
+
+    def pubsub(self):
+        self.subscriptions += 1
+        pubsub = self.client.pubsub()
+        return _DroppingPubSub(pubsub) if self.subscriptions == 1 else pubsub
+
+
+class _DroppingPubSub:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    async def subscribe(self, channel):
+        await self.pubsub.subscribe(channel)
+
+    async def listen(self):
+        async for message in self.pubsub.listen():
+            yield message
+            if message["type"] == "message":
+                raise redis.exceptions.ConnectionError("connection reset")
+
+    async def unsubscribe(self, channel):
+        await self.pubsub.unsubscribe(channel)
+
+    async def aclose(self):
+        await self.pubsub.aclose()
+
+
+def test_listener_reconnects_and_clears_local_cache():
+    async def scenario():
+        client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        tier = principal_cache.RedisPrincipalTier(_FlakyClient(client), ttl=60, channel="test:principal", reconnect_delay=0.01)
+        principal = Principal(id=2, username="bob", email="b@test.local", is_active=True, is_superuser=False)
+        principal_cache.clear_principals()
+        task = asyncio.create_task(tier.listen())
+        try:
+            await _wait_subscribed(client, "test:principal")
+            principal_cache.principal_cache.set(1, principal)
+            await client.publish("test:principal", "1")
+            await _wait_for(lambda: tier.reconnects == 1)
+            await _wait_subscribed(client, "test:principal")
+            assert principal_cache.principal_cache.peek(1) is None
+
+            # 断开期间错过的失效消息无法得知，重新订阅后清空了整个 L1
+            principal_cache.principal_cache.set(2, principal)
+            await client.publish("test:principal", "2")
+            await _wait_for(lambda: tier.received == 2)
+            assert principal_cache.principal_cache.peek(2) is None
+            assert tier.errors == 1
+        finally:
+            task.cancel()
+            principal_cache.clear_principals()
+
+    run(scenario())
+
+
+async def _wait_for(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+
+async def _wait_subscribed(client, channel: str):
+    for _ in range(400):
+        if dict(await client.pubsub_numsub(channel)).get(channel):
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("timed out")